@@ -388,6 +388,10 @@ CELERY_BEAT_SCHEDULE = {
         "task": "documentcloud.documents.tasks.publish_scheduled_documents",
         "schedule": 600,
     },
+    "dispatch_bulk_process": {
+        "task": "documentcloud.documents.tasks.dispatch_bulk_process",
+        "schedule": 60,
+    },
     "dispatch_events": {
         "task": "documentcloud.addons.tasks.dispatch_events",
         "schedule": crontab(minute="*/5"),
@@ -523,8 +527,19 @@ ENVIRONMENT = env("ENVIRONMENT")
 
 REST_BULK_LIMIT = env.int("REST_BULK_LIMIT", default=25)
 UPDATE_ACCESS_CHUNK_SIZE = env.int("UPDATE_ACCESS_CHUNK_SIZE", default=500)
+# Keep every file private and serve public documents by signed URL from the file
+# server, so that making a document public does not need to update its files.
+# Files which were public before it was enabled are made private along with their
+# document, as they always were.
+SIGNED_ACCESS = env.bool("SIGNED_ACCESS", default=False)
 
 HTTPSUB_RETRY_LIMIT = env.int("HTTPSUB_RETRY_LIMIT", default=10)
+# Bulk processing is started this many documents at a time, taking from each
+# organization in turn, so that it does not hold up other processing.  A document
+# which has not finished processing after the timeout (in seconds) no longer
+# counts against the limit.
+BULK_PROCESSING_LIMIT = env.int("BULK_PROCESSING_LIMIT", default=50)
+BULK_PROCESSING_TIMEOUT = env.int("BULK_PROCESSING_TIMEOUT", default=3600)
 
 # Solr
 # ------------------------------------------------------------------------------
@@ -26,7 +26,7 @@ from documentcloud.addons.views import (
     github_webhook,
     scraper_dashboard,
 )
-from documentcloud.core.views import FileServer, account_logout, mailgun
+from documentcloud.core.views import FileServer, account_logout, local_storage, mailgun
 from documentcloud.documents.views import (
     DataViewSet,
     DocumentErrorViewSet,
@@ -142,6 +142,12 @@ urlpatterns = [
     ),
 ]
 
+if settings.ENVIRONMENT == "local":
+    # Serve files from the local storage backend
+    urlpatterns += [
+        path("files/storage/<path:file_name>", local_storage, name="local-storage")
+    ]
+
 if "debug_toolbar" in settings.INSTALLED_APPS:
     # Third Party
     import debug_toolbar
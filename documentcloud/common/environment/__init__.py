@@ -11,6 +11,9 @@ not need to copy multiple files into the serverless function context.
 # Third Party
 import environ
 
+# Local
+from .cache import STORAGE_CACHE_DIRECTORY, STORAGE_CACHE_SIZE, StorageCache
+
 env = environ.Env()
 environment = env.str("ENVIRONMENT")
 
@@ -83,3 +86,7 @@ elif environment == "gcp":
     raise RuntimeError("GCP environment is not currently supported")
 else:
     raise RuntimeError(f"Invalid environment: {environment}")
+
+storage_cache = StorageCache(
+    storage, STORAGE_CACHE_DIRECTORY, STORAGE_CACHE_SIZE * 1024 * 1024
+)
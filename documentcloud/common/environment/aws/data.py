@@ -1,6 +1,9 @@
 # Standard Library
 import json
 
+# Local
+from ... import lanes
+
 
 def get_http_data(request):
     """Extract data from an HTTP request."""
@@ -9,12 +12,14 @@ def get_http_data(request):
 
 def get_pubsub_data(data):
     """Extract data from a pubsub request."""
-    return json.loads(data["Records"][0]["Sns"]["Message"])
+    data = json.loads(data["Records"][0]["Sns"]["Message"])
+    lanes.receive(data)
+    return data
 
 
 def encode_pubsub_data(data):
     """Encode data into the proper format for a pubsub request."""
-    return json.dumps(data).encode("utf8")
+    return json.dumps(lanes.tag(data)).encode("utf8")
 
 
 def encode_response(data):
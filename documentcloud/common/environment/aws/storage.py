@@ -1,8 +1,14 @@
 # Standard Library
 import asyncio
+import atexit
+import hashlib
 import io
+import logging
 import mimetypes
+import os
 import re
+import threading
+from concurrent import futures
 from itertools import zip_longest
 
 # Third Party
@@ -15,9 +21,10 @@ from botocore.client import Config
 from botocore.exceptions import ClientError
 
 # Local
-from ... import access_choices
+from ... import access_choices, tracing
 
 env = environ.Env()
+logger = logging.getLogger(__name__)
 
 ACLS = {
     access_choices.PUBLIC: "public-read",
@@ -27,6 +34,29 @@ ACLS = {
 }
 
 AWS_RETRIES_MAX_ATTEMPTS = env.int("AWS_RETRIES_MAX_ATTEMPTS", default=10)
+# The most connections the shared async client keeps open
+AWS_ASYNC_MAX_POOL_CONNECTIONS = env.int("AWS_ASYNC_MAX_POOL_CONNECTIONS", default=50)
+# The most requests the shared async client makes at once
+AWS_ASYNC_CONCURRENCY = env.int("AWS_ASYNC_CONCURRENCY", default=50)
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# Keep every file private, rather than setting an ACL on each file for the
+# access of its document - public documents are then served by signed URL
+SIGNED_ACCESS = env.bool("SIGNED_ACCESS", default=False)
+# Size of each part in megabytes - S3 requires at least 5.  Files no larger
+# than a part are uploaded in a single request.
+MULTIPART_PART_SIZE = env.int("MULTIPART_PART_SIZE", default=16) * 1024 * 1024
+# Number of parts to upload at once, which bounds the memory used for them
+MULTIPART_CONCURRENCY = env.int("MULTIPART_CONCURRENCY", default=4)
+# Number of times to retry uploading a part before failing the upload
+MULTIPART_PART_RETRIES = env.int("MULTIPART_PART_RETRIES", default=3)
+# The part number of the part recording what an unfinished upload is of.  It is
+# never completed, so S3 discards it once the upload is completed.
+IDENTITY_PART = 10000
+
+
+def md5_etag(contents):
+    """The ETag S3 gives a part with the given contents"""
+    return f'"{hashlib.md5(contents).hexdigest()}"'
 
 
 def grouper(iterable, num, fillvalue=None):
@@ -36,6 +66,260 @@ def grouper(iterable, num, fillvalue=None):
     return zip_longest(*args, fillvalue=fillvalue)
 
 
+class AsyncClient:
+    """A long lived aioboto3 S3 client, shared by all of the async calls made
+    by a process
+
+    The client runs on an event loop in a background thread, so its pool of
+    connections and the credentials it resolved are kept between calls,
+    instead of being set up again for every batch.  A forked process starts
+    its own client, as the thread does not survive the fork.  Processing
+    functions run with a timeout (`USE_TIMEOUT`) are forked for each
+    invocation, so their client is only shared by the calls of one invocation.
+    """
+
+    def __init__(self, client_kwargs, concurrency):
+        self.client_kwargs = client_kwargs
+        self.concurrency = concurrency
+        self.lock = threading.Lock()
+        self.pid = None
+        self.loop = None
+        self.client_context = None
+        self.client = None
+        self.semaphore = None
+        self.inherited = None
+
+    def get_loop(self):
+        with self.lock:
+            if self.pid != os.getpid():
+                self.start()
+            return self.loop
+
+    def start(self):
+        # import aioboto3 locally to avoid needing it installed on lambda
+        # Third Party
+        import aioboto3
+
+        if self.client is not None:
+            # A client inherited from the parent process can not be closed
+            # without its loop, so keep it rather than have it warn about its
+            # unclosed session when it is garbage collected
+            self.inherited = (self.client_context, self.client)
+
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, daemon=True).start()
+
+        async def connect():
+            client_context = aioboto3.Session().client("s3", **self.client_kwargs)
+            client = await client_context.__aenter__()
+            return client_context, client, asyncio.Semaphore(self.concurrency)
+
+        self.client_context, self.client, self.semaphore = (
+            asyncio.run_coroutine_threadsafe(connect(), loop).result()
+        )
+        self.loop = loop
+        self.pid = os.getpid()
+
+    def close(self):
+        """Close the client's connections"""
+        with self.lock:
+            if self.pid != os.getpid():
+                return
+            asyncio.run_coroutine_threadsafe(
+                self.client_context.__aexit__(None, None, None), self.loop
+            ).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.pid = None
+
+    def map(self, func, items, return_exceptions=False, concurrency=None):
+        """Run `func(client, item)` for each item at once, up to the concurrency
+        limit, and return the results in order.  `concurrency` sets a lower
+        limit for this call."""
+        loop = self.get_loop()
+
+        async def main():
+            limit = asyncio.Semaphore(concurrency or self.concurrency)
+
+            async def limited(item):
+                async with limit, self.semaphore:
+                    return await func(self.client, item)
+
+            return await asyncio.gather(
+                *(limited(item) for item in items), return_exceptions=return_exceptions
+            )
+
+        return asyncio.run_coroutine_threadsafe(main(), loop).result()
+
+    def submit(self, func, item):
+        """Start `func(client, item)` without waiting for it, up to the
+        concurrency limit, and return a `concurrent.futures.Future` of its
+        result"""
+        loop = self.get_loop()
+
+        async def limited():
+            async with self.semaphore:
+                return await func(self.client, item)
+
+        return asyncio.run_coroutine_threadsafe(limited(), loop)
+
+
+class MultipartWriter:
+    """A file being uploaded in parts as it is written, from
+    `AwsStorage.multipart_writer`
+
+    Only one part is kept in the buffer.  Each part is sent as soon as it fills,
+    while the next one is written, with up to `MULTIPART_CONCURRENCY` parts
+    being sent at once.  A file which ends within its first part is uploaded in
+    a single request instead.
+
+    The upload is created when the first part is sent, with an extra part,
+    `IDENTITY_PART`, tagging it with the identity of the contents, the content
+    type and the ACL.  If writing fails, the upload is left unfinished, and
+    writing the file again with the same tag resumes it, skipping the parts
+    which were already uploaded with the same contents.  Unfinished uploads of
+    the file with another tag, or without an identity, are aborted.
+    """
+
+    def __init__(self, storage, file_name, content_type, access, identity):
+        self.storage = storage
+        self.file_name = file_name
+        self.bucket, self.key = storage.bucket_key(file_name)
+        if content_type is None:
+            # attempt to guess content type if not specified
+            content_type = mimetypes.guess_type(file_name)[0]
+        self.content_type = content_type
+        self.access = access
+        self.tag = None
+        if identity is not None:
+            tag = f"{identity}\n{content_type}\n{storage.acl(access)}"
+            self.tag = tag.encode("utf8")
+        self.buffer = bytearray()
+        self.upload_id = None
+        self.uploaded = {}
+        self.parts = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        if exception_type is None:
+            self.close()
+        else:
+            # leave the upload unfinished, once the parts being sent are
+            futures.wait(self.parts)
+
+    def write(self, data):
+        data = memoryview(data).cast("B")
+        # Only send a part once there is more to follow it, so the last part
+        # is always sent by `close`
+        while len(self.buffer) + len(data) > MULTIPART_PART_SIZE:
+            size = MULTIPART_PART_SIZE - len(self.buffer)
+            self.buffer += data[:size]
+            data = data[size:]
+            self.send_part(bytes(self.buffer))
+            self.buffer = bytearray()
+        self.buffer += data
+
+    def start(self):
+        """Resume the unfinished upload with the same tag, or create one"""
+        self.upload_id, self.uploaded = self.storage.find_multipart_upload(
+            self.bucket, self.key, self.tag
+        )
+        if self.upload_id is not None:
+            logger.info(
+                "[MULTIPART UPLOAD] resuming %s with %d parts uploaded",
+                self.file_name,
+                len(self.uploaded),
+            )
+            return
+
+        extra_args = {"ContentType": self.content_type} if self.content_type else {}
+        self.upload_id = self.storage.s3_client.create_multipart_upload(
+            Bucket=self.bucket,
+            Key=self.key,
+            ACL=self.storage.acl(self.access),
+            **extra_args,
+        )["UploadId"]
+        if self.tag is not None:
+            self.storage.s3_client.upload_part(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self.upload_id,
+                PartNumber=IDENTITY_PART,
+                Body=self.tag,
+            )
+
+    def send_part(self, body):
+        """Start sending the next part, once there is room for it"""
+        if self.upload_id is None:
+            self.start()
+        if len(self.parts) >= MULTIPART_CONCURRENCY:
+            # wait for the parts before the last few, raising if one failed
+            self.parts[-MULTIPART_CONCURRENCY].result()
+        self.parts.append(
+            self.storage.async_client.submit(
+                self.upload_part, (len(self.parts) + 1, body)
+            )
+        )
+
+    async def upload_part(self, as3_client, item):
+        part_number, body = item
+        etag = md5_etag(body)
+        if self.uploaded.get(part_number) == etag:
+            return etag
+
+        async def send():
+            response = await as3_client.upload_part(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self.upload_id,
+                PartNumber=part_number,
+                Body=body,
+            )
+            tracing.count("bytes_uploaded", len(body))
+            return response["ETag"]
+
+        for retry in range(MULTIPART_PART_RETRIES):
+            try:
+                return await send()
+            except Exception:  # pylint: disable=broad-except
+                logger.warning(
+                    "[MULTIPART UPLOAD] retrying part %d of %s",
+                    part_number,
+                    self.file_name,
+                    exc_info=True,
+                )
+                # sleep 1 second, 2 seconds, 4 seconds between retries
+                await asyncio.sleep(2**retry)
+        return await send()
+
+    @tracing.traced("upload")
+    def close(self):
+        """Send the last part and complete the upload"""
+        if self.upload_id is None:
+            # abort any unfinished upload of a larger version of the file
+            self.storage.find_multipart_upload(self.bucket, self.key, None)
+            self.storage.simple_upload(
+                self.file_name, self.buffer, self.content_type, self.access
+            )
+            return
+
+        self.send_part(bytes(self.buffer))
+        self.buffer = bytearray()
+        etags = [part.result() for part in self.parts]
+        self.storage.s3_client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            MultipartUpload={
+                "Parts": [
+                    {"ETag": etag, "PartNumber": part_number}
+                    for part_number, etag in enumerate(etags, start=1)
+                ]
+            },
+        )
+
+
 class AwsStorage:
     def __init__(self, resource_kwargs=None, minio=False):
 
@@ -48,6 +332,33 @@ class AwsStorage:
         self.s3_resource = boto3.resource("s3", **self.resource_kwargs)
         self.s3_client = boto3.client("s3", **self.resource_kwargs)
         self.minio = minio
+        self.async_client = AsyncClient(
+            {
+                **self.resource_kwargs,
+                "config": self.resource_kwargs["config"].merge(
+                    Config(max_pool_connections=AWS_ASYNC_MAX_POOL_CONNECTIONS)
+                ),
+            },
+            AWS_ASYNC_CONCURRENCY,
+        )
+        atexit.register(self.async_client.close)
+
+    @staticmethod
+    def acl(access):
+        """The canned ACL for a file with the given access"""
+        if SIGNED_ACCESS:
+            return "private"
+        return ACLS[access]
+
+    def sets_acl(self, access):
+        """Whether files changed to the given access need their ACLs set
+
+        minio does not support object ACLs.  With signed access, files are
+        uploaded private and only need to be made private, in case they were
+        made public before signed access was enabled."""
+        if self.minio:
+            return False
+        return not SIGNED_ACCESS or access != access_choices.PUBLIC
 
     def bucket_key(self, file_name):
         return file_name.split("/", 1)
@@ -57,6 +368,15 @@ class AwsStorage:
         bucket = self.s3_resource.Bucket(bucket)
         return bucket.Object(key).content_length
 
+    @tracing.traced("download")
+    def read_range(self, file_name, start, end):
+        """Read the bytes from start up to but not including end"""
+        bucket, key = self.bucket_key(file_name)
+        response = self.s3_client.get_object(
+            Bucket=bucket, Key=key, Range=f"bytes={start}-{end - 1}"
+        )
+        return response["Body"].read()
+
     def open(self, file_name, mode="rb", content_type=None, access=None):
 
         transport_params = {
@@ -73,17 +393,18 @@ class AwsStorage:
             transport_params["multipart_upload_kwargs"]["ContentType"] = content_type
 
         if access is not None:
-            transport_params["multipart_upload_kwargs"]["ACL"] = ACLS[access]
+            transport_params["multipart_upload_kwargs"]["ACL"] = self.acl(access)
 
         return smart_open.open(
             f"s3://{file_name}", mode, transport_params=transport_params
         )
 
+    @tracing.traced("upload")
     def simple_upload(
         self, file_name, contents, content_type=None, access=access_choices.PRIVATE
     ):
         bucket, key = self.bucket_key(file_name)
-        extra_args = {"ACL": ACLS[access]}
+        extra_args = {"ACL": self.acl(access)}
 
         if content_type is None:
             # attempt to guess content type if not specified
@@ -92,46 +413,131 @@ class AwsStorage:
             # set content type if we have one
             extra_args["ContentType"] = content_type
 
+        tracing.count("bytes_uploaded", len(contents))
         with io.BytesIO(contents) as mem_file:
             self.s3_client.upload_fileobj(mem_file, bucket, key, ExtraArgs=extra_args)
 
+    @tracing.traced("upload")
     def async_upload(
         self, file_names, contents, content_types=None, access=access_choices.PRIVATE
     ):
         """Upload given files in parallel"""
-        # import aioboto3 locally to avoid needing it installed on lambda
-        # Third Party
-        import aioboto3
-
         if content_types is None:
             content_types = [None for _ in range(len(file_names))]
+        tracing.count("bytes_uploaded", sum(len(content) for content in contents))
 
-        async def main():
-            session = aioboto3.Session()
-            async with session.client("s3", **self.resource_kwargs) as as3_client:
-                tasks = []
-                for file_name, content, content_type in zip(
-                    file_names, contents, content_types
-                ):
-                    bucket, key = self.bucket_key(file_name)
-                    extra_args = {"ACL": ACLS[access]}
-                    if content_type is None:
-                        # attempt to guess content type if not specified
-                        content_type = mimetypes.guess_type(file_name)[0]
-                    if content_type is not None:
-                        # set content type if we have one
-                        extra_args["ContentType"] = content_type
-
-                    tasks.append(
-                        as3_client.upload_fileobj(
-                            io.BytesIO(content), bucket, key, ExtraArgs=extra_args
-                        )
-                    )
-
-                await asyncio.gather(*tasks)
-
-        loop = asyncio.get_event_loop()
-        loop.run_until_complete(main())
+        async def upload(as3_client, item):
+            file_name, content, content_type = item
+            bucket, key = self.bucket_key(file_name)
+            extra_args = {"ACL": self.acl(access)}
+            if content_type is None:
+                # attempt to guess content type if not specified
+                content_type = mimetypes.guess_type(file_name)[0]
+            if content_type is not None:
+                # set content type if we have one
+                extra_args["ContentType"] = content_type
+
+            await as3_client.upload_fileobj(
+                io.BytesIO(content), bucket, key, ExtraArgs=extra_args
+            )
+
+        self.async_client.map(upload, list(zip(file_names, contents, content_types)))
+
+    def multipart_writer(
+        self, file_name, content_type=None, access=access_choices.PRIVATE, identity=None
+    ):
+        """Open a file to be uploaded in parts, in parallel, as it is written
+
+        Writing the file again with the same `identity`, content type and access
+        resumes an upload which failed, so `identity` must only be the same for
+        the same contents.  Without one, a failed upload is never resumed.
+        See `MultipartWriter`."""
+        return MultipartWriter(self, file_name, content_type, access, identity)
+
+    def multipart_upload(
+        self, file_name, contents, content_type=None, access=access_choices.PRIVATE
+    ):
+        """Upload a large file in parts, in parallel
+
+        Each part is retried on its own if it fails.  If the upload still fails,
+        it is left unfinished, and uploading the same contents again resumes it,
+        skipping the parts which were already uploaded.
+
+        `contents` may be any bytes-like object, such as the buffer of a
+        `BytesIO`, so that the file is not copied - only the parts being sent
+        are.
+        """
+        identity = hashlib.sha1(contents).hexdigest()
+        with self.multipart_writer(file_name, content_type, access, identity) as writer:
+            writer.write(contents)
+
+    def find_multipart_upload(self, bucket, key, tag):
+        """Find the newest unfinished multipart upload of a key tagged with
+        `tag`, returning its ID and the ETags of the parts already uploaded, by
+        part number.  Every other unfinished upload of the key is aborted."""
+        response = self.s3_client.list_multipart_uploads(Bucket=bucket, Prefix=key)
+        uploads = sorted(
+            (u for u in response.get("Uploads", []) if u["Key"] == key),
+            key=lambda u: u["Initiated"],
+            reverse=True,
+        )
+        found = None
+        for upload in uploads:
+            if (
+                found is None
+                and tag is not None
+                and self.upload_tag(bucket, key, upload["UploadId"]) == md5_etag(tag)
+            ):
+                found = upload["UploadId"]
+            else:
+                logger.info(
+                    "[MULTIPART UPLOAD] aborting %s of %s/%s",
+                    upload["UploadId"],
+                    bucket,
+                    key,
+                )
+                self.s3_client.abort_multipart_upload(
+                    Bucket=bucket, Key=key, UploadId=upload["UploadId"]
+                )
+        if found is None:
+            return None, {}
+
+        uploaded = {}
+        paginator = self.s3_client.get_paginator("list_parts")
+        for page in paginator.paginate(Bucket=bucket, Key=key, UploadId=found):
+            for part in page.get("Parts", []):
+                uploaded[part["PartNumber"]] = part["ETag"]
+        return found, uploaded
+
+    def upload_tag(self, bucket, key, upload_id):
+        """The ETag of the identity part of an unfinished upload, if it has one"""
+        response = self.s3_client.list_parts(
+            Bucket=bucket,
+            Key=key,
+            UploadId=upload_id,
+            PartNumberMarker=IDENTITY_PART - 1,
+            MaxParts=1,
+        )
+        for part in response.get("Parts", []):
+            if part["PartNumber"] == IDENTITY_PART:
+                return part["ETag"]
+        return None
+
+    @tracing.traced("download")
+    def download_if_modified(self, file_name, etag, out_file):
+        """Download a file into `out_file` unless its ETag matches `etag`.
+        Returns its ETag, or None if it has not been modified."""
+        bucket, key = self.bucket_key(file_name)
+        kwargs = {"IfNoneMatch": etag} if etag else {}
+        try:
+            response = self.s3_client.get_object(Bucket=bucket, Key=key, **kwargs)
+        except ClientError as exc:
+            if exc.response["ResponseMetadata"]["HTTPStatusCode"] == 304:
+                return None
+            raise
+        for chunk in response["Body"].iter_chunks(DOWNLOAD_CHUNK_SIZE):
+            out_file.write(chunk)
+        return response["ETag"]
 
     def presign_url(self, file_name, method_name, use_custom_domain=False):
 
@@ -213,8 +619,7 @@ class AwsStorage:
 
     def set_access_path(self, file_prefix, access):
         """Set access for all keys with a given prefix"""
-        if self.minio:
-            # minio does not support object ACLs
+        if not self.sets_acl(access):
             return
         bucket, prefix = self.bucket_key(file_prefix)
         bucket = self.s3_resource.Bucket(bucket)
@@ -223,8 +628,7 @@ class AwsStorage:
 
     def set_access(self, file_names, access):
         """Set access for given keys"""
-        if self.minio:
-            # minio does not support object ACLs
+        if not self.sets_acl(access):
             return
         for file_name in file_names:
             bucket, key = self.bucket_key(file_name)
@@ -233,46 +637,28 @@ class AwsStorage:
 
     def async_set_access(self, file_names, access):
         """Set access for given keys asynchronously"""
-        # import aioboto3 locally to avoid needing it installed on lambda
-        # Third Party
-        import aioboto3
-
-        if self.minio:
-            # minio does not support object ACLs
+        if not self.sets_acl(access):
             return
 
-        async def main():
-            session = aioboto3.Session()
-            async with session.resource("s3", **self.resource_kwargs) as as3_resource:
-                tasks = []
-                for file_name in file_names:
-                    bucket, key = self.bucket_key(file_name)
-                    object_acl = await as3_resource.ObjectAcl(bucket, key)
-                    tasks.append(object_acl.put(ACL=ACLS[access]))
-                await asyncio.gather(*tasks)
-
-        loop = asyncio.get_event_loop()
-        loop.run_until_complete(main())
+        async def put_acl(as3_client, file_name):
+            bucket, key = self.bucket_key(file_name)
+            await as3_client.put_object_acl(Bucket=bucket, Key=key, ACL=ACLS[access])
 
+        self.async_client.map(put_acl, file_names)
+
+    @tracing.traced("download")
     def async_download(self, file_names):
         """Download given files in parallel"""
-        # import aioboto3 locally to avoid needing it installed on lambda
-        # Third Party
-        import aioboto3
-
         data = [io.BytesIO() for _ in file_names]
 
-        async def main():
-            session = aioboto3.Session()
-            async with session.client("s3", **self.resource_kwargs) as as3_client:
-                tasks = []
-                for file_name, datum in zip(file_names, data):
-                    bucket, key = self.bucket_key(file_name)
-                    tasks.append(as3_client.download_fileobj(bucket, key, datum))
-                await asyncio.gather(*tasks, return_exceptions=True)
+        async def download(as3_client, item):
+            file_name, datum = item
+            bucket, key = self.bucket_key(file_name)
+            await as3_client.download_fileobj(bucket, key, datum)
 
-        loop = asyncio.get_event_loop()
-        loop.run_until_complete(main())
+        self.async_client.map(
+            download, list(zip(file_names, data)), return_exceptions=True
+        )
 
         return_data = []
         for datum in data:
@@ -282,22 +668,13 @@ class AwsStorage:
 
     def async_size(self, file_names):
         """Get the size of the given files in parallel"""
-        # import aioboto3 locally to avoid needing it installed on lambda
-        # Third Party
-        import aioboto3
 
-        async def main():
-            session = aioboto3.Session()
-            async with session.resource("s3", **self.resource_kwargs) as as3_resource:
-                tasks = []
-                for file_name in file_names:
-                    bucket, key = self.bucket_key(file_name)
-                    object_ = await as3_resource.Object(bucket, key)
-                    tasks.append(object_.content_length)
-                return await asyncio.gather(*tasks, return_exceptions=True)
-
-        loop = asyncio.get_event_loop()
-        sizes = loop.run_until_complete(main())
+        async def size(as3_client, file_name):
+            bucket, key = self.bucket_key(file_name)
+            response = await as3_client.head_object(Bucket=bucket, Key=key)
+            return response["ContentLength"]
+
+        sizes = self.async_client.map(size, file_names, return_exceptions=True)
         return [0 if isinstance(s, Exception) else s for s in sizes]
 
     def list(self, file_prefix, marker=None, limit=None):
@@ -318,7 +695,9 @@ class AwsStorage:
             objects = objects.limit(limit)
         return [f"{bucket.name}/{o.key}" for o in objects]
 
-    def copy(self, src, dst, acl="private"):
+    def copy(self, src, dst, acl="private", access=None):
+        if access is not None:
+            acl = self.acl(access)
         dst_bucket, dst_key = self.bucket_key(dst)
         self.s3_client.copy_object(
             CopySource=src, Bucket=dst_bucket, Key=dst_key, ACL=acl
@@ -0,0 +1,209 @@
+"""
+A read-through cache of stored files on local disk, so that warm functions,
+workers and management commands do not download the same files over and over.
+
+Files are kept under the cache directory at the same path they have in
+storage, next to a hidden file holding the ETag they were downloaded with.
+A cached file is revalidated with a conditional request, so it is only
+downloaded again if it has changed - or, for files which rarely change, only
+revalidated once `max_age` seconds have passed.  When the cache grows past its
+size limit, the least recently used files are evicted.  The size of the cache
+is counted when it is first scanned and kept up to date with the files
+downloaded since, so it is only scanned again once it passes the limit.
+
+Several processes may share a cache directory.  Files are downloaded to a
+temporary file and moved into place, and the ETag file records the inode of
+the file it is for, so a file and its ETag can never be mismatched.
+"""
+
+# Standard Library
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent import futures
+
+# Third Party
+import environ
+
+env = environ.Env()
+logger = logging.getLogger(__name__)
+
+STORAGE_CACHE_DIRECTORY = env.str(
+    "STORAGE_CACHE_DIRECTORY", default=os.path.join(tempfile.gettempdir(), "storage")
+)
+# Size limit in megabytes - the cache is disabled if it is 0
+STORAGE_CACHE_SIZE = env.int("STORAGE_CACHE_SIZE", default=0)
+# Number of files to fetch at once when downloading several
+STORAGE_CACHE_WORKERS = env.int("STORAGE_CACHE_WORKERS", default=20)
+
+ETAG_PREFIX = "."
+ETAG_SUFFIX = ".etag"
+TMP_PREFIX = ".tmp"
+
+
+def etag_path(local_path):
+    directory, name = os.path.split(local_path)
+    return os.path.join(directory, f"{ETAG_PREFIX}{name}{ETAG_SUFFIX}")
+
+
+class StorageCache:
+    """Reads files from storage through a size bounded cache on local disk"""
+
+    def __init__(self, storage, directory, max_size):
+        self.storage = storage
+        self.directory = directory
+        self.max_size = max_size
+        # The size of the cached files as of the last scan, plus the files
+        # downloaded since - None until the cache is first scanned.  Files
+        # downloaded by other processes sharing the directory are counted on
+        # the next scan.
+        self.size = None
+        self.size_lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def local_path(self, file_name):
+        return os.path.join(self.directory, file_name.lstrip("/"))
+
+    @staticmethod
+    def cached_etag(local_path):
+        """The ETag of a cached file, or None if it is not cached"""
+        try:
+            with open(etag_path(local_path), encoding="utf8") as etag_file:
+                inode, etag = etag_file.read().split(" ", 1)
+            if os.stat(local_path).st_ino != int(inode):
+                return None
+        except (OSError, ValueError):
+            return None
+        return etag
+
+    @staticmethod
+    def write_etag(local_path, inode, etag):
+        directory = os.path.dirname(local_path)
+        handle, tmp_path = tempfile.mkstemp(dir=directory, prefix=TMP_PREFIX)
+        with os.fdopen(handle, "w", encoding="utf8") as tmp_file:
+            tmp_file.write(f"{inode} {etag}")
+        os.replace(tmp_path, etag_path(local_path))
+
+    def path(self, file_name, max_age=0):
+        """The path of a local copy of a stored file, which is downloaded if it
+        is not cached or has changed.  A cached file is trusted without being
+        revalidated for `max_age` seconds after it was last validated."""
+        local_path = self.local_path(file_name)
+        etag = self.cached_etag(local_path)
+
+        if etag is not None and max_age > 0:
+            validated = os.path.getmtime(etag_path(local_path))
+            if time.time() - validated < max_age:
+                os.utime(local_path)
+                return local_path
+
+        directory = os.path.dirname(local_path)
+        os.makedirs(directory, exist_ok=True)
+        handle, tmp_path = tempfile.mkstemp(dir=directory, prefix=TMP_PREFIX)
+        try:
+            with os.fdopen(handle, "wb") as tmp_file:
+                new_etag = self.storage.download_if_modified(file_name, etag, tmp_file)
+                # The inode of the file is recorded with its ETag, in case
+                # another process replaces the file before the ETag is written
+                inode = os.fstat(tmp_file.fileno()).st_ino
+                size = tmp_file.tell()
+            if new_etag is None:
+                # Not modified
+                os.remove(tmp_path)
+                os.utime(local_path)
+                os.utime(etag_path(local_path))
+                return local_path
+            try:
+                replaced_size = os.path.getsize(local_path)
+            except FileNotFoundError:
+                replaced_size = 0
+            os.replace(tmp_path, local_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self.write_etag(local_path, inode, new_etag)
+        self.add_size(size - replaced_size, keep=local_path)
+        return local_path
+
+    def open(self, file_name, mode="rb", max_age=0):
+        """Open a stored file for reading through the cache"""
+        # pylint: disable=unspecified-encoding
+        if self.enabled:
+            try:
+                return open(self.path(file_name, max_age), mode)
+            except FileNotFoundError:
+                # Evicted by another process before it could be opened
+                pass
+        return self.storage.open(file_name, mode)
+
+    def read(self, file_name, max_age=0):
+        with self.open(file_name, "rb", max_age) as cached_file:
+            return cached_file.read()
+
+    def async_download(self, file_names):
+        """Read several files at once, returning empty contents for any which
+        could not be read, like `storage.async_download`"""
+        if not self.enabled:
+            return self.storage.async_download(file_names)
+
+        def read(file_name):
+            try:
+                return self.read(file_name)
+            except Exception:  # pylint: disable=broad-except
+                logger.warning("Reading %s failed", file_name, exc_info=True)
+                return b""
+
+        with futures.ThreadPoolExecutor(max_workers=STORAGE_CACHE_WORKERS) as pool:
+            return list(pool.map(read, file_names))
+
+    def add_size(self, size, keep=None):
+        """Count a change in the size of the cache, evicting files if it has
+        grown past its size limit"""
+        with self.size_lock:
+            if self.size is not None:
+                self.size += size
+                if self.size <= self.max_size:
+                    return
+            self.evict(keep)
+
+    def evict(self, keep=None):
+        """Remove the least recently used files until the cache is within its
+        size limit"""
+        files = []
+        total = 0
+        for directory, _, names in os.walk(self.directory):
+            for name in names:
+                if name.startswith((ETAG_PREFIX, TMP_PREFIX)):
+                    continue
+                local_path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(local_path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, local_path))
+                total += stat.st_size
+
+        self.size = total
+        if total <= self.max_size:
+            return
+
+        for _, size, local_path in sorted(files):
+            if local_path == keep:
+                continue
+            logger.info("[STORAGE CACHE] evicting %s", local_path)
+            for evict_path in (etag_path(local_path), local_path):
+                try:
+                    os.remove(evict_path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+            self.size = total
+            if total <= self.max_size:
+                return
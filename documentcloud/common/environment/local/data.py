@@ -2,6 +2,9 @@
 import base64
 import json
 
+# Local
+from ... import lanes
+
 
 def get_http_data(request):
     """Extract data from an HTTP request."""
@@ -10,12 +13,14 @@ def get_http_data(request):
 
 def get_pubsub_data(data):
     """Extract data from a pubsub request."""
-    return json.loads(base64.b64decode(data["data"]).decode("utf-8"))
+    data = json.loads(base64.b64decode(data["data"]).decode("utf-8"))
+    lanes.receive(data)
+    return data
 
 
 def encode_pubsub_data(data):
     """Encode data into the proper format for a pubsub request."""
-    return json.dumps(data).encode("utf8")
+    return json.dumps(lanes.tag(data)).encode("utf8")
 
 
 def encode_response(data):
@@ -0,0 +1,191 @@
+"""
+An in-process executor for local pub/sub, used instead of Celery when
+`LOCAL_PUBSUB_EXECUTOR` is set to `pool`.
+
+Each published message runs its topic's task in a bounded pool of forked
+worker processes.  Messages published by a task are collected in the worker
+and sent back with its result, and are then submitted to the pool by a
+dispatcher thread in the parent process.  As tasks run the same functions
+wrapped by `pubsub_function`, they keep its timeout and retry semantics - a
+function run with a timeout is forked again from the worker, and sends the
+messages it published back with its result (see `call_forked` in
+`common/serverless/error_handling.py`).
+
+Messages wait in a `FairQueue` (see `common/lanes.py`) until a worker is
+free, so interactive work is not stuck behind a large import, and no single
+organization can take every worker.
+
+The executor keeps statistics for each topic, so the whole pipeline may be
+run and measured on a single machine without a broker.
+"""
+
+# Standard Library
+import functools
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import resource
+import threading
+import time
+from concurrent import futures
+
+# Local
+from ... import lanes
+
+logger = logging.getLogger(__name__)
+
+
+class TopicStats:
+    """Throughput statistics for the tasks of a single topic"""
+
+    def __init__(self):
+        self.invocations = 0
+        self.errors = 0
+        self.pages = 0
+        self.busy = 0.0
+        self.max_rss_kb = 0
+        self.first_start = None
+        self.last_end = None
+
+    def add(self, start, end, pages, error, max_rss_kb):
+        # pylint: disable=too-many-arguments
+        self.invocations += 1
+        self.errors += int(error)
+        self.pages += pages
+        self.busy += end - start
+        self.max_rss_kb = max(self.max_rss_kb, max_rss_kb)
+        if self.first_start is None or start < self.first_start:
+            self.first_start = start
+        if self.last_end is None or end > self.last_end:
+            self.last_end = end
+
+    def to_dict(self):
+        wall = self.last_end - self.first_start if self.first_start is not None else 0.0
+        return {
+            "invocations": self.invocations,
+            "errors": self.errors,
+            "pages": self.pages,
+            "busy_seconds": self.busy,
+            "max_rss_kb": self.max_rss_kb,
+            "wall_seconds": wall,
+            "invocations_per_second": self.invocations / wall if wall else None,
+            "pages_per_second": self.pages / wall if wall else None,
+        }
+
+
+def decode_message(data):
+    try:
+        message = json.loads(data)
+    except ValueError:
+        return {}
+    return message if isinstance(message, dict) else {}
+
+
+def message_pages(message):
+    """The number of pages a message is for, if it is for a batch of pages"""
+    pages = message.get("pages", message.get("paths_and_numbers"))
+    return len(pages) if isinstance(pages, list) else 0
+
+
+def run_in_worker(topic_path, data):
+    """Run a topic's task in a worker process, returning the time it ran, the
+    peak memory of the worker and the messages it published"""
+    # Local
+    from .pubsub import encode_published_pubsub_data, publisher
+
+    publisher.outbox = []
+    start = time.time()
+    try:
+        publisher.tasks[topic_path](encode_published_pubsub_data(data))
+        error = False
+    except Exception:  # pylint: disable=broad-except
+        logger.exception("Task for topic %s failed", topic_path)
+        error = True
+    finally:
+        outbox, publisher.outbox = publisher.outbox, None
+    max_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return start, time.time(), error, max_rss_kb, outbox
+
+
+class PoolExecutor:
+    """Runs the tasks of published messages in a pool of processes"""
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or os.cpu_count()
+        self.pool = futures.ProcessPoolExecutor(
+            max_workers=self.max_workers, mp_context=multiprocessing.get_context("fork")
+        )
+        self.stats = {}
+        # Messages submitted and not yet finished, including those queued
+        self.pending = 0
+        # Messages running in the pool
+        self.running = 0
+        self.queue = lanes.FairQueue()
+        self.condition = threading.Condition()
+        self.completed = queue.Queue()
+        self.dispatcher = threading.Thread(target=self.dispatch, daemon=True)
+        self.dispatcher.start()
+
+    def submit(self, topic_path, data):
+        message = decode_message(data)
+        priority, org_id = lanes.get_lane(message)
+        with self.condition:
+            self.pending += 1
+            self.queue.put((topic_path, data, message_pages(message)), priority, org_id)
+            self.start_next()
+
+    def start_next(self):
+        """Run queued messages while there are free workers"""
+        while self.running < self.max_workers and self.queue:
+            topic_path, data, pages = self.queue.get()
+            self.running += 1
+            future = self.pool.submit(run_in_worker, topic_path, data)
+            future.add_done_callback(
+                functools.partial(self.finished, topic_path, pages)
+            )
+
+    def finished(self, topic_path, pages, future):
+        self.completed.put((topic_path, pages, future))
+
+    def dispatch(self):
+        """Record finished tasks and submit the messages they published"""
+        while True:
+            topic_path, pages, future = self.completed.get()
+            try:
+                start, end, error, max_rss_kb, outbox = future.result()
+            except Exception:  # pylint: disable=broad-except
+                # The worker process itself failed
+                logger.exception("Worker for topic %s failed", topic_path)
+                start = end = time.time()
+                error, max_rss_kb, outbox = True, 0, []
+
+            for published_topic_path, published_data in outbox:
+                self.submit(published_topic_path, published_data)
+
+            with self.condition:
+                self.stats.setdefault(topic_path, TopicStats()).add(
+                    start, end, pages, error, max_rss_kb
+                )
+                self.pending -= 1
+                self.running -= 1
+                self.start_next()
+                self.condition.notify_all()
+
+    def join(self, timeout=None):
+        """Wait until every message, including those published by tasks, has
+        been processed.  Returns False if the timeout was reached first."""
+        with self.condition:
+            return self.condition.wait_for(lambda: self.pending == 0, timeout)
+
+    def report(self):
+        """Statistics for each topic, by topic name"""
+        with self.condition:
+            return {
+                topic_path[-1]: stats.to_dict()
+                for topic_path, stats in self.stats.items()
+            }
+
+    def shutdown(self):
+        self.pool.shutdown()
@@ -5,9 +5,18 @@ import json
 # Third Party
 import environ
 
+# Local
+from ... import lanes
+
 env = environ.Env()
 
 ERROR_IF_NO_TOPIC = True
+# Run tasks with Celery, or in a local pool of processes (see executor.py)
+EXECUTOR = env.str("LOCAL_PUBSUB_EXECUTOR", default="celery")
+# Number of processes for the pool executor, defaulting to the CPU count
+EXECUTOR_WORKERS = env.int("LOCAL_PUBSUB_WORKERS", default=None)
+# Celery task priority for each lane - with Redis as the broker, 0 is highest
+CELERY_PRIORITIES = {lanes.INTERACTIVE: 0, lanes.BULK: 9}
 
 
 def encode_pubsub_data(data):
@@ -25,6 +34,9 @@ def decode_pubsub_data(data):
 class LocalPubSubClient:
     def __init__(self):
         self.tasks = {}
+        self.executor = None
+        # Messages published while running a task in a pool worker
+        self.outbox = None
 
     @staticmethod
     def topic_path(namespace, name):
@@ -35,112 +47,147 @@ class LocalPubSubClient:
 
     def publish(self, topic_path, data):
         if topic_path in self.tasks:
-            self.tasks[topic_path](encode_published_pubsub_data(data))
+            if self.outbox is not None:
+                # In a pool worker, the executor submits it once the task ends
+                self.outbox.append((topic_path, data))
+            elif EXECUTOR == "pool":
+                self.get_executor().submit(topic_path, data)
+            else:
+                self.tasks[topic_path](encode_published_pubsub_data(data))
         else:
             if ERROR_IF_NO_TOPIC:
                 raise ValueError(f"Topic not registered: {topic_path}")
 
+    def get_executor(self):
+        if self.executor is None:
+            # Local
+            from .executor import PoolExecutor
+
+            self.executor = PoolExecutor(EXECUTOR_WORKERS)
+        return self.executor
+
+    def join(self, timeout=None):
+        """Wait for all published messages to be processed by the pool
+        executor.  Returns False if the timeout was reached first."""
+        if self.executor is None:
+            return True
+        return self.executor.join(timeout)
+
+    def stats(self):
+        """Throughput statistics for each topic run by the pool executor"""
+        if self.executor is None:
+            return {}
+        return self.executor.report()
+
 
 # Define pub sub client and topic subscriptions
 publisher = LocalPubSubClient()
 
 
+def run_task(task, data):
+    """Queue a Celery task in its lane, or run it directly if in a pool worker"""
+    if EXECUTOR == "pool":
+        return task(data)
+    priority, _org_id = lanes.get_lane(decode_pubsub_data(data))
+    return task.apply_async((data,), priority=CELERY_PRIORITIES[priority])
+
+
 def process_pdf_task(data):
     # DocumentCloud
     from documentcloud.documents.tasks import process_file_internal
 
-    return process_file_internal.delay(data)
+    return run_task(process_file_internal, data)
 
 
 def document_convert_task(data):
     # DocumentCloud
     from documentcloud.documents.tasks import document_convert
 
-    return document_convert.delay(data)
+    return run_task(document_convert, data)
 
 
 def page_cache_task(data):
     # DocumentCloud
     from documentcloud.documents.tasks import cache_pages
 
-    return cache_pages.delay(data)
+    return run_task(cache_pages, data)
 
 
 def extract_image_task(data):
     # DocumentCloud
     from documentcloud.documents.tasks import extract_images
 
-    return extract_images.delay(data)
+    return run_task(extract_images, data)
 
 
 def ocr_page_task(data):
     # DocumentCloud
     from documentcloud.documents.tasks import ocr_pages
 
-    return ocr_pages.delay(data)
+    return run_task(ocr_pages, data)
 
 
 def assemble_text_task(data):
     # DocumentCloud
     from documentcloud.documents.tasks import assemble_text
 
-    return assemble_text.delay(data)
+    return run_task(assemble_text, data)
 
 
 def extract_text_position_task(data):
     # DocumentCloud
     from documentcloud.documents.tasks import text_position_extract
 
-    return text_position_extract.delay(data)
+    return run_task(text_position_extract, data)
 
 
 def redact_doc_task(data):
     # DocumentCloud
     from documentcloud.documents.tasks import redact_document
 
-    return redact_document.delay(data)
+    return run_task(redact_document, data)
 
 
 def modify_doc_task(data):
     # DocumentCloud
     from documentcloud.documents.tasks import modify_document
 
-    return modify_document.delay(data)
+    return run_task(modify_document, data)
 
 
 def start_import_task(data):
     # DocumentCloud
     from documentcloud.documents.tasks import start_import_process
 
-    return start_import_process.delay(data)
+    return run_task(start_import_process, data)
 
 
 def import_document_task(data):
     # DocumentCloud
     from documentcloud.documents.tasks import import_doc
 
-    return import_doc.delay(data)
+    return run_task(import_doc, data)
 
 
 def finish_import_task(data):
     # DocumentCloud
     from documentcloud.documents.tasks import finish_import_process
 
-    return finish_import_process.delay(data)
+    return run_task(finish_import_process, data)
 
 
 def sidekick_preprocess_task(data):
     # DocumentCloud
     from documentcloud.sidekick.tasks import sidekick_preprocess
 
-    return sidekick_preprocess.delay(data)
+    return run_task(sidekick_preprocess, data)
 
 
 def retry_errors_task(data):
     # DocumentCloud
     from documentcloud.documents.tasks import retry_errors_local
 
-    return retry_errors_local.delay(data)
+    return run_task(retry_errors_local, data)
 
 
 publisher.register_internal_callback(
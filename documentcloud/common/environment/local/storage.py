@@ -1,31 +1,51 @@
 """
-This is an incomplete implementation of the Storage abstraction
-for the local filesystem.  This is only used during tests and implements
-what is needed for the tests which use it.
+An implementation of the Storage abstraction for the local filesystem, so that
+DocumentCloud can run on a single machine without any object storage
 
-A more complete abstraction is possible, but deemed unecessary as using MinIO
-is the preferred development environment
+Files are kept under `MEDIA_ROOT`, with the same bucket and key layout as the
+other storage backends (see `common/path.py`).  Whether a file is public is
+kept in its permission bits - public files are readable by everyone, much like
+a public-read ACL.  Public files and presigned URLs are served by the
+`local_storage` view.
 """
 
 # Django
 from django.conf import settings
+from django.core import signing
+from django.core.exceptions import SuspiciousFileOperation
+from django.urls import reverse
 
 # Standard Library
 import os
 import shutil
+import stat
 from pathlib import Path
+from urllib.parse import urlencode
 
 # Third Party
 import environ
+import requests
+
+# Local
+from ... import access_choices
 
 env = environ.Env()
 
+# Keep every file private, as with the AWS storage
+SIGNED_ACCESS = env.bool("SIGNED_ACCESS", default=False)
+# Seconds a presigned URL is valid for, as with the AWS storage
+PRESIGN_EXPIRES = 300
+PRESIGN_SALT = "documentcloud.common.environment.local.storage"
+PUBLIC_MODE = 0o644
+PRIVATE_MODE = 0o600
+
 
 class LocalStorageFile:
-    def __init__(self, storage_system, filename, mode="w"):
+    def __init__(self, storage_system, filename, mode="w", access=None):
         self.storage = storage_system
-        self.filename = os.path.join(settings.MEDIA_ROOT, filename)
+        self.filename = storage_system.local_path(filename)
         self.mode = mode
+        self.access = access
         self.handle = None
 
     def __enter__(self):
@@ -41,6 +61,9 @@ class LocalStorageFile:
         if self.handle is not None:
             self.handle.close()
 
+        if self.mode.startswith("w"):
+            os.chmod(self.filename, self.storage.file_mode(self.access))
+
         if self.storage.trigger is not None:
             self.storage.trigger(self.filename)
 
@@ -50,31 +73,208 @@ class LocalStorage:
         self.trigger = trigger
 
     @staticmethod
-    def size(filename):
-        return os.path.getsize(os.path.join(settings.MEDIA_ROOT, filename))
+    def root():
+        return os.path.realpath(settings.MEDIA_ROOT)
+
+    def local_path(self, file_name):
+        """The path of a file under `MEDIA_ROOT`
+
+        File names may come from a URL (see the `local_storage` view), so
+        absolute names, names containing `..` and names which resolve outside
+        of `MEDIA_ROOT` through a link are rejected"""
+        if os.path.isabs(file_name) or ".." in Path(file_name).parts:
+            raise SuspiciousFileOperation(f"Invalid file name: {file_name}")
+        root = self.root()
+        local_path = os.path.realpath(os.path.join(root, file_name))
+        if os.path.commonpath([root, local_path]) != root:
+            raise SuspiciousFileOperation(f"Invalid file name: {file_name}")
+        if file_name.endswith("/"):
+            # keep the trailing slash of a prefix
+            local_path = os.path.join(local_path, "")
+        return local_path
+
+    @staticmethod
+    def file_mode(access):
+        """The permission bits for a file with the given access"""
+        if access == access_choices.PUBLIC and not SIGNED_ACCESS:
+            return PUBLIC_MODE
+        return PRIVATE_MODE
 
-    def open(self, filename, mode="w", content_type=None, access=None):
+    @staticmethod
+    def sets_acl(access):
+        """Whether files changed to the given access need their permissions
+        set - with signed access they only need to be made private"""
+        return not SIGNED_ACCESS or access != access_choices.PUBLIC
+
+    def get_access(self, file_name):
+        if os.stat(self.local_path(file_name)).st_mode & stat.S_IROTH:
+            return access_choices.PUBLIC
+        return access_choices.PRIVATE
+
+    def size(self, file_name):
+        return os.path.getsize(self.local_path(file_name))
+
+    def read_range(self, file_name, start, end):
+        """Read the bytes from start up to but not including end"""
+        with open(self.local_path(file_name), "rb") as local_file:
+            local_file.seek(start)
+            return local_file.read(end - start)
+
+    def open(self, file_name, mode="rb", content_type=None, access=None):
         # pylint: disable=unused-argument
-        return LocalStorageFile(self, filename, mode)
+        return LocalStorageFile(self, file_name, mode, access)
 
-    def simple_upload(self, filename, contents, content_type=None, access=None):
+    def simple_upload(
+        self, file_name, contents, content_type=None, access=access_choices.PRIVATE
+    ):
         # pylint: disable=unused-argument
-        with self.open(filename, "wb") as local_file:
+        with self.open(file_name, "wb", access=access) as local_file:
             local_file.write(contents)
 
-    def presign_url(self, file_name, _method_name, use_custom_domain=False):
+    def async_upload(
+        self, file_names, contents, content_types=None, access=access_choices.PRIVATE
+    ):
+        """Upload given files"""
+        # pylint: disable=unused-argument
+        for file_name, content in zip(file_names, contents):
+            self.simple_upload(file_name, content, access=access)
+
+    def multipart_upload(
+        self, file_name, contents, content_type=None, access=access_choices.PRIVATE
+    ):
+        """Large files need no special handling locally"""
+        self.simple_upload(file_name, contents, content_type, access)
+
+    def multipart_writer(
+        self, file_name, content_type=None, access=access_choices.PRIVATE, identity=None
+    ):
+        """Large files are written straight to their local file"""
         # pylint: disable=unused-argument
-        return file_name
+        return self.open(file_name, "wb", access=access)
+
+    def download_if_modified(self, file_name, etag, out_file):
+        """Copy a file into `out_file` unless it has not been modified since
+        `etag`.  Returns its ETag, or None if it has not been modified."""
+        local_path = self.local_path(file_name)
+        file_stat = os.stat(local_path)
+        new_etag = f"{file_stat.st_mtime_ns}-{file_stat.st_size}"
+        if new_etag == etag:
+            return None
+        with open(local_path, "rb") as local_file:
+            shutil.copyfileobj(local_file, out_file)
+        return new_etag
+
+    def presign_url(self, file_name, method_name, use_custom_domain=False):
+        """A URL for the `local_storage` view which allows `method_name`
+        ("get_object" or "put_object") on the file for a limited time"""
+        # pylint: disable=unused-argument
+        signature = signing.dumps([file_name, method_name], salt=PRESIGN_SALT)
+        url = reverse("local-storage", kwargs={"file_name": file_name})
+        query = urlencode({"signature": signature})
+        return f"{settings.DOCCLOUD_API_URL}{url}?{query}"
+
+    @staticmethod
+    def check_signature(file_name, method_name, signature):
+        """Check a signature from a presigned URL"""
+        try:
+            signed = signing.loads(
+                signature, salt=PRESIGN_SALT, max_age=PRESIGN_EXPIRES
+            )
+        except signing.BadSignature:
+            return False
+        return signed == [file_name, method_name]
 
     def exists(self, file_name):
-        return os.path.exists(os.path.join(settings.MEDIA_ROOT, file_name))
+        return os.path.exists(self.local_path(file_name))
+
+    def fetch_url(self, url, file_name, access, auth=None):
+        with self.open(file_name, "wb", access=access) as out_file, requests.get(
+            url, stream=True, auth=auth
+        ) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=10 * 1024 * 1024):
+                out_file.write(chunk)
 
     def delete(self, file_prefix):
-        """To be mocked in tests"""
+        for file_name in self.list(file_prefix):
+            os.remove(self.local_path(file_name))
+        if file_prefix.endswith("/"):
+            # remove the directories left empty
+            for directory, _, _ in os.walk(self.local_path(file_prefix), False):
+                if not os.listdir(directory):
+                    os.rmdir(directory)
 
-    def copy(self, src, dst, acl="private"):
-        # pylint: disable=unused-argument
-        shutil.copy(src, dst)
+    def set_access_path(self, file_prefix, access):
+        """Set access for all files with a given prefix"""
+        self.set_access(self.list(file_prefix), access)
+
+    def set_access(self, file_names, access):
+        """Set access for given files"""
+        if not self.sets_acl(access):
+            return
+        for file_name in file_names:
+            os.chmod(self.local_path(file_name), self.file_mode(access))
+
+    def async_set_access(self, file_names, access):
+        """Set access for given files"""
+        self.set_access(file_names, access)
+
+    def async_download(self, file_names):
+        """Read given files, with empty contents for any which could not be
+        read"""
+        data = []
+        for file_name in file_names:
+            try:
+                with open(self.local_path(file_name), "rb") as local_file:
+                    data.append(local_file.read())
+            except OSError:
+                data.append(b"")
+        return data
+
+    def async_size(self, file_names):
+        """Get the size of the given files, or 0 for any which do not exist"""
+        sizes = []
+        for file_name in file_names:
+            try:
+                sizes.append(self.size(file_name))
+            except OSError:
+                sizes.append(0)
+        return sizes
+
+    def list(self, file_prefix, marker=None, limit=None):
+        """List files in the given path
+        marker if given will start from after that file
+        limit will set a max on the number of files returned
+        """
+        prefix_path = self.local_path(file_prefix)
+        if file_prefix.endswith("/"):
+            directory = prefix_path
+        else:
+            directory = os.path.dirname(prefix_path)
+
+        file_names = []
+        for root, _, names in os.walk(directory):
+            for name in names:
+                local_path = os.path.join(root, name)
+                if local_path.startswith(prefix_path):
+                    file_names.append(os.path.relpath(local_path, self.root()))
+
+        file_names.sort()
+        if marker is not None:
+            file_names = [f for f in file_names if f > marker]
+        return file_names[:limit]
+
+    def copy(self, src, dst, acl="private", access=None):
+        if access is None:
+            access = (
+                access_choices.PUBLIC
+                if acl == "public-read"
+                else access_choices.PRIVATE
+            )
+        dst_path = self.local_path(dst)
+        Path(dst_path).parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(self.local_path(src), dst_path)
+        os.chmod(dst_path, self.file_mode(access))
 
     def get_expires_at(self, _file_name):
         return None
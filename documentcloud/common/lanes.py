@@ -0,0 +1,139 @@
+"""
+Priority lanes for processing messages, so that bulk work (imports and bulk
+reprocessing) does not hold up documents a user is waiting on.
+
+Work is started in a lane - interactive by default - which is stored under
+the `lane` key of its message, along with the organization it is for.  When
+a processing function reads a message, its lane is noted, and every message
+it publishes is tagged with the same lane, so the whole pipeline for a
+document stays in the lane it was started in.
+
+How the lanes are scheduled depends on the environment:
+
+    * The local pool executor queues messages in a `FairQueue`, serving the
+      lanes by their weights and the organizations within a lane in turn
+    * Local Celery tasks are queued with a priority for their lane
+    * AWS lambda functions do not schedule by lane
+
+In every environment, bulk processing requested through the API is also held
+back before it reaches the pipeline, and started a limited number of documents
+at a time, taking from each organization in turn (see
+`documents.tasks.dispatch_bulk_process`).
+"""
+
+# Standard Library
+import collections
+import functools
+
+# Third Party
+import environ
+
+env = environ.Env()
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
+LANE_KEY = "lane"
+
+# The relative share of workers each lane gets when both have work waiting
+LANE_WEIGHTS = {
+    INTERACTIVE: env.int("INTERACTIVE_LANE_WEIGHT", default=4),
+    BULK: env.int("BULK_LANE_WEIGHT", default=1),
+}
+
+# The lane of the message currently being handled in this process
+_current = None
+
+
+def lane(priority, org_id=None):
+    """A lane to store in a message"""
+    return {"priority": priority, "org_id": org_id}
+
+
+def receive(data):
+    """Note the lane of a message being handled, so that the messages
+    published while handling it stay in the same lane"""
+    global _current  # pylint: disable=global-statement
+    _current = data.get(LANE_KEY) if isinstance(data, dict) else None
+
+
+def scoped(func):
+    """Wrap a function which handles a message, so that the message's lane is
+    forgotten once it returns and not applied to the next message handled by
+    the same process"""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        global _current  # pylint: disable=global-statement
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current = None
+
+    return wrapper
+
+
+def tag(data):
+    """Tag a message to be published with the lane of the message being
+    handled, unless it is already in a lane"""
+    if _current is not None and isinstance(data, dict) and LANE_KEY not in data:
+        return {**data, LANE_KEY: _current}
+    return data
+
+
+def get_lane(data):
+    """The priority and organization of a message"""
+    lane_ = data.get(LANE_KEY) if isinstance(data, dict) else None
+    if not lane_:
+        return INTERACTIVE, None
+    priority = lane_.get("priority")
+    return priority if priority in LANE_WEIGHTS else INTERACTIVE, lane_.get("org_id")
+
+
+class FairQueue:
+    """A queue of messages which serves lanes in proportion to their weights,
+    and the organizations within each lane in turn, so that neither a lane nor
+    a single organization can starve the others
+
+    Lanes are scheduled by stride scheduling - each lane advances its pass by
+    the inverse of its weight whenever an item is taken from it, and the
+    waiting lane with the lowest pass goes next.
+    """
+
+    def __init__(self, weights=None):
+        self.weights = weights or LANE_WEIGHTS
+        # Lane -> organization -> items, in the order organizations are served
+        self.lanes = {priority: collections.OrderedDict() for priority in self.weights}
+        self.passes = {priority: 0.0 for priority in self.weights}
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def put(self, item, priority=INTERACTIVE, org_id=None):
+        orgs = self.lanes[priority]
+        if not orgs:
+            # A lane which was idle does not get to catch up on its share
+            waiting = [self.passes[p] for p, o in self.lanes.items() if o]
+            if waiting:
+                self.passes[priority] = max(self.passes[priority], min(waiting))
+        orgs.setdefault(org_id, collections.deque()).append(item)
+        self.size += 1
+
+    def get(self):
+        """Take the next item, or None if the queue is empty"""
+        waiting = [priority for priority, orgs in self.lanes.items() if orgs]
+        if not waiting:
+            return None
+        priority = min(waiting, key=lambda p: self.passes[p])
+        self.passes[priority] += 1 / self.weights[priority]
+
+        # Take from the organization at the front of the lane, and move it to
+        # the back if it has more waiting
+        orgs = self.lanes[priority]
+        org_id, items = orgs.popitem(last=False)
+        item = items.popleft()
+        if items:
+            orgs[org_id] = items
+        self.size -= 1
+        return item
@@ -16,6 +16,15 @@ IMAGE_SUFFIX = "gif"
 TEXT_SUFFIX = "txt"
 SELECTABLE_TEXT_SUFFIX = "position.json"
 JSON_TEXT_SUFFIX = "txt.json"
+PROCESSED_SUFFIX = "processed"
+PAGE_HASHES_SUFFIX = "pagehashes.json"
+
+# The image format to use for each page image size, if not IMAGE_SUFFIX,
+# specified as "size=format,..." (e.g. "xlarge=webp,large=webp,thumbnail=png").
+# Each document records the formats its page images were written in (see
+# `crunch_image_formats`), so this may be changed without breaking the
+# documents processed before.
+PAGE_IMAGE_FORMATS = env.dict("PAGE_IMAGE_FORMATS", default={})
 
 
 def temp(doc_id):
@@ -67,14 +76,52 @@ def json_text_path(doc_id, slug):
     return file_path(doc_id, slug, JSON_TEXT_SUFFIX)
 
 
+def page_hashes_path(doc_id, slug):
+    """The path to the hashes of each page's contents, used to find the pages
+    which have changed when reprocessing"""
+    return file_path(doc_id, slug, PAGE_HASHES_SUFFIX)
+
+
+def processed_marker_path(doc_id, slug):
+    """The path to the marker recording which processed file this document's
+    files were processed from"""
+    return file_path(doc_id, slug, PROCESSED_SUFFIX)
+
+
+def processed_path(file_hash, settings_key):
+    """The path to the record of a document processed from a file with the given
+    hash using the given processing settings"""
+    return f"{DOCUMENT_BUCKET}/processed/{file_hash}/{settings_key}.json"
+
+
 def pages_path(doc_id):
     """The path to the pages directory for this document"""
     return path(doc_id) + "pages/"
 
 
+def page_image_format(page_size):
+    """The image format used for a page image size"""
+    return PAGE_IMAGE_FORMATS.get(page_size, IMAGE_SUFFIX)
+
+
+def crunch_image_formats(image_formats):
+    """Compress page image formats into the form recorded for a document - the
+    "size=format,..." form of PAGE_IMAGE_FORMATS, sorted and without the sizes
+    which use IMAGE_SUFFIX, so that documents from before the formats could be
+    changed are recorded as an empty string"""
+    return ",".join(
+        f"{page_size}={image_format}"
+        for page_size, image_format in sorted(image_formats.items())
+        if image_format != IMAGE_SUFFIX
+    )
+
+
 def page_image_path(doc_id, slug, page_number, page_size):
     """The path to the image file for a single page"""
-    return pages_path(doc_id) + f"{slug}-p{page_number + 1}-{page_size}.{IMAGE_SUFFIX}"
+    return (
+        pages_path(doc_id)
+        + f"{slug}-p{page_number + 1}-{page_size}.{page_image_format(page_size)}"
+    )
 
 
 def page_text_path(doc_id, slug, page_number):
@@ -43,6 +43,10 @@ def page_text_pdf(doc_id):
     return f"{doc_id}:pagetextpdf"
 
 
+def page_ocr_image(doc_id):
+    return f"{doc_id}:pageocrimage"
+
+
 def is_running(doc_id):
     return f"{doc_id}:running"
 
@@ -63,9 +67,29 @@ def file_hash(doc_id):
     return f"{doc_id}:fileHash"
 
 
+def page_hashes(doc_id):
+    return f"{doc_id}:pageHashes"
+
+
+def checkpoint(doc_id):
+    return f"{doc_id}:checkpoint"
+
+
+def processed(doc_id):
+    return f"{doc_id}:processed"
+
+
 def import_pagespecs(org_id):
     return f"{org_id}:pagespec"
 
 
 def import_docs_remaining(org_id):
     return f"{org_id}:docsRemaining"
+
+
+def stage_timings(stage):
+    return f"timings:{stage}"
+
+
+def trace(doc_id):
+    return f"{doc_id}:trace"
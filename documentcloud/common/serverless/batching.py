@@ -0,0 +1,111 @@
+"""
+Plan the number of pages each invocation of a processing stage handles.
+
+The time taken per page in each stage is recorded in Redis as batches finish,
+along with the average size of the pages of the document, and batch sizes for
+new documents are chosen so that each invocation should take around
+`BATCH_TARGET_SECONDS`.
+"""
+
+# Standard Library
+import logging
+import math
+import statistics
+
+# Third Party
+import environ
+
+# Local
+from .. import redis_fields
+from .error_handling import TIMEOUTS
+
+env = environ.Env()
+logger = logging.getLogger(__name__)
+
+ADAPTIVE_BATCHING = env.bool("ADAPTIVE_BATCHING", default=False)
+# Aim for half of the first timeout by default, leaving room for slow pages
+BATCH_TARGET_SECONDS = env.float(
+    "BATCH_TARGET_SECONDS", default=TIMEOUTS[0] / 2 if TIMEOUTS else 60
+)
+# Number of recent timings to keep for each stage
+BATCH_TIMING_SAMPLES = env.int("BATCH_TIMING_SAMPLES", default=50)
+# Keep timings for a week, so idle deployments start from the defaults again
+BATCH_TIMING_TTL = env.int("BATCH_TIMING_TTL", default=7 * 86400)
+# Limit how much the page size of a document may scale the timings
+MIN_SIZE_RATIO = 0.25
+MAX_SIZE_RATIO = 4
+
+
+def record_timing(redis, stage, elapsed, page_count, bytes_per_page=None):
+    """Record the time a batch of a stage took"""
+    if not ADAPTIVE_BATCHING or page_count <= 0:
+        return
+    field = redis_fields.stage_timings(stage)
+    pipeline = redis.pipeline(transaction=False)
+    pipeline.lpush(field, f"{elapsed / page_count}:{bytes_per_page or 0}")
+    pipeline.ltrim(field, 0, BATCH_TIMING_SAMPLES - 1)
+    pipeline.expire(field, BATCH_TIMING_TTL)
+    pipeline.execute()
+
+
+def get_timings(redis, stage):
+    """Get the recorded (seconds per page, bytes per page) for a stage"""
+    timings = []
+    for sample in redis.lrange(redis_fields.stage_timings(stage), 0, -1):
+        seconds, bytes_per_page = sample.decode("utf8").split(":")
+        timings.append((float(seconds), float(bytes_per_page)))
+    return timings
+
+
+def estimate_seconds_per_page(timings, bytes_per_page=None):
+    """Estimate the time a page will take from recorded timings, scaled by how
+    large this document's pages are compared to the recorded ones"""
+    if not timings:
+        return None
+    seconds = statistics.median(seconds for seconds, _ in timings)
+    sizes = [size for _, size in timings if size > 0]
+    if bytes_per_page and sizes:
+        ratio = bytes_per_page / statistics.median(sizes)
+        seconds *= min(max(ratio, MIN_SIZE_RATIO), MAX_SIZE_RATIO)
+    return seconds
+
+
+class BatchPlanner:
+    """Chooses the batch size for a stage, within configured bounds"""
+
+    def __init__(self, stage, default, min_size=1, max_size=None):
+        self.stage = stage
+        self.default = default
+        self.min_size = min_size
+        self.max_size = max(default, min_size) if max_size is None else max_size
+
+    def plan(self, redis, page_count, bytes_per_page=None):
+        """Get the batch size to use for a document"""
+        if not ADAPTIVE_BATCHING:
+            return self.default
+
+        seconds_per_page = estimate_seconds_per_page(
+            get_timings(redis, self.stage), bytes_per_page
+        )
+        if seconds_per_page is None:
+            size = self.default
+        elif seconds_per_page <= 0:
+            size = self.max_size
+        else:
+            size = int(BATCH_TARGET_SECONDS / seconds_per_page)
+        size = min(max(size, self.min_size), self.max_size)
+
+        if page_count > 0:
+            # Spread the pages evenly over the batches that are needed, so the
+            # final batch is not left with a handful of pages
+            batches = math.ceil(page_count / size)
+            size = max(math.ceil(page_count / batches), self.min_size)
+
+        logger.info(
+            "[BATCHING] stage %s page_count %s seconds_per_page %s batch %s",
+            self.stage,
+            page_count,
+            seconds_per_page,
+            size,
+        )
+        return size
@@ -15,7 +15,7 @@ from pebble import concurrent
 from pebble.common import ProcessExpired
 
 # Local
-from .. import redis_fields
+from .. import lanes, redis_fields, tracing
 from ..environment import encode_pubsub_data, get_pubsub_data, publisher
 from . import utils
 
@@ -27,23 +27,69 @@ DEFAULT_TIMEOUTS = TIMEOUTS if USE_TIMEOUT else None
 RUN_COUNT = "runcount"
 
 
+def collect_published(func, *args, **kwargs):
+    """Run a function in a forked process, returning its result along with the
+    messages it published to the local pool executor's outbox"""
+    publisher.outbox = []
+    return func(*args, **kwargs), publisher.outbox
+
+
+def call_forked(timeout, func, *args, **kwargs):
+    """Call a function in a forked process, raising `futures.TimeoutError` if it
+    does not finish within `timeout` seconds
+
+    When run by a worker of the local pool executor (see
+    `common/environment/local/executor.py`), messages published by the forked
+    process would be lost with its copy of the worker's outbox, so they are
+    sent back with the result and added to the worker's outbox.
+    """
+    if getattr(publisher, "outbox", None) is None:
+        return concurrent.process(timeout=timeout)(func)(*args, **kwargs).result()
+    result, published = (
+        concurrent.process(timeout=timeout)(collect_published)(func, *args, **kwargs)
+        .result()
+    )
+    publisher.outbox.extend(published)
+    return result
+
+
 def pubsub_function(
-    redis, pubsub_topic, timeouts=DEFAULT_TIMEOUTS, skip_processing_check=False
+    redis,
+    pubsub_topic,
+    timeouts=DEFAULT_TIMEOUTS,
+    skip_processing_check=False,
+    prepare=None,
 ):
+    """Wrap a cloud function with timeouts, retries and error handling
+
+    `prepare` is an optional function which is passed the pubsub data and run
+    in the long lived process before the function itself is forked off to run
+    with a timeout.  Any state it sets up, such as loaded models, is inherited
+    by the function and kept around for future invocations.
+
+    Each invocation is traced under the name of the function when tracing is
+    enabled (see `common/tracing.py`).
+    """
+
     # pylint: disable=unnecessary-lambda-assignment
     def decorator(func):
         def wrapper(*args, **kwargs):
             def err_handle_func(*args_, **kwargs_):
+                tracing.start(doc_id, func.__name__, data.get(RUN_COUNT, 0))
+                status = "ok"
                 # We want to handle arbitrary exceptions from within the concurrent
                 # thread so that Sentry has the full traceback
                 try:
                     return func(*args_, **kwargs_)
                 except Exception as exc:  # pylint: disable=broad-except
                     # Handle any error that comes up during function execution
+                    status = "error"
                     utils.send_error(
                         redis, None if skip_processing_check else doc_id, exc=exc
                     )
                     return f"An error has occurred: {exc}"
+                finally:
+                    tracing.finish(redis, status)
 
             # Get data
             data = get_pubsub_data(args[0])
@@ -64,6 +110,14 @@ def pubsub_function(
                 )
                 return "ok"
 
+            if prepare is not None:
+                try:
+                    prepare(data)
+                except Exception as exc:  # pylint: disable=broad-except
+                    # Preparation is only an optimization - the function
+                    # will set up anything it needs itself if it failed
+                    logging.warning("Preparation failed: %s", exc, exc_info=True)
+
             if USE_TIMEOUT and timeouts is not None:
                 # Handle exceeding maximum number of retries
                 run_count = data.get(RUN_COUNT, 0)
@@ -78,11 +132,12 @@ def pubsub_function(
 
                 # Set up the timeout
                 timeout_seconds = timeouts[run_count]
-                concurrent_func = concurrent.process(timeout=timeout_seconds)(
-                    err_handle_func
+                # The forked process is killed if it times out, so the trace of
+                # a timed out invocation is saved from here
+                timeout_trace = tracing.Trace(doc_id, func.__name__, run_count)
+                func_ = lambda: call_forked(
+                    timeout_seconds, err_handle_func, *args, **kwargs
                 )
-                future = concurrent_func(*args, **kwargs)
-                func_ = future.result
             else:
                 func_ = lambda: err_handle_func(*args, **kwargs)
 
@@ -90,6 +145,8 @@ def pubsub_function(
                 # Run the function as originally intended
                 return func_()
             except futures.TimeoutError:
+                if tracing.TRACING and doc_id is not None:
+                    tracing.save(redis, timeout_trace, "timeout")
                 # Retry the function with increased run count
                 logging.warning(
                     "Function timed out: doc_id: %s retrying (run %d)",
@@ -99,7 +156,7 @@ def pubsub_function(
                 data[RUN_COUNT] = run_count + 1
                 publisher.publish(pubsub_topic, data=encode_pubsub_data(data))
 
-        return wraps(func)(wrapper)
+        return wraps(func)(lanes.scoped(wrapper))
 
     return decorator
 
@@ -116,12 +173,10 @@ def pubsub_function_import(redis, finish_pubsub_topic):
 
             # Set up the timeout
             timeout_seconds = 800  # lambda timeout is 900
-            concurrent_func = concurrent.process(timeout=timeout_seconds)(func)
-            future = concurrent_func(*args, **kwargs)
 
             try:
                 # Run the function as originally intended
-                return future.result()
+                return call_forked(timeout_seconds, func, *args, **kwargs)
             except (futures.TimeoutError, ProcessExpired, MemoryError):
                 # if we timeout or have, skip to finish import
                 # sometimes we have odd ProcessExpired exceptions - just skip
@@ -139,6 +194,6 @@ def pubsub_function_import(redis, finish_pubsub_topic):
                 logging.error(exc, exc_info=sys.exc_info())
                 return "An error has occurred"
 
-        return wraps(func)(wrapper)
+        return wraps(func)(lanes.scoped(wrapper))
 
     return decorator
@@ -0,0 +1,133 @@
+"""
+Lua scripts to atomically update and check the page tasks of a document in
+Redis in a single round trip, instead of using WATCH transactions which retry
+under contention.
+"""
+
+# Local
+from .. import redis_fields
+
+# Register pages as done, returning the remaining count and how many of the
+# pages were not already registered
+# KEYS[1]: remaining count, KEYS[2]: page bits
+# ARGV: page numbers
+REGISTER_PAGE_TASKS = """
+local registered = 0
+for _, page in ipairs(ARGV) do
+    if redis.call("SETBIT", KEYS[2], page, 1) == 0 then
+        registered = registered + 1
+    end
+end
+local remaining
+if registered > 0 then
+    remaining = redis.call("DECRBY", KEYS[1], registered)
+else
+    remaining = tonumber(redis.call("GET", KEYS[1]) or "0")
+end
+return {remaining, registered}
+"""
+
+# Get the bits of pages from several bit fields
+# KEYS: page bits
+# ARGV: page numbers
+GET_PAGE_BITS = """
+local result = {}
+for i, key in ipairs(KEYS) do
+    local bits = {}
+    for j, page in ipairs(ARGV) do
+        bits[j] = redis.call("GETBIT", key, page)
+    end
+    result[i] = bits
+end
+return result
+"""
+
+# Add page numbers to the sets of pages for their dimensions
+# KEYS[1]: dimensions, KEYS[2..n]: page dimension set for each page
+# ARGV[1]: expiration, followed by the dimension and page number for each page
+ADD_PAGE_DIMENSIONS = """
+for i = 2, #KEYS do
+    redis.call("SADD", KEYS[1], ARGV[2 * i - 2])
+    redis.call("SADD", KEYS[i], ARGV[2 * i - 1])
+    redis.call("EXPIRE", KEYS[i], ARGV[1])
+end
+if #KEYS > 1 then
+    redis.call("EXPIRE", KEYS[1], ARGV[1])
+end
+return #KEYS - 1
+"""
+
+# Get every dimension along with the pages that have it
+# KEYS[1]: dimensions
+# ARGV[1]: prefix of the page dimension sets
+GET_PAGE_DIMENSIONS = """
+local result = {}
+for _, dimension in ipairs(redis.call("SMEMBERS", KEYS[1])) do
+    table.insert(result, {dimension, redis.call("SMEMBERS", ARGV[1] .. dimension)})
+end
+return result
+"""
+
+_scripts = {}
+
+
+def run_script(redis, source, keys, args):
+    """Run a script, only sending its source to Redis if it is not loaded"""
+    script = _scripts.get(source)
+    if script is None:
+        script = _scripts[source] = redis.register_script(source)
+    return script(keys=keys, args=args, client=redis)
+
+
+def register_page_tasks(
+    redis, page_numbers, remaining_field, bits_field, first_to_finish=False
+):
+    """Register pages of a generic page task as done.
+
+    Returns true if all pages are done.  Registering pages again, as a retried
+    function does, returns true again so that the retry can still start the
+    work which depends on the task.  With `first_to_finish`, only returns true
+    if at least one of these pages was not previously registered - i.e. this
+    call finished the task."""
+    if not page_numbers:
+        return False
+    remaining, registered = run_script(
+        redis, REGISTER_PAGE_TASKS, [remaining_field, bits_field], page_numbers
+    )
+    if first_to_finish and registered == 0:
+        return False
+    return remaining == 0
+
+
+def get_page_bits(redis, bits_fields, page_numbers):
+    """Get the bits for the pages in each of the bit fields"""
+    if not page_numbers:
+        return [[] for _ in bits_fields]
+    result = run_script(redis, GET_PAGE_BITS, bits_fields, page_numbers)
+    return [[bit == 1 for bit in bits] for bits in result]
+
+
+def add_page_dimensions(redis, doc_id, page_dimensions, expire):
+    """Add page dimensions, given as a list of (page number, dimension)"""
+    if not page_dimensions:
+        return
+    keys = [redis_fields.dimensions(doc_id)]
+    args = [expire]
+    for page_number, page_dimension in page_dimensions:
+        keys.append(redis_fields.page_dimension(doc_id, page_dimension))
+        args.extend([page_dimension, page_number])
+    run_script(redis, ADD_PAGE_DIMENSIONS, keys, args)
+
+
+def get_page_dimensions(redis, doc_id):
+    """Get a dictionary of each dimension to the page numbers with it"""
+    result = run_script(
+        redis,
+        GET_PAGE_DIMENSIONS,
+        [redis_fields.dimensions(doc_id)],
+        [redis_fields.page_dimension(doc_id, "")],
+    )
+    return {
+        dimension.decode("utf8"): [int(page_number) for page_number in page_numbers]
+        for dimension, page_numbers in result
+    }
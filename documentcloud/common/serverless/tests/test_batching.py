@@ -0,0 +1,42 @@
+# Standard Library
+from unittest.mock import patch
+
+# DocumentCloud
+from documentcloud.common.serverless import batching
+
+BATCHING = "documentcloud.common.serverless.batching"
+
+
+def test_estimate_seconds_per_page():
+    timings = [(1.0, 1000), (2.0, 1000), (3.0, 1000)]
+    assert batching.estimate_seconds_per_page([]) is None
+    assert batching.estimate_seconds_per_page(timings) == 2.0
+    # Pages twice as large are expected to take twice as long
+    assert batching.estimate_seconds_per_page(timings, 2000) == 4.0
+    # The scaling is bounded
+    assert batching.estimate_seconds_per_page(timings, 1000000) == 8.0
+
+
+@patch(f"{BATCHING}.ADAPTIVE_BATCHING", False)
+def test_plan_disabled():
+    planner = batching.BatchPlanner("stage", 55, max_size=200)
+    assert planner.plan(None, 1000) == 55
+
+
+@patch(f"{BATCHING}.ADAPTIVE_BATCHING", True)
+@patch(f"{BATCHING}.BATCH_TARGET_SECONDS", 60)
+def test_plan():
+    planner = batching.BatchPlanner("stage", 55, max_size=200)
+    with patch(f"{BATCHING}.get_timings", return_value=[]):
+        # No timings recorded yet, so the default is spread evenly
+        assert planner.plan(None, 100) == 50
+    with patch(f"{BATCHING}.get_timings", return_value=[(2.0, 0)]):
+        assert planner.plan(None, 1000) == 30
+        # Small documents are done in a single batch
+        assert planner.plan(None, 20) == 20
+    with patch(f"{BATCHING}.get_timings", return_value=[(0.01, 0)]):
+        # Clamped to the maximum
+        assert planner.plan(None, 1000) == 200
+    with patch(f"{BATCHING}.get_timings", return_value=[(600.0, 0)]):
+        # Clamped to the minimum
+        assert planner.plan(None, 10) == 1
@@ -1,5 +1,6 @@
 # Django
 from django.conf import settings
+from django.test import override_settings
 
 # Standard Library
 import ctypes
@@ -45,12 +46,12 @@ def encode(data):
     return encode_published_pubsub_data(encode_pubsub_data(data))
 
 
-def with_timeout(timeouts):
+def with_timeout(timeouts, prepare=None):
     def decorator(func):
         def wrapper(*args, **kwargs):
             topic_name = uuid.uuid4()
             topic = ("test_error_handling", topic_name)
-            wrapped_fn = pubsub_function(redis, topic, timeouts)(func)
+            wrapped_fn = pubsub_function(redis, topic, timeouts, prepare=prepare)(func)
             publisher.register_internal_callback(topic, wrapped_fn)
             return wrapped_fn(*args, **kwargs)
 
@@ -117,21 +118,30 @@ def timeout_on_second_try(data):
     communicate_data("Done", data)
 
 
+# State set up in the parent process by the prepare function
+prepared = {}
+
+
+def prepare_doc(data):
+    prepared[data["doc_id"]] = True
+
+
+@with_timeout([1, 2, 4], prepare=prepare_doc)
+def success_with_prepare(data):
+    data = get_pubsub_data(data)
+    communicate_data("Prepared", prepared.get(data["doc_id"], False))
+
+
 @with_timeout([1])
 def timeout_cfunctype(_data):
-    pdf = os.path.join(
-        settings.ROOT_DIR,
-        "documentcloud",
-        "documents",
-        "processing",
-        "tests",
-        "pdfs",
-        "doc_3.pdf",
+    pdfs = os.path.join(
+        settings.ROOT_DIR, "documentcloud", "documents", "processing", "tests", "pdfs"
     )
-    with Workspace() as workspace, SlowStorageHandler(
-        storage, pdf
-    ) as pdf_file, workspace.load_document_custom(pdf_file) as doc:
-        return doc.load_page(1)
+    with override_settings(MEDIA_ROOT=pdfs):
+        with Workspace() as workspace, SlowStorageHandler(
+            storage, "doc_3.pdf"
+        ) as pdf_file, workspace.load_document_custom(pdf_file) as doc:
+            return doc.load_page(1)
 
 
 @pytest.mark.slow
@@ -207,6 +217,19 @@ class TestErrorHandling:
             call("Pending", {"doc_id": 1, "runcount": 1}),
         ]
 
+    @patch("documentcloud.common.serverless.error_handling.USE_TIMEOUT", True)
+    @patch(
+        "documentcloud.common.serverless.tests.test_error_handling.communicate_data",
+        new_callable=SharedMock,
+    )
+    @patch("documentcloud.common.serverless.utils.send_error", new_callable=SharedMock)
+    def test_success_with_prepare(self, mock_send_error, mock_communicate_data):
+        success_with_prepare(encode({"doc_id": 1}))
+        assert mock_send_error.call_count == 0
+        # The function sees the state prepared in the parent process
+        assert mock_communicate_data.mock_calls == [call("Prepared", True)]
+        assert prepared == {1: True}
+
     @patch("documentcloud.common.serverless.error_handling.USE_TIMEOUT", True)
     @patch("documentcloud.common.serverless.utils.send_error")
     def test_timeout_cfunctype(self, mock_send_error):
@@ -0,0 +1,80 @@
+# Standard Library
+from unittest.mock import patch
+
+# Third Party
+import pytest
+
+# DocumentCloud
+from documentcloud.common import redis_fields
+from documentcloud.common.serverless import utils
+
+UTILS = "documentcloud.common.serverless.utils"
+
+
+@pytest.mark.parametrize("compression", ["", "zlib"])
+def test_page_text_round_trip(compression):
+    with patch(f"{UTILS}.PAGE_TEXT_COMPRESSION", compression):
+        value = utils.encode_page_text("hello world " * 20, "tess4", "spa")
+    assert (value[:1] == b"{") == (compression == "")
+    assert utils.decode_page_text(value) == {
+        "text": "hello world " * 20,
+        "ocr": "tess4",
+        "ocr_code": "spa",
+    }
+
+
+def test_decode_page_text_any_setting():
+    """Values written with one setting can be read after it is changed"""
+    with patch(f"{UTILS}.PAGE_TEXT_COMPRESSION", "zlib"):
+        value = utils.encode_page_text("text", None)
+    with patch(f"{UTILS}.PAGE_TEXT_COMPRESSION", ""):
+        assert utils.decode_page_text(value)["text"] == "text"
+
+
+def test_unset_bits():
+    # Bits are numbered from the most significant bit of the first byte
+    assert utils.unset_bits(b"\xf0\x80", 10) == [4, 5, 6, 7, 9]
+    assert utils.unset_bits(b"\xff", 10) == [8, 9]
+    assert utils.unset_bits(None, 3) == [0, 1, 2]
+
+
+def test_checkpoint_expires():
+    redis = utils.get_redis()
+    doc_id = -1
+    utils.clean_up(redis, doc_id)
+    utils.initialize(redis, doc_id)
+    # Nothing to resume from without a checkpoint
+    assert not utils.checkpoint(redis, doc_id)
+
+    redis.set(redis_fields.page_count(doc_id), 3)
+    redis.setbit(redis_fields.image_bits(doc_id), 0, 1)
+    redis.hset(redis_fields.page_text(doc_id), "0", b"text")
+    redis.sadd(redis_fields.dimensions(doc_id), "612x792")
+    redis.set(redis_fields.page_dimension(doc_id, "612x792"), "0")
+    redis.hset(redis_fields.checkpoint(doc_id), "image_batch", 1)
+    keys = [key for key in utils.progress_keys(redis, doc_id) if redis.exists(key)]
+    assert redis_fields.page_dimension(doc_id, "612x792") in keys
+    assert len(keys) == 6
+
+    with patch(f"{UTILS}.CHECKPOINT_TTL", 1):
+        assert utils.checkpoint(redis, doc_id)
+    assert not utils.still_processing(redis, doc_id)
+    assert all(0 <= redis.ttl(key) <= 1 for key in keys)
+
+
+@pytest.mark.parametrize(
+    "result, first_to_finish, finished",
+    [
+        ((0, 2), False, True),
+        ((3, 2), False, False),
+        # Pages registered again by a retry still report the task as done
+        ((0, 0), False, True),
+        ((0, 0), True, False),
+        ((0, 1), True, True),
+    ],
+)
+def test_register_pages_extracted(result, first_to_finish, finished):
+    with patch(f"{UTILS}.redis_scripts.run_script", return_value=result):
+        assert (
+            utils.register_pages_extracted(None, 1, [0, 1], first_to_finish) == finished
+        )
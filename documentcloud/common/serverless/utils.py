@@ -5,7 +5,10 @@ Helper functions to perform common serverless operations.
 # Standard Library
 import json
 import logging
+import math
+import os
 import time
+import zlib
 from urllib.parse import urljoin
 
 # Third Party
@@ -13,11 +16,13 @@ import environ
 import furl
 import redis as _redis
 import requests
+from redis.client import Pipeline
 from redis.lock import Lock
 
 # Local
-from .. import redis_fields
+from .. import redis_fields, tracing
 from ..environment import encode_pubsub_data, publisher
+from . import redis_scripts
 
 env = environ.Env()
 
@@ -56,6 +61,67 @@ RETRY_ERROR_TOPIC = publisher.topic_path(
     "documentcloud", env.str("RETRY_ERROR_TOPIC", default="retry-error-topic")
 )
 REDIS_TTL = env.int("REDIS_TTL", default=86400)
+# How long to keep the progress of a document which failed processing, so that
+# processing may be resumed
+CHECKPOINT_TTL = env.int("CHECKPOINT_TTL", default=7 * 86400)
+# Compression for page text stored in Redis - none, zlib or zstd (which
+# requires the zstandard package)
+PAGE_TEXT_COMPRESSION = env.str("PAGE_TEXT_COMPRESSION", default="")
+# Number of pages to read from Redis at a time when reading page text
+PAGE_TEXT_READ_BATCH = env.int("PAGE_TEXT_READ_BATCH", default=100)
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def available_cpus():
+    """The number of CPUs this container may use, taking its CPU quota into
+    account when running under cgroups
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    quota = period = None
+    try:
+        # cgroup v2
+        with open("/sys/fs/cgroup/cpu.max", encoding="utf8") as cpu_max:
+            quota, period = cpu_max.read().split()
+    except (OSError, ValueError):
+        try:
+            # cgroup v1
+            with open(
+                "/sys/fs/cgroup/cpu/cpu.cfs_quota_us", encoding="utf8"
+            ) as quota_file, open(
+                "/sys/fs/cgroup/cpu/cpu.cfs_period_us", encoding="utf8"
+            ) as period_file:
+                quota, period = quota_file.read().strip(), period_file.read().strip()
+        except OSError:
+            pass
+
+    if quota not in (None, "max", "-1") and int(period) > 0:
+        cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    return cpus
+
+
+class TracedRedis(_redis.Redis):
+    """A Redis client which times its commands as part of the current trace"""
+
+    def execute_command(self, *args, **options):
+        with tracing.span("redis"):
+            return super().execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return TracedPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint
+        )
+
+
+class TracedPipeline(Pipeline):
+    """A Redis pipeline which times its execution as part of the current trace"""
+
+    def execute(self, raise_on_error=True):
+        with tracing.span("redis"):
+            return super().execute(raise_on_error)
 
 
 def get_redis():
@@ -75,7 +141,15 @@ def get_redis():
     if REDIS_PASSWORD and not REDIS_PASSWORD.isspace():
         kwargs["password"] = REDIS_PASSWORD
 
-    return _redis.Redis(**kwargs)
+    return TracedRedis(**kwargs)
+
+
+def read_json(storage, file_name):
+    """Read a JSON file from storage, or return None if it does not exist"""
+    if not storage.exists(file_name):
+        return None
+    with storage.open(file_name, "rb") as json_file:
+        return json.loads(json_file.read())
 
 
 def pop_file_hash(redis, doc_id):
@@ -171,8 +245,8 @@ def send_error(redis, doc_id, exc=None, message=None):
         logging.error(message)
         capture_message(message)
 
-    # Clean out Redis
-    if doc_id:
+    # Clean out Redis, keeping the progress made if processing may be resumed
+    if doc_id and not checkpoint(redis, doc_id):
         clean_up(redis, doc_id)
 
 
@@ -215,6 +289,10 @@ def clean_up(redis, doc_id):
             redis_fields.text_position_bits(doc_id),
             redis_fields.page_text(doc_id),
             redis_fields.page_text_pdf(doc_id),
+            redis_fields.page_ocr_image(doc_id),
+            redis_fields.processed(doc_id),
+            redis_fields.page_hashes(doc_id),
+            redis_fields.checkpoint(doc_id),
         )
 
         # Remove any existing dimensions that may be lingering
@@ -228,6 +306,94 @@ def clean_up(redis, doc_id):
     redis.transaction(remove_all, dimensions_field)
 
 
+def progress_keys(redis, doc_id):
+    """The keys holding the progress of processing a document"""
+    dimensions_field = redis_fields.dimensions(doc_id)
+    dimensions = redis.smembers(dimensions_field) or []
+    return [
+        redis_fields.images_remaining(doc_id),
+        redis_fields.texts_remaining(doc_id),
+        redis_fields.text_positions_remaining(doc_id),
+        redis_fields.page_count(doc_id),
+        redis_fields.image_bits(doc_id),
+        redis_fields.text_bits(doc_id),
+        redis_fields.text_position_bits(doc_id),
+        redis_fields.page_text(doc_id),
+        redis_fields.page_text_pdf(doc_id),
+        redis_fields.page_ocr_image(doc_id),
+        redis_fields.file_hash(doc_id),
+        redis_fields.processed(doc_id),
+        redis_fields.page_hashes(doc_id),
+        redis_fields.checkpoint(doc_id),
+        dimensions_field,
+    ] + [
+        redis_fields.page_dimension(doc_id, dimension.decode("utf8"))
+        for dimension in dimensions
+    ]
+
+
+def expire_progress(redis, doc_id, ttl):
+    """Set how long to keep the progress of processing a document"""
+    pipeline = redis.pipeline()
+    for key in progress_keys(redis, doc_id):
+        pipeline.expire(key, ttl)
+    pipeline.execute()
+
+
+def has_checkpoint(redis, doc_id):
+    """Returns whether processing the doc_id may be resumed"""
+    return bool(redis.exists(redis_fields.checkpoint(doc_id)))
+
+
+def checkpoint(redis, doc_id):
+    """Stop processing a document which has failed, keeping the progress made
+    so that processing may be resumed.  Returns False if it can not be resumed."""
+    if not has_checkpoint(redis, doc_id):
+        return False
+    redis.delete(redis_fields.is_running(doc_id))
+    expire_progress(redis, doc_id, CHECKPOINT_TTL)
+    return True
+
+
+def resume(redis, doc_id):
+    """Keep the progress of a document for as long as it is processing again"""
+    expire_progress(redis, doc_id, REDIS_TTL)
+
+
+def unset_bits(bits, count):
+    """The positions of the bits which are not set in the first `count` bits of
+    a Redis bit field"""
+    bits = bits or b""
+    return [
+        position
+        for position in range(count)
+        if position // 8 >= len(bits) or not bits[position // 8] & 128 >> position % 8
+    ]
+
+
+def unfinished_pages(redis, doc_id, page_count):
+    """The pages which have not had their images extracted, text extracted and
+    text positions extracted.  The counts of remaining pages are reset to match,
+    in case any were lost."""
+    remaining_fields = [
+        redis_fields.images_remaining(doc_id),
+        redis_fields.texts_remaining(doc_id),
+        redis_fields.text_positions_remaining(doc_id),
+    ]
+    pipeline = redis.pipeline()
+    pipeline.get(redis_fields.image_bits(doc_id))
+    pipeline.get(redis_fields.text_bits(doc_id))
+    pipeline.get(redis_fields.text_position_bits(doc_id))
+    pages = [unset_bits(bits, page_count) for bits in pipeline.execute()]
+
+    pipeline = redis.pipeline()
+    for remaining_field, unfinished in zip(remaining_fields, pages):
+        pipeline.set(remaining_field, len(unfinished), ex=REDIS_TTL)
+    pipeline.execute()
+
+    return pages
+
+
 def page_extracted(redis, doc_id, page_number):
     """Returns if the page has already had its image extracted."""
     image_bits_field = redis_fields.image_bits(doc_id)
@@ -241,68 +407,124 @@ def page_ocrd(redis, doc_id, page_number):
 
 
 def register_page_task(redis, page_number, remaining_field, bits_field):
-    """Registers a generic Redis page task, returning the remaining count."""
-
-    # Start a pipeline to atomically decrement remaining and toggle page
-    def decrement_remaining(pipeline):
-        existing_value = pipeline.getbit(bits_field, page_number)
-        if existing_value == 1:
-            # Page has already been extracted
-            pipeline.multi()
-            pipeline.get(remaining_field)
-            return
-
-        pipeline.multi()
-        pipeline.decr(remaining_field)
-        pipeline.setbit(bits_field, page_number, 1)
-
-    return redis.transaction(decrement_remaining, bits_field)[0]
+    """Registers a generic Redis page task, returning if all pages are done."""
+    return redis_scripts.register_page_tasks(
+        redis, [page_number], remaining_field, bits_field
+    )
 
 
 def register_page_extracted(redis, doc_id, page_number):
     """Register a single page as being extracted. Return true if all done."""
-    # Decrement the images remaining
-    images_remaining = register_page_task(
+    return register_pages_extracted(redis, doc_id, [page_number])
+
+
+def register_pages_extracted(redis, doc_id, page_numbers, first_to_finish=False):
+    """Register pages as being extracted. Return true if all done."""
+    return redis_scripts.register_page_tasks(
         redis,
-        page_number,
+        page_numbers,
         redis_fields.images_remaining(doc_id),
         redis_fields.image_bits(doc_id),
+        first_to_finish,
     )
-    return images_remaining == 0
 
 
 def register_page_ocrd(redis, doc_id, page_number):
     """Register a single page as being OCRd. Return true if all done."""
-    # Decrement the texts remaining
-    texts_remaining = register_page_task(
+    return register_page_task(
         redis,
         page_number,
         redis_fields.texts_remaining(doc_id),
         redis_fields.text_bits(doc_id),
     )
-    return texts_remaining == 0
+
+
+def register_pages_ocrd(redis, doc_id, page_numbers):
+    """Register pages as being OCRd. Return true if all done."""
+    return redis_scripts.register_page_tasks(
+        redis,
+        page_numbers,
+        redis_fields.texts_remaining(doc_id),
+        redis_fields.text_bits(doc_id),
+    )
 
 
 def register_text_position_extracted(redis, doc_id, page_number):
     """Register a single page text position extraction. Return true if all done."""
-    # Decrement the texts remaining
-    text_positions_remaining = register_page_task(
+    return register_text_positions_extracted(redis, doc_id, [page_number])
+
+
+def register_text_positions_extracted(redis, doc_id, page_numbers):
+    """Register page text position extractions. Return true if all done."""
+    return redis_scripts.register_page_tasks(
         redis,
-        page_number,
+        page_numbers,
         redis_fields.text_positions_remaining(doc_id),
         redis_fields.text_position_bits(doc_id),
     )
-    return text_positions_remaining == 0
+
+
+def pages_extracted_and_ocrd(redis, doc_id, page_numbers):
+    """Returns for each page if it has had its image extracted and been OCRd."""
+    return redis_scripts.get_page_bits(
+        redis,
+        [redis_fields.image_bits(doc_id), redis_fields.text_bits(doc_id)],
+        page_numbers,
+    )
+
+
+def encode_page_text(page_text, ocr, ocr_code="eng"):
+    """Encode page text to be stored in Redis, compressing it if configured.
+
+    Uncompressed values are JSON objects, so always start with `{`, which
+    neither zlib nor zstd data can, so values may be decoded regardless of the
+    current setting."""
+    value = json.dumps({"text": page_text, "ocr": ocr, "ocr_code": ocr_code}).encode(
+        "utf-8"
+    )
+    if PAGE_TEXT_COMPRESSION == "zlib":
+        return zlib.compress(value)
+    if PAGE_TEXT_COMPRESSION == "zstd":
+        # Third Party
+        import zstandard  # pylint: disable=import-outside-toplevel
+
+        return zstandard.ZstdCompressor().compress(value)
+    return value
+
+
+def decode_page_text(value):
+    """Decode page text stored in Redis"""
+    if value[:1] == b"{":
+        return json.loads(value)
+    if value[:4] == ZSTD_MAGIC:
+        # Third Party
+        import zstandard  # pylint: disable=import-outside-toplevel
+
+        return json.loads(zstandard.ZstdDecompressor().decompress(value))
+    return json.loads(zlib.decompress(value))
 
 
 def write_page_text(redis, doc_id, page_number, page_text, ocr, ocr_code="eng"):
     """Write page text to Redis."""
-    redis.hset(
-        redis_fields.page_text(doc_id),
-        f"{page_number}",
-        json.dumps({"text": page_text, "ocr": ocr, "ocr_code": ocr_code}),
-    )
-    redis.expire(redis_fields.page_text(doc_id), REDIS_TTL)
+    write_page_texts(redis, doc_id, [(page_number, page_text, ocr, ocr_code)])
+
+
+def write_page_texts(redis, doc_id, pages):
+    """Write the text of several pages to Redis in a single round trip.
+
+    `pages` is a list of (page number, page text, ocr, ocr code)"""
+    if not pages:
+        return
+    page_text_field = redis_fields.page_text(doc_id)
+    pipeline = redis.pipeline(transaction=False)
+    for page_number, page_text, ocr, ocr_code in pages:
+        pipeline.hset(
+            page_text_field,
+            f"{page_number}",
+            encode_page_text(page_text, ocr, ocr_code),
+        )
+    pipeline.expire(page_text_field, REDIS_TTL)
+    pipeline.execute()
 
 
 def write_page_text_pdf(redis, doc_id, page_number, page_text_pdf_contents):
@@ -313,26 +535,54 @@ def write_page_text_pdf(redis, doc_id, page_number, page_text_pdf_contents):
     redis.expire(redis_fields.page_text_pdf(doc_id), REDIS_TTL)
 
 
+def write_page_ocr_image(redis, doc_id, page_number, image_contents):
+    """Write the image to OCR a page from to Redis."""
+    redis.hset(redis_fields.page_ocr_image(doc_id), f"{page_number}", image_contents)
+    redis.expire(redis_fields.page_ocr_image(doc_id), REDIS_TTL)
+
+
+def read_page_ocr_image(redis, doc_id, page_number):
+    """Read the image to OCR a page from Redis, if one was written."""
+    return redis.hget(redis_fields.page_ocr_image(doc_id), f"{page_number}")
+
+
+def delete_page_ocr_image(redis, doc_id, page_number):
+    """Remove the image to OCR a page from once it has been OCR'd."""
+    redis.hdel(redis_fields.page_ocr_image(doc_id), f"{page_number}")
+
+
+def iter_page_text(redis, doc_id, batch_size=PAGE_TEXT_READ_BATCH):
+    """Yield (page number, page contents) for the page text stored in Redis in
+    page order, only holding a batch of pages in memory at a time."""
+    page_text_field = redis_fields.page_text(doc_id)
+    page_numbers = sorted(
+        int(page_number) for page_number in redis.hkeys(page_text_field)
+    )
+    for i in range(0, len(page_numbers), batch_size):
+        batch = page_numbers[i : i + batch_size]
+        values = redis.hmget(
+            page_text_field, [f"{page_number}" for page_number in batch]
+        )
+        for page_number, value in zip(batch, values):
+            if value is not None:
+                yield page_number, decode_page_text(value)
+
+
 def get_all_page_text(redis, doc_id):
     """Read all the page text stored in Redis."""
-    page_text_map = redis.hgetall(redis_fields.page_text(doc_id))
-    pages = sorted([int(page_number) for page_number in page_text_map.keys()])
-
     # Annotate the results with the current timestamp
     current_millis = int(round(time.time() * 1000))
 
-    def get_page(page_number):
-        """Helper function to return a page from Redis's result set."""
-        contents = json.loads(page_text_map[f"{page_number}".encode("utf-8")])
-        return {
+    results = [
+        {
             "page": page_number,
             "contents": contents["text"],
             "ocr": contents["ocr"],
-            "lang": contents.get("lang", "eng"),
+            "lang": contents.get("ocr_code", "eng"),
             "updated": current_millis,
         }
-
-    results = [get_page(page_number) for page_number in pages]
+        for page_number, contents in iter_page_text(redis, doc_id)
+    ]
     response = {"updated": current_millis, "pages": results}
     return response
 
@@ -0,0 +1,335 @@
+# Standard Library
+import asyncio
+import hashlib
+import io
+from unittest.mock import Mock, call, patch
+
+# Third Party
+import pytest
+
+# DocumentCloud
+from documentcloud.common import access_choices
+from documentcloud.common.environment.aws.storage import AsyncClient, AwsStorage
+
+
+def etag(contents):
+    return f'"{hashlib.md5(contents).hexdigest()}"'
+
+
+class FakeS3Client:
+    """Stands in for an aioboto3 S3 client, keeping the parts uploaded to it
+    and failing the number of uploads set in `failures` for each part"""
+
+    def __init__(self):
+        self.parts = {}
+        self.failures = {}
+
+    async def upload_part(self, UploadId, PartNumber, Body, **_kwargs):
+        # pylint: disable=invalid-name
+        if self.failures.get(PartNumber):
+            self.failures[PartNumber] -= 1
+            raise ConnectionError
+        self.parts[UploadId, PartNumber] = Body
+        return {"ETag": etag(Body)}
+
+
+class FakeClientContext:
+    """Stands in for the context manager of an aioboto3 client"""
+
+    def __init__(self):
+        self.client = FakeS3Client()
+        self.closed = False
+
+    async def __aenter__(self):
+        return self.client
+
+    async def __aexit__(self, *exc_info):
+        self.closed = True
+
+
+@pytest.fixture
+def contexts():
+    """The client contexts opened by the async client"""
+    contexts = []
+
+    def client(_service, **_kwargs):
+        contexts.append(FakeClientContext())
+        return contexts[-1]
+
+    with patch("aioboto3.Session") as session:
+        session.return_value.client.side_effect = client
+        yield contexts
+
+
+@pytest.fixture
+def async_client(contexts):
+    # pylint: disable=unused-argument
+    async_client = AsyncClient({}, 3)
+    yield async_client
+    async_client.close()
+
+
+def test_map_order(async_client):
+    async def double(_client, item):
+        # Later items finish first
+        await asyncio.sleep((5 - item) / 1000)
+        return item * 2
+
+    assert async_client.map(double, range(5)) == [0, 2, 4, 6, 8]
+
+
+def test_return_exceptions(async_client):
+    async def fail_odd(_client, item):
+        if item % 2:
+            raise ValueError(item)
+        return item
+
+    with pytest.raises(ValueError):
+        async_client.map(fail_odd, range(3))
+    results = async_client.map(fail_odd, range(3), return_exceptions=True)
+    assert results[0] == 0 and results[2] == 2
+    assert isinstance(results[1], ValueError)
+
+
+def test_concurrency(async_client):
+    active = []
+    peak = []
+
+    async def track(_client, _item):
+        active.append(None)
+        peak.append(len(active))
+        await asyncio.sleep(0.01)
+        active.pop()
+
+    async_client.map(track, range(10))
+    assert max(peak) == 3
+    # A call may set a lower limit for itself
+    peak.clear()
+    async_client.map(track, range(10), concurrency=2)
+    assert max(peak) == 2
+
+
+def test_fork(async_client, contexts):
+    async def get_client(client, _item):
+        return client
+
+    assert async_client.map(get_client, [0]) == [contexts[0].client]
+    assert async_client.map(get_client, [0]) == [contexts[0].client]
+    assert len(contexts) == 1
+
+    # A forked process starts its own client, keeping the inherited one
+    with patch("os.getpid", return_value=-1):
+        assert async_client.map(get_client, [0]) == [contexts[1].client]
+        assert async_client.inherited == (contexts[0], contexts[0].client)
+        async_client.close()
+    assert contexts[1].closed
+    assert not contexts[0].closed
+
+
+def test_close(async_client, contexts):
+    async def get_client(client, _item):
+        return client
+
+    async_client.map(get_client, [0])
+    async_client.close()
+    assert contexts[0].closed
+    # Closing again does nothing, and the client is started again if used
+    async_client.close()
+    assert async_client.map(get_client, [0]) == [contexts[1].client]
+
+
+@pytest.fixture
+def storage(contexts):
+    # pylint: disable=unused-argument
+    storage = AwsStorage({"region_name": "us-east-1"})
+    storage.s3_client = Mock()
+    storage.s3_client.list_multipart_uploads.return_value = {}
+    storage.s3_client.list_parts.return_value = {}
+    storage.s3_client.create_multipart_upload.return_value = {"UploadId": "new"}
+    storage.s3_resource = Mock()
+    # Upload files of more than 4 bytes in parts of 4 bytes, without waiting
+    # between retries
+    with patch(
+        "documentcloud.common.environment.aws.storage.MULTIPART_PART_SIZE", 4
+    ), patch("asyncio.sleep"):
+        yield storage
+    storage.async_client.close()
+
+
+def completed_parts(storage):
+    """The parts the upload was completed with"""
+    kwargs = storage.s3_client.complete_multipart_upload.call_args.kwargs
+    return kwargs["UploadId"], kwargs["MultipartUpload"]["Parts"]
+
+
+def tag(contents, content_type="application/pdf", acl="private"):
+    """The identity part of an upload of the given contents"""
+    return f"{hashlib.sha1(contents).hexdigest()}\n{content_type}\n{acl}".encode()
+
+
+def unfinished(storage, uploads):
+    """Set the unfinished uploads, by ID, to those with the given tags"""
+    storage.s3_client.list_multipart_uploads.return_value = {
+        "Uploads": [
+            {"Key": "a.pdf", "UploadId": upload_id, "Initiated": initiated}
+            for initiated, upload_id in enumerate(uploads)
+        ]
+    }
+
+    def list_parts(UploadId, **_kwargs):
+        # pylint: disable=invalid-name
+        return {"Parts": [{"PartNumber": 10000, "ETag": etag(uploads[UploadId])}]}
+
+    storage.s3_client.list_parts.side_effect = list_parts
+
+
+def aborted(storage):
+    """The IDs of the uploads which were aborted"""
+    return [
+        c.kwargs["UploadId"]
+        for c in storage.s3_client.abort_multipart_upload.call_args_list
+    ]
+
+
+def test_multipart_single_part(storage, contexts):
+    storage.multipart_upload("bucket/small.txt", io.BytesIO(b"x" * 4).getbuffer())
+    storage.s3_client.upload_fileobj.assert_called_once()
+    storage.s3_client.create_multipart_upload.assert_not_called()
+    assert not contexts
+
+    storage.multipart_upload("bucket/large.txt", b"x" * 5)
+    storage.s3_client.create_multipart_upload.assert_called_once()
+
+
+def test_multipart_upload(storage, contexts):
+    contents = io.BytesIO(b"0123456789")
+    storage.multipart_upload(
+        "bucket/a.pdf", contents.getbuffer(), access=access_choices.PUBLIC
+    )
+    storage.s3_client.create_multipart_upload.assert_called_once_with(
+        Bucket="bucket", Key="a.pdf", ACL="public-read", ContentType="application/pdf"
+    )
+    # The upload is tagged with what it is of, in a part which is not completed
+    storage.s3_client.upload_part.assert_called_once_with(
+        Bucket="bucket",
+        Key="a.pdf",
+        UploadId="new",
+        PartNumber=10000,
+        Body=tag(b"0123456789", acl="public-read"),
+    )
+    parts = contexts[0].client.parts
+    assert b"".join(parts["new", n] for n in (1, 2, 3)) == b"0123456789"
+    assert completed_parts(storage) == (
+        "new",
+        [
+            {"ETag": etag(b"0123"), "PartNumber": 1},
+            {"ETag": etag(b"4567"), "PartNumber": 2},
+            {"ETag": etag(b"89"), "PartNumber": 3},
+        ],
+    )
+
+
+def test_multipart_writer(storage, contexts):
+    unfinished(storage, {"stale": b""})
+    # Parts are sent as they fill, however the file is written
+    with storage.multipart_writer("bucket/a.pdf") as writer:
+        for data in (b"01", b"2345678", b"", b"9"):
+            writer.write(data)
+    assert completed_parts(storage) == (
+        "new",
+        [
+            {"ETag": etag(b"0123"), "PartNumber": 1},
+            {"ETag": etag(b"4567"), "PartNumber": 2},
+            {"ETag": etag(b"89"), "PartNumber": 3},
+        ],
+    )
+    # Without an identity, nothing is resumed, and the upload is not tagged
+    assert aborted(storage) == ["stale"]
+    storage.s3_client.upload_part.assert_not_called()
+
+    # The upload is left unfinished if writing fails
+    storage.s3_client.complete_multipart_upload.reset_mock()
+    with pytest.raises(ValueError):
+        with storage.multipart_writer("bucket/a.pdf") as writer:
+            writer.write(b"012345")
+            raise ValueError
+    assert contexts[0].client.parts["new", 1] == b"0123"
+    storage.s3_client.complete_multipart_upload.assert_not_called()
+
+    # A file which fits in a part is uploaded in a single request, aborting any
+    # unfinished upload of it
+    storage.s3_client.abort_multipart_upload.reset_mock()
+    with storage.multipart_writer("bucket/a.pdf") as writer:
+        writer.write(b"01")
+        writer.write(b"23")
+    storage.s3_client.upload_fileobj.assert_called_once()
+    assert aborted(storage) == ["stale"]
+
+
+def test_multipart_retry(storage, contexts):
+    storage.multipart_upload("bucket/a.pdf", b"0123456789")
+    client = contexts[0].client
+    client.parts.clear()
+
+    # Each part is retried on its own, backing off between retries
+    client.failures = {2: 3}
+    storage.multipart_upload("bucket/b.pdf", b"0123456789")
+    assert sorted(client.parts) == [("new", 1), ("new", 2), ("new", 3)]
+    assert asyncio.sleep.call_args_list == [call(1), call(2), call(4)]
+
+    # The upload is left unfinished once a part runs out of retries
+    storage.s3_client.complete_multipart_upload.reset_mock()
+    client.failures = {2: 4}
+    with pytest.raises(ConnectionError):
+        storage.multipart_upload("bucket/b.pdf", b"0123456789")
+    storage.s3_client.complete_multipart_upload.assert_not_called()
+    storage.s3_client.abort_multipart_upload.assert_not_called()
+
+
+def test_multipart_resume(storage, contexts):
+    # Only the newest upload of the same file is resumed, and the rest are
+    # aborted
+    unfinished(
+        storage,
+        {
+            "older": tag(b"0123456789"),
+            "old": tag(b"0123456789"),
+            "other": tag(b"xxxx456789"),
+        },
+    )
+    # The first part was uploaded with the same contents, the second was not
+    storage.s3_client.get_paginator.return_value.paginate.return_value = [
+        {"Parts": [{"PartNumber": 1, "ETag": etag(b"0123")}]},
+        {"Parts": [{"PartNumber": 2, "ETag": etag(b"xxxx")}]},
+    ]
+    storage.multipart_upload("bucket/a.pdf", b"0123456789")
+
+    assert aborted(storage) == ["other", "older"]
+    storage.s3_client.create_multipart_upload.assert_not_called()
+    storage.s3_client.get_paginator.return_value.paginate.assert_called_once_with(
+        Bucket="bucket", Key="a.pdf", UploadId="old"
+    )
+    assert contexts[0].client.parts == {("old", 2): b"4567", ("old", 3): b"89"}
+    assert completed_parts(storage) == (
+        "old",
+        [
+            {"ETag": etag(b"0123"), "PartNumber": 1},
+            {"ETag": etag(b"4567"), "PartNumber": 2},
+            {"ETag": etag(b"89"), "PartNumber": 3},
+        ],
+    )
+
+
+def test_multipart_resume_settings(storage):
+    # An upload of the same contents with another content type or access is
+    # not resumed, as they can not be changed when completing it
+    unfinished(
+        storage,
+        {
+            "text": tag(b"0123456789", content_type="text/plain"),
+            "public": tag(b"0123456789", acl="public-read"),
+        },
+    )
+    storage.multipart_upload("bucket/a.pdf", b"0123456789")
+    assert sorted(aborted(storage)) == ["public", "text"]
+    assert completed_parts(storage)[0] == "new"
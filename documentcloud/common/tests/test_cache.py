@@ -0,0 +1,125 @@
+# Standard Library
+import io
+import os
+from unittest.mock import patch
+
+# DocumentCloud
+from documentcloud.common.environment.cache import StorageCache, etag_path
+
+
+class FakeStorage:
+    """Stores files in memory, with a version number as their ETag"""
+
+    def __init__(self):
+        self.files = {}
+        self.versions = {}
+        self.downloads = 0
+        self.requests = 0
+
+    def put(self, file_name, contents):
+        self.files[file_name] = contents
+        self.versions[file_name] = self.versions.get(file_name, 0) + 1
+
+    def download_if_modified(self, file_name, etag, out_file):
+        self.requests += 1
+        if file_name not in self.files:
+            raise FileNotFoundError(file_name)
+        version = str(self.versions[file_name])
+        if etag == version:
+            return None
+        self.downloads += 1
+        out_file.write(self.files[file_name])
+        return version
+
+    def open(self, file_name, mode="rb"):
+        if file_name not in self.files:
+            raise FileNotFoundError(file_name)
+        return io.BytesIO(self.files[file_name])
+
+
+def test_read_through(tmp_path):
+    storage = FakeStorage()
+    cache = StorageCache(storage, str(tmp_path), 1024)
+    storage.put("bucket/a.txt", b"first")
+
+    assert cache.read("bucket/a.txt") == b"first"
+    assert cache.read("bucket/a.txt") == b"first"
+    # The second read was revalidated, but not downloaded again
+    assert storage.requests == 2
+    assert storage.downloads == 1
+
+    storage.put("bucket/a.txt", b"second")
+    assert cache.read("bucket/a.txt") == b"second"
+    assert storage.downloads == 2
+
+
+def test_max_age(tmp_path):
+    storage = FakeStorage()
+    cache = StorageCache(storage, str(tmp_path), 1024)
+    storage.put("bucket/a.txt", b"first")
+
+    cache.read("bucket/a.txt", max_age=60)
+    storage.put("bucket/a.txt", b"second")
+    # Trusted without revalidating until max age has passed
+    assert cache.read("bucket/a.txt", max_age=60) == b"first"
+    assert storage.requests == 1
+
+
+def test_mismatched_etag(tmp_path):
+    storage = FakeStorage()
+    cache = StorageCache(storage, str(tmp_path), 1024)
+    storage.put("bucket/a.txt", b"first")
+    local_path = cache.path("bucket/a.txt")
+
+    # A file replaced without its ETag is not trusted
+    with open(f"{local_path}.new", "wb") as local_file:
+        local_file.write(b"stale")
+    os.replace(f"{local_path}.new", local_path)
+    assert cache.read("bucket/a.txt") == b"first"
+    assert storage.downloads == 2
+
+
+def test_evict(tmp_path):
+    storage = FakeStorage()
+    cache = StorageCache(storage, str(tmp_path), 25)
+    for name in ("a", "b", "c"):
+        storage.put(f"bucket/{name}", b"x" * 10)
+
+    path_a = cache.path("bucket/a")
+    path_b = cache.path("bucket/b")
+    os.utime(path_a, (1, 1))
+    os.utime(path_b, (2, 2))
+    path_c = cache.path("bucket/c")
+
+    # The least recently used file is evicted, along with its ETag
+    assert not os.path.exists(path_a)
+    assert not os.path.exists(etag_path(path_a))
+    assert os.path.exists(path_b)
+    assert os.path.exists(path_c)
+
+
+def test_evict_over_limit(tmp_path):
+    storage = FakeStorage()
+    cache = StorageCache(storage, str(tmp_path), 25)
+    for name in ("a", "b", "c"):
+        storage.put(f"bucket/{name}", b"x" * 10)
+
+    cache.path("bucket/a")
+    # The cache is only scanned again once it has grown past its limit
+    with patch("os.walk") as walk:
+        cache.path("bucket/b")
+        storage.put("bucket/b", b"x" * 5)
+        cache.path("bucket/b")
+    walk.assert_not_called()
+    assert cache.size == 15
+
+    cache.path("bucket/c")
+    assert cache.size == 25
+
+
+def test_async_download(tmp_path):
+    storage = FakeStorage()
+    cache = StorageCache(storage, str(tmp_path), 1024)
+    storage.put("bucket/a", b"a")
+
+    assert cache.async_download(["bucket/a", "bucket/missing"]) == [b"a", b""]
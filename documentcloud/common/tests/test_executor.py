@@ -0,0 +1,69 @@
+# Standard Library
+from unittest.mock import patch
+
+# DocumentCloud
+from documentcloud.common.environment.local.executor import PoolExecutor
+from documentcloud.common.environment.local.pubsub import (
+    decode_pubsub_data,
+    encode_pubsub_data,
+    publisher,
+)
+from documentcloud.common.serverless.error_handling import pubsub_function
+
+SPLIT_TOPIC = ("documentcloud", "test-split")
+PAGES_TOPIC = ("documentcloud", "test-pages")
+
+
+def split_task(data):
+    data = decode_pubsub_data(data)
+    for i in range(0, data["page_count"], 2):
+        publisher.publish(
+            PAGES_TOPIC,
+            encode_pubsub_data(
+                {"pages": list(range(i, min(i + 2, data["page_count"])))}
+            ),
+        )
+
+
+def pages_task(_data):
+    pass
+
+
+def run_pipeline(split):
+    """Split a document in the pool executor and return the statistics"""
+    publisher.register_internal_callback(SPLIT_TOPIC, split)
+    publisher.register_internal_callback(PAGES_TOPIC, pages_task)
+    executor = PoolExecutor(2)
+    try:
+        with patch.object(publisher, "executor", executor):
+            publisher.publish(SPLIT_TOPIC, encode_pubsub_data({"page_count": 5}))
+            assert publisher.join(30)
+            stats = publisher.stats()
+    finally:
+        executor.shutdown()
+        del publisher.tasks[SPLIT_TOPIC]
+        del publisher.tasks[PAGES_TOPIC]
+    return stats
+
+
+@patch("documentcloud.common.environment.local.pubsub.EXECUTOR", "pool")
+def test_pool_executor():
+    stats = run_pipeline(split_task)
+
+    assert stats["test-split"]["invocations"] == 1
+    assert stats["test-pages"]["invocations"] == 3
+    assert stats["test-pages"]["pages"] == 5
+    assert stats["test-pages"]["errors"] == 0
+
+
+@patch("documentcloud.common.environment.local.pubsub.EXECUTOR", "pool")
+@patch("documentcloud.common.serverless.error_handling.USE_TIMEOUT", True)
+def test_pool_executor_timeout():
+    # The task is forked again from the worker to run with a timeout, and the
+    # messages it publishes must still reach the executor
+    stats = run_pipeline(pubsub_function(None, SPLIT_TOPIC, [30])(split_task))
+
+    assert stats["test-split"]["invocations"] == 1
+    assert stats["test-split"]["errors"] == 0
+    assert stats["test-pages"]["invocations"] == 3
+    assert stats["test-pages"]["pages"] == 5
@@ -0,0 +1,71 @@
+# DocumentCloud
+from documentcloud.common import lanes
+
+
+def test_tag():
+    lanes.receive({"doc_id": 1, "lane": lanes.lane(lanes.BULK, 2)})
+    try:
+        assert lanes.tag({"doc_id": 1}) == {
+            "doc_id": 1,
+            "lane": {"priority": "bulk", "org_id": 2},
+        }
+        # Messages already in a lane stay in it
+        lane = lanes.lane(lanes.INTERACTIVE, 3)
+        assert lanes.tag({"lane": lane}) == {"lane": lane}
+    finally:
+        lanes.receive({})
+    assert lanes.tag({"doc_id": 1}) == {"doc_id": 1}
+
+
+def test_scoped():
+    @lanes.scoped
+    def handle(data):
+        lanes.receive(data)
+        return lanes.tag({"doc_id": 1})
+
+    assert handle({"lane": lanes.lane(lanes.BULK)})["lane"]["priority"] == "bulk"
+    # The lane does not leak into messages published by the next invocation
+    assert lanes.tag({"doc_id": 1}) == {"doc_id": 1}
+
+
+def test_get_lane():
+    assert lanes.get_lane({}) == (lanes.INTERACTIVE, None)
+    assert lanes.get_lane({"lane": lanes.lane(lanes.BULK, 2)}) == (lanes.BULK, 2)
+
+
+def test_fair_queue_lanes():
+    queue = lanes.FairQueue({lanes.INTERACTIVE: 3, lanes.BULK: 1})
+    for i in range(8):
+        queue.put(f"b{i}", lanes.BULK)
+    for i in range(6):
+        queue.put(f"i{i}", lanes.INTERACTIVE)
+
+    order = [queue.get() for _ in range(len(queue))]
+    # Interactive items get three turns for each bulk item, without starving
+    # the bulk items
+    assert order[:8] == ["i0", "b0", "i1", "i2", "i3", "b1", "i4", "i5"]
+    assert order[8:] == ["b2", "b3", "b4", "b5", "b6", "b7"]
+    assert queue.get() is None
+
+
+def test_fair_queue_orgs():
+    queue = lanes.FairQueue()
+    for i in range(4):
+        queue.put(f"a{i}", lanes.BULK, org_id=1)
+    queue.put("b0", lanes.BULK, org_id=2)
+    queue.put("c0", lanes.BULK, org_id=3)
+
+    # Organizations take turns, so a large import does not hold up the others
+    assert [queue.get() for _ in range(4)] == ["a0", "b0", "c0", "a1"]
+
+
+def test_fair_queue_idle_lane():
+    queue = lanes.FairQueue({lanes.INTERACTIVE: 1, lanes.BULK: 1})
+    for i in range(4):
+        queue.put(f"b{i}", lanes.BULK)
+    assert queue.get() == "b0"
+    assert queue.get() == "b1"
+    # A lane which was idle shares from now on, rather than catching up
+    queue.put("i0", lanes.INTERACTIVE)
+    queue.put("i1", lanes.INTERACTIVE)
+    assert [queue.get() for _ in range(4)] == ["i0", "b2", "i1", "b3"]
@@ -0,0 +1,118 @@
+# Django
+from django.core.exceptions import SuspiciousFileOperation
+
+# Standard Library
+import os
+
+# Third Party
+import pytest
+
+# DocumentCloud
+from documentcloud.common import access_choices
+from documentcloud.common.environment.local.storage import LocalStorage
+
+
+@pytest.fixture
+def storage(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    return LocalStorage()
+
+
+def test_upload(storage):
+    storage.simple_upload("bucket/a/1.txt", b"0123456789")
+    assert storage.exists("bucket/a/1.txt")
+    assert storage.size("bucket/a/1.txt") == 10
+    assert storage.read_range("bucket/a/1.txt", 2, 5) == b"234"
+    assert storage.async_download(["bucket/a/1.txt", "bucket/missing"]) == [
+        b"0123456789",
+        b"",
+    ]
+    assert storage.async_size(["bucket/a/1.txt", "bucket/missing"]) == [10, 0]
+
+    storage.multipart_upload("bucket/a/2.pdf", b"%PDF", access=access_choices.PUBLIC)
+    assert storage.read_range("bucket/a/2.pdf", 0, 4) == b"%PDF"
+    assert storage.get_access("bucket/a/2.pdf") == access_choices.PUBLIC
+
+    with storage.multipart_writer("bucket/a/3.pdf", identity="3") as writer:
+        writer.write(b"%P")
+        writer.write(b"DF")
+    assert storage.read_range("bucket/a/3.pdf", 0, 4) == b"%PDF"
+
+
+def test_list_delete(storage):
+    for name in ("a/1", "a/2", "a/3", "ab/1", "b/1"):
+        storage.simple_upload(f"bucket/{name}", b"")
+
+    assert storage.list("bucket/a/") == ["bucket/a/1", "bucket/a/2", "bucket/a/3"]
+    assert storage.list("bucket/a")[-1] == "bucket/ab/1"
+    assert storage.list("bucket/a/", marker="bucket/a/1", limit=1) == ["bucket/a/2"]
+
+    storage.delete("bucket/a/")
+    assert storage.list("bucket/") == ["bucket/ab/1", "bucket/b/1"]
+    assert not os.path.exists(storage.local_path("bucket/a/"))
+
+
+def test_access(storage):
+    storage.simple_upload("bucket/a/1", b"")
+    assert storage.get_access("bucket/a/1") == access_choices.PRIVATE
+
+    storage.set_access_path("bucket/a/", access_choices.PUBLIC)
+    assert storage.get_access("bucket/a/1") == access_choices.PUBLIC
+
+    storage.copy("bucket/a/1", "bucket/b/1")
+    assert storage.get_access("bucket/b/1") == access_choices.PRIVATE
+    storage.copy("bucket/a/1", "bucket/b/2", access=access_choices.PUBLIC)
+    assert storage.get_access("bucket/b/2") == access_choices.PUBLIC
+
+
+@pytest.mark.django_db()
+def test_presign_url(storage, client, settings):
+    def local_url(url):
+        return url.replace(settings.DOCCLOUD_API_URL, "")
+
+    put_url = local_url(storage.presign_url("bucket/a/1.pdf", "put_object"))
+    response = client.put(put_url, b"%PDF", content_type="application/pdf")
+    assert response.status_code == 200
+
+    get_url = local_url(storage.presign_url("bucket/a/1.pdf", "get_object"))
+    response = client.get(get_url)
+    assert response.status_code == 200
+    assert response.getvalue() == b"%PDF"
+
+    # the file is private, and a signature only allows the method it is for
+    assert client.get(get_url.split("?")[0]).status_code == 403
+    assert client.put(get_url, b"", content_type="application/pdf").status_code == 403
+
+    storage.set_access(["bucket/a/1.pdf"], access_choices.PUBLIC)
+    assert client.get(get_url.split("?")[0]).status_code == 200
+
+
+@pytest.mark.django_db()
+def test_traversal(storage, client, settings, tmp_path):
+    outside = tmp_path.parent / f"{tmp_path.name}-outside"
+    outside.mkdir()
+    (outside / "secret").write_bytes(b"secret")
+    os.chmod(outside / "secret", 0o644)
+    os.symlink(outside, tmp_path / "link")
+
+    for file_name in (
+        str(outside / "secret"),
+        f"../{outside.name}/secret",
+        "bucket/../../secret",
+        "link/secret",
+    ):
+        with pytest.raises(SuspiciousFileOperation):
+            storage.local_path(file_name)
+        with pytest.raises(SuspiciousFileOperation):
+            storage.open(file_name, "wb").__enter__()
+
+    for url in (
+        "/files/storage/%2Fetc%2Fpasswd",
+        f"/files/storage/%2E%2E/{outside.name}/secret",
+        "/files/storage/link/secret",
+    ):
+        assert client.get(url).status_code == 400
+    put_url = storage.presign_url("../secret", "put_object")
+    put_url = put_url.replace(settings.DOCCLOUD_API_URL, "")
+    assert client.put(put_url, b"", content_type="text/plain").status_code == 400
+    assert (outside / "secret").read_bytes() == b"secret"
@@ -0,0 +1,69 @@
+# Standard Library
+import json
+from unittest.mock import MagicMock, patch
+
+# DocumentCloud
+from documentcloud.common import redis_fields, tracing
+
+TRACING = "documentcloud.common.tracing"
+
+
+@patch(f"{TRACING}.TRACING", True)
+def test_trace_spans():
+    redis = MagicMock()
+    tracing.start(1, "extract_image")
+    with tracing.span("render"):
+        pass
+    with tracing.span("render"):
+        pass
+    with tracing.span("upload"):
+        pass
+    trace = tracing.finish(redis)
+
+    assert trace.spans["render"][1] == 2
+    assert trace.spans["upload"][1] == 1
+    pipeline = redis.pipeline.return_value
+    field, record = pipeline.rpush.call_args[0]
+    assert field == redis_fields.trace(1)
+    record = json.loads(record)
+    assert record["stage"] == "extract_image"
+    assert record["status"] == "ok"
+    assert set(record["spans"]) == {"render", "upload"}
+
+    # Spans outside of a trace are not recorded
+    with tracing.span("render"):
+        pass
+    assert tracing.finish(redis) is None
+
+
+@patch(f"{TRACING}.TRACING", False)
+def test_trace_disabled():
+    assert tracing.start(1, "extract_image") is None
+    with tracing.span("render"):
+        pass
+    assert tracing.finish(MagicMock()) is None
+
+
+def test_summarize():
+    traces = [
+        {
+            "stage": "extract_image",
+            "status": "ok",
+            "elapsed": 2.0,
+            "spans": {"render": [1.0, 2], "upload": [0.5, 2]},
+        },
+        {
+            "stage": "extract_image",
+            "status": "timeout",
+            "elapsed": 4.0,
+            "spans": {"render": [3.0, 1]},
+        },
+        {"stage": "run_tesseract", "status": "ok", "elapsed": 1.0, "spans": {}},
+    ]
+    stages = tracing.summarize(traces)
+    assert stages["extract_image"]["invocations"] == 2
+    assert stages["extract_image"]["statuses"] == {"ok": 1, "timeout": 1}
+    assert stages["extract_image"]["elapsed"] == 6.0
+    assert stages["extract_image"]["max_elapsed"] == 4.0
+    assert stages["extract_image"]["spans"]["render"] == [4.0, 3]
+    assert stages["run_tesseract"]["invocations"] == 1
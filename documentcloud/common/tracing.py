@@ -0,0 +1,179 @@
+"""
+Lightweight tracing of where the processing functions spend their time.
+
+Each invocation of a processing function wrapped by `pubsub_function` is
+traced, timing named spans (such as downloading, rendering, encoding,
+uploading, OCR and Redis) within it and totalling named counters (such as
+bytes uploaded).  When the invocation ends a record of it is appended to a
+list in Redis for its document, which is kept after processing finishes so
+that it may be inspected with the `pipeline_trace` management command.
+
+Span times are totals - spans may be nested within each other or run in
+several threads at once, so they may add up to more than the elapsed time.
+"""
+
+# Standard Library
+import collections
+import contextlib
+import json
+import logging
+import threading
+import time
+from functools import wraps
+
+# Third Party
+import environ
+
+# Local
+from . import redis_fields
+
+env = environ.Env()
+logger = logging.getLogger(__name__)
+
+TRACING = env.bool("PIPELINE_TRACING", default=False)
+# How long to keep the traces of a document
+TRACE_TTL = env.int("PIPELINE_TRACE_TTL", default=7 * 86400)
+# The most invocations to keep for a single document
+TRACE_LIMIT = env.int("PIPELINE_TRACE_LIMIT", default=1000)
+
+
+class Trace:
+    """The spans and counters of a single invocation of a processing function"""
+
+    def __init__(self, doc_id, stage, run_count=0):
+        self.doc_id = doc_id
+        self.stage = stage
+        self.run_count = run_count
+        self.start = time.time()
+        # Span name -> [total seconds, count]
+        self.spans = {}
+        # Counter name -> total
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self.lock:
+            span = self.spans.setdefault(name, [0.0, 0])
+            span[0] += seconds
+            span[1] += 1
+
+    def count(self, name, amount):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def to_dict(self, status):
+        return {
+            "stage": self.stage,
+            "status": status,
+            "run_count": self.run_count,
+            "start": self.start,
+            "elapsed": time.time() - self.start,
+            "spans": self.spans,
+            "counters": self.counters,
+        }
+
+
+_current = None
+
+
+def start(doc_id, stage, run_count=0):
+    """Start tracing an invocation in this process"""
+    # pylint: disable=global-statement
+    global _current
+    if TRACING and doc_id is not None:
+        _current = Trace(doc_id, stage, run_count)
+    else:
+        _current = None
+    return _current
+
+
+@contextlib.contextmanager
+def span(name):
+    """Time a block of code as part of the current trace, if there is one"""
+    trace = _current
+    if trace is None:
+        yield
+        return
+    span_start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, time.perf_counter() - span_start)
+
+
+def count(name, amount=1):
+    """Add to a counter of the current trace, if there is one"""
+    trace = _current
+    if trace is not None:
+        trace.count(name, amount)
+
+
+def traced(name):
+    """Decorator to time each call of a function as a span"""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def save(redis, trace, status):
+    """Append the record of a trace to its document's traces in Redis"""
+    field = redis_fields.trace(trace.doc_id)
+    try:
+        pipeline = redis.pipeline(transaction=False)
+        pipeline.rpush(field, json.dumps(trace.to_dict(status)))
+        pipeline.ltrim(field, -TRACE_LIMIT, -1)
+        pipeline.expire(field, TRACE_TTL)
+        pipeline.execute()
+    except Exception as exc:  # pylint: disable=broad-except
+        # Tracing must never cause processing to fail
+        logger.warning("Saving trace failed: %s", exc, exc_info=True)
+
+
+def finish(redis, status="ok"):
+    """Finish tracing the current invocation and save it"""
+    # pylint: disable=global-statement
+    global _current
+    trace, _current = _current, None
+    if trace is not None:
+        save(redis, trace, status)
+    return trace
+
+
+def get_traces(redis, doc_id):
+    """Get the records of every traced invocation for a document"""
+    return [
+        json.loads(record) for record in redis.lrange(redis_fields.trace(doc_id), 0, -1)
+    ]
+
+
+def summarize(traces):
+    """Aggregate trace records by stage"""
+    stages = {}
+    for trace in traces:
+        stage = stages.setdefault(
+            trace["stage"],
+            {
+                "invocations": 0,
+                "statuses": collections.Counter(),
+                "elapsed": 0.0,
+                "max_elapsed": 0.0,
+                "spans": collections.defaultdict(lambda: [0.0, 0]),
+                "counters": collections.Counter(),
+            },
+        )
+        stage["invocations"] += 1
+        stage["statuses"][trace["status"]] += 1
+        stage["elapsed"] += trace["elapsed"]
+        stage["max_elapsed"] = max(stage["max_elapsed"], trace["elapsed"])
+        for name, (seconds, calls) in trace["spans"].items():
+            stage["spans"][name][0] += seconds
+            stage["spans"][name][1] += calls
+        stage["counters"].update(trace.get("counters", {}))
+    return stages
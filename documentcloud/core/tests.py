@@ -35,3 +35,21 @@ def test_flatpage_markdown(client):
     flatpage.save()
     response = client.get("/pages/about/")
     assert b'<h2 id="now-h2">Now H2</h2>' in response.content
+
+
+@pytest.mark.django_db()
+@pytest.mark.parametrize("signed_access", [False, True])
+def test_file_server(client, settings, signed_access):
+    # DocumentCloud
+    from documentcloud.documents.tests.factories import DocumentFactory
+
+    settings.SIGNED_ACCESS = signed_access
+    document = DocumentFactory()
+    response = client.get(
+        f"/files/documents/{document.pk}/{document.slug}.pdf",
+        HTTP_ACCEPT="application/json",
+    )
+    assert response.status_code == 200
+    location = response.json()["location"]
+    # With signed access public documents are served by a signed URL as well
+    assert location.startswith(settings.PUBLIC_ASSET_URL) != signed_access
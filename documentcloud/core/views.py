@@ -3,9 +3,11 @@ from django.conf import settings
 from django.contrib.auth import logout
 from django.db import transaction
 from django.http.response import (
+    FileResponse,
     Http404,
     HttpResponse,
     HttpResponseForbidden,
+    HttpResponseNotAllowed,
     HttpResponseRedirect,
     JsonResponse,
 )
@@ -21,6 +23,7 @@ import hmac
 import json
 import logging
 import os
+import shutil
 import time
 from urllib.parse import urlencode
 
@@ -51,7 +54,8 @@ class FileServer(APIView):
         ):
             raise Http404
 
-        if not document.public or revisions:
+        # with signed access, public files are private in storage as well
+        if not document.public or revisions or settings.SIGNED_ACCESS:
             url = document.path + kwargs["path"]
             url = storage.presign_url(url, "get_object", use_custom_domain=True)
         else:
@@ -67,6 +71,39 @@ class FileServer(APIView):
             return HttpResponseRedirect(url)
 
 
+@csrf_exempt
+def local_storage(request, file_name):
+    """Serve files from the local storage backend - public files, and any file
+    through a presigned URL"""
+    methods = {"GET": "get_object", "HEAD": "get_object", "PUT": "put_object"}
+    if request.method not in methods:
+        return HttpResponseNotAllowed(list(methods))
+    method_name = methods[request.method]
+    # raises SuspiciousFileOperation, a bad request, for any file name outside
+    # of the storage directory
+    local_path = storage.local_path(file_name)
+
+    signature = request.GET.get("signature")
+    if signature is not None:
+        if not storage.check_signature(file_name, method_name, signature):
+            return HttpResponseForbidden()
+    elif method_name != "get_object":
+        return HttpResponseForbidden()
+
+    if method_name == "put_object":
+        # stream the upload to the file, rather than reading it into memory
+        with storage.open(file_name, "wb") as out_file:
+            shutil.copyfileobj(request, out_file)
+        return HttpResponse()
+
+    if not os.path.isfile(local_path):
+        raise Http404
+    if signature is None and storage.get_access(file_name) != Access.public:
+        return HttpResponseForbidden()
+    # pylint: disable=consider-using-with
+    return FileResponse(open(local_path, "rb"))
+
+
 def account_logout(request):
     """Logs a user out of their account and redirects to squarelet's logout page"""
     url = settings.DOCCLOUD_URL + "/"
@@ -0,0 +1,45 @@
+# Django
+from django.core.management.base import BaseCommand
+
+# Standard Library
+import json
+
+# DocumentCloud
+from documentcloud.common import tracing
+from documentcloud.common.serverless import utils
+
+
+class Command(BaseCommand):
+    """Show where processing spent its time for documents, by stage"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("doc_ids", type=int, nargs="+", help="Document IDs")
+        parser.add_argument(
+            "--raw", action="store_true", help="Output every traced invocation as JSON"
+        )
+
+    def handle(self, *args, **kwargs):
+        redis = utils.get_redis()
+        for doc_id in kwargs["doc_ids"]:
+            traces = tracing.get_traces(redis, doc_id)
+            if kwargs["raw"]:
+                for trace in traces:
+                    self.stdout.write(json.dumps({"doc_id": doc_id, **trace}))
+                continue
+
+            self.stdout.write(f"Document {doc_id}: {len(traces)} invocations traced")
+            stages = tracing.summarize(traces)
+            for stage_name, stage in sorted(stages.items()):
+                statuses = ", ".join(
+                    f"{status} {count}" for status, count in stage["statuses"].items()
+                )
+                self.stdout.write(
+                    f"  {stage_name}: {stage['invocations']} invocations ({statuses}) "
+                    f"{stage['elapsed']:.2f}s total {stage['max_elapsed']:.2f}s max"
+                )
+                for span_name, (seconds, count) in sorted(
+                    stage["spans"].items(), key=lambda span: -span[1][0]
+                ):
+                    self.stdout.write(
+                        f"    {span_name}: {seconds:.2f}s in {count} calls"
+                    )
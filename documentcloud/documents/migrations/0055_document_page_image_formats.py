@@ -0,0 +1,26 @@
+# Generated by Django 3.2.9 on 2026-10-16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("documents", "0054_savedsearch"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="document",
+            name="page_image_formats",
+            field=models.CharField(
+                blank=True,
+                help_text=(
+                    "The image format of each page image size, as size=format "
+                    "pairs separated by commas, for sizes which are not GIFs"
+                ),
+                max_length=255,
+                verbose_name="page image formats",
+            ),
+        ),
+    ]
@@ -0,0 +1,117 @@
+# Generated by Django 3.2.9 on 2026-10-16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+import documentcloud.core.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("organizations", "0019_organization_members_organization_parent_and_more"),
+        ("documents", "0055_document_page_image_formats"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BulkProcess",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "force_ocr",
+                    models.BooleanField(
+                        default=False,
+                        help_text="Force OCR even if there is text",
+                        verbose_name="force ocr",
+                    ),
+                ),
+                (
+                    "ocr_engine",
+                    models.CharField(
+                        help_text="The OCR engine to use",
+                        max_length=20,
+                        verbose_name="ocr engine",
+                    ),
+                ),
+                (
+                    "pages",
+                    models.JSONField(
+                        blank=True,
+                        help_text="The pages to reprocess, or null for every page",
+                        null=True,
+                        verbose_name="pages",
+                    ),
+                ),
+                (
+                    "resume",
+                    models.BooleanField(
+                        default=False,
+                        help_text="Resume processing from where it last stopped",
+                        verbose_name="resume",
+                    ),
+                ),
+                (
+                    "created_at",
+                    documentcloud.core.fields.AutoCreatedField(
+                        editable=False,
+                        help_text="Timestamp of when the processing was requested",
+                        verbose_name="created at",
+                    ),
+                ),
+                (
+                    "dispatched_at",
+                    models.DateTimeField(
+                        blank=True,
+                        help_text="Timestamp of when the processing was started",
+                        null=True,
+                        verbose_name="dispatched at",
+                    ),
+                ),
+                (
+                    "document",
+                    models.ForeignKey(
+                        help_text="The document to process",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="bulk_processes",
+                        to="documents.document",
+                        verbose_name="document",
+                    ),
+                ),
+                (
+                    "organization",
+                    models.ForeignKey(
+                        help_text="The organization the processing was requested "
+                        "within",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="organizations.organization",
+                        verbose_name="organization",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        help_text="The user who requested the processing",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="user",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("pk",),
+            },
+        ),
+    ]
@@ -86,6 +86,15 @@ class Document(models.Model):
         blank=True,
         help_text=_("A cached and compressed specification of each pages dimensions"),
     )
+    page_image_formats = models.CharField(
+        _("page image formats"),
+        max_length=255,
+        blank=True,
+        help_text=_(
+            "The image format of each page image size, as size=format pairs "
+            "separated by commas, for sizes which are not GIFs"
+        ),
+    )
 
     language = models.CharField(
         _("language"),
@@ -321,7 +330,7 @@ class Document(models.Model):
 
     @property
     def asset_url(self):
-        if self.public:
+        if self.public and not settings.SIGNED_ACCESS:
             return settings.PUBLIC_ASSET_URL
         else:
             return settings.PRIVATE_ASSET_URL
@@ -411,6 +420,10 @@ class Document(models.Model):
             return {"pages": [], "updated": None}
 
     def set_page_text(self, page_text_infos):
+        # The files are about to change, so they must no longer be copied to
+        # identical documents by processing (see `info_and_image/dedup.py`)
+        storage.delete(path.processed_marker_path(self.pk, self.slug))
+
         logger.info("[SET PAGE TEXT] get all page text %d", self.pk)
         # get the json text
         json_text = self.get_all_page_text()
@@ -677,6 +690,7 @@ class Document(models.Model):
             "updated_at": format_date(self.updated_at),
             "page_count": self.page_count,
             "page_spec": page_spec,
+            "page_image_formats": self.page_image_formats,
             "projects": project_ids,
             "projects_edit_access": project_edit_access_ids,
             "original_extension": self.original_extension,
@@ -812,6 +826,71 @@ class DocumentError(models.Model):
         return self.message
 
 
+class BulkProcess(models.Model):
+    """A document waiting to be processed, or being processed, as part of a bulk
+    processing request
+
+    Bulk processing is started a limited number of documents at a time, taking
+    from each organization in turn, so that one organization reprocessing many
+    documents does not hold up everyone else's.  See
+    `tasks.dispatch_bulk_process`.
+    """
+
+    document = models.ForeignKey(
+        verbose_name=_("document"),
+        to="documents.Document",
+        on_delete=models.CASCADE,
+        related_name="bulk_processes",
+        help_text=_("The document to process"),
+    )
+    user = models.ForeignKey(
+        verbose_name=_("user"),
+        to="users.User",
+        on_delete=models.CASCADE,
+        related_name="+",
+        help_text=_("The user who requested the processing"),
+    )
+    organization = models.ForeignKey(
+        verbose_name=_("organization"),
+        to="organizations.Organization",
+        on_delete=models.CASCADE,
+        related_name="+",
+        help_text=_("The organization the processing was requested within"),
+    )
+    force_ocr = models.BooleanField(
+        _("force ocr"), default=False, help_text=_("Force OCR even if there is text")
+    )
+    ocr_engine = models.CharField(
+        _("ocr engine"), max_length=20, help_text=_("The OCR engine to use")
+    )
+    pages = models.JSONField(
+        _("pages"),
+        null=True,
+        blank=True,
+        help_text=_("The pages to reprocess, or null for every page"),
+    )
+    resume = models.BooleanField(
+        _("resume"),
+        default=False,
+        help_text=_("Resume processing from where it last stopped"),
+    )
+    created_at = AutoCreatedField(
+        _("created at"), help_text=_("Timestamp of when the processing was requested")
+    )
+    dispatched_at = models.DateTimeField(
+        _("dispatched at"),
+        null=True,
+        blank=True,
+        help_text=_("Timestamp of when the processing was started"),
+    )
+
+    class Meta:
+        ordering = ("pk",)
+
+    def __str__(self):
+        return str(self.document_id)
+
+
 class Page(models.Model):
     """A single page in a document"""
 
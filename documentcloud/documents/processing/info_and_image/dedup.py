@@ -0,0 +1,131 @@
+"""
+A content addressed record of processed documents, so that identical uploads
+are not processed again.
+
+When a document finishes processing, a record of it is written keyed by the
+sha1 hash of its file and a key for the settings it was processed with.  When
+a document with the same hash is processed with the same settings, its page
+images, text and text positions are copied from the recorded document instead
+of being rendered and OCRd again.
+
+Each processed document also has a marker next to its files naming the record
+it was processed for.  The marker is removed whenever the document's files
+start to change, so records of documents which have since been reprocessed,
+redacted, modified or deleted are never used.
+"""
+
+# Standard Library
+import hashlib
+import json
+import logging
+from concurrent import futures
+
+# Third Party
+import environ
+
+env = environ.Env()
+logger = logging.getLogger(__name__)
+
+# pylint: disable=import-error
+
+# Imports based on execution context
+if env.str("ENVIRONMENT").startswith("local"):
+    # DocumentCloud
+    from documentcloud.common import path
+    from documentcloud.common.serverless.utils import read_json
+else:
+    from common import path
+    from common.serverless.utils import read_json
+
+# Bump to stop using records of documents processed by older code
+VERSION = 1
+
+
+def settings_key(**settings):
+    """A key for the settings which affect the output of processing"""
+    settings["version"] = VERSION
+    encoded = json.dumps(settings, sort_keys=True).encode("utf8")
+    return hashlib.sha1(encoded).hexdigest()[:16]
+
+
+def find(storage, file_hash, key):
+    """Find the record of a document processed from the same file with the same
+    settings, if there is one and its files have not changed since"""
+    processed_path = path.processed_path(file_hash, key)
+    processed = read_json(storage, processed_path)
+    if processed is None:
+        return None
+    marker = read_json(
+        storage, path.processed_marker_path(processed["doc_id"], processed["slug"])
+    )
+    if marker is None or marker["processed"] != processed_path:
+        return None
+    return processed
+
+
+def record(storage, doc_id, slug, file_hash, key, page_count, page_spec):
+    """Record a document which has finished processing"""
+    # pylint: disable=too-many-arguments
+    processed_path = path.processed_path(file_hash, key)
+    storage.simple_upload(
+        processed_path,
+        json.dumps(
+            {
+                "doc_id": doc_id,
+                "slug": slug,
+                "page_count": page_count,
+                "page_spec": page_spec,
+            }
+        ).encode("utf8"),
+    )
+    storage.simple_upload(
+        path.processed_marker_path(doc_id, slug),
+        json.dumps({"processed": processed_path}).encode("utf8"),
+    )
+
+
+def invalidate(storage, doc_id, slug):
+    """Stop a document from being copied, as its files are about to change"""
+    storage.delete(path.processed_marker_path(doc_id, slug))
+
+
+def processed_files(storage, processed, doc_id, slug):
+    """The files to copy from a recorded document to a document, as pairs of
+    source and destination paths"""
+    src_id = processed["doc_id"]
+    src_slug = processed["slug"]
+
+    # The PDF is copied as well, as the recorded document's PDF has had its
+    # OCR text grafted in
+    files = [
+        (path.doc_path(src_id, src_slug), path.doc_path(doc_id, slug)),
+        (path.text_path(src_id, src_slug), path.text_path(doc_id, slug)),
+        (path.json_text_path(src_id, src_slug), path.json_text_path(doc_id, slug)),
+    ]
+
+    # Copy every page file - page images, page text and text positions
+    src_prefix = path.pages_path(src_id) + f"{src_slug}-p"
+    dst_prefix = path.pages_path(doc_id) + f"{slug}-p"
+    for file_name in storage.list(src_prefix):
+        files.append((file_name, dst_prefix + file_name[len(src_prefix) :]))
+
+    return files
+
+
+def copy_processed(storage, processed, doc_id, slug, access, workers):
+    """Copy the files of a recorded document to a document"""
+    # pylint: disable=too-many-arguments
+    files = processed_files(storage, processed, doc_id, slug)
+    logger.info(
+        "[DEDUP] doc_id %s copying %d files from doc_id %s",
+        doc_id,
+        len(files),
+        processed["doc_id"],
+    )
+    with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        copies = [
+            executor.submit(storage.copy, src, dst, access=access) for src, dst in files
+        ]
+        for copy in futures.as_completed(copies):
+            # Raise any errors copying
+            copy.result()
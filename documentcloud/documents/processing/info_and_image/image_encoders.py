@@ -0,0 +1,72 @@
+"""
+Registry of the encoders which may be used to write page images.
+
+The format used for each page image size is chosen per deployment with the
+`PAGE_IMAGE_FORMATS` environment variable (see `common/path.py`), and the
+encoder registered under that format name is used to write it.
+"""
+
+# Standard Library
+import importlib
+import io
+
+# Third Party
+import environ
+
+env = environ.Env()
+
+WEBP_QUALITY = env.int("WEBP_QUALITY", default=80)
+AVIF_QUALITY = env.int("AVIF_QUALITY", default=60)
+
+ENCODERS = {}
+
+
+class ImageEncoder:
+    """Encodes PIL images in a single image format"""
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self, name, content_type, pil_format, mode=None, plugin=None, **save_kwargs
+    ):
+        self.name = name
+        self.content_type = content_type
+        self.pil_format = pil_format
+        # Mode to convert images to before encoding, if any
+        self.mode = mode
+        # Optional module which must be imported to add support for the format
+        self.plugin = plugin
+        self.save_kwargs = save_kwargs
+
+    def encode(self, img):
+        if self.plugin is not None:
+            importlib.import_module(self.plugin)
+        if self.mode is not None and img.mode != self.mode:
+            img = img.convert(self.mode)
+        mem_file = io.BytesIO()
+        img.save(mem_file, format=self.pil_format, **self.save_kwargs)
+        return mem_file.getvalue()
+
+
+def register_encoder(encoder):
+    """Register an encoder under its format name"""
+    ENCODERS[encoder.name] = encoder
+
+
+def get_encoder(name):
+    """Get the encoder registered for the given format name"""
+    try:
+        return ENCODERS[name]
+    except KeyError:
+        raise ValueError(f"No page image encoder registered for: {name}") from None
+
+
+register_encoder(ImageEncoder("gif", "image/gif", "GIF"))
+register_encoder(ImageEncoder("png", "image/png", "PNG", compress_level=6))
+register_encoder(
+    ImageEncoder("webp", "image/webp", "WEBP", quality=WEBP_QUALITY, method=4)
+)
+register_encoder(
+    ImageEncoder(
+        "avif", "image/avif", "AVIF", plugin="pillow_avif", quality=AVIF_QUALITY
+    )
+)
@@ -0,0 +1,168 @@
+"""
+Work out which pages of a document need to be processed again when it is
+reprocessed, so that unaffected pages are left as they are.
+
+While the page cache is built, each page is loaded and the bytes read from the
+PDF to load it are hashed.  Objects shared between pages (such as fonts) are
+only read once, so they count towards the first page using them.  When a
+document finishes processing, the hashes are recorded along with the hash of
+the final PDF (which has had OCR text grafted in).
+
+When the document is reprocessed a page needs processing again if:
+
+    * its contents have changed - only checked if the PDF has changed since
+      it was processed, as grafting changes the pages which were OCRd
+    * OCR is forced and it was not OCRd in the requested language and engine
+    * any of its files are missing, as processing it failed
+    * it was requested explicitly
+"""
+
+# Standard Library
+import hashlib
+import json
+
+# Third Party
+import environ
+
+env = environ.Env()
+
+# pylint: disable=import-error
+
+# Imports based on execution context
+if env.str("ENVIRONMENT").startswith("local"):
+    # DocumentCloud
+    from documentcloud.common import path
+    from documentcloud.common.serverless.utils import read_json
+else:
+    from common import path
+    from common.serverless.utils import read_json
+
+FORCE_SUFFIX = "_force"
+
+
+class PageHasher:
+    """A cache for `StorageHandler` which hashes the reads made while loading
+    each page, instead of storing them
+
+    Set `section` to the page number being loaded
+    """
+
+    def __init__(self, page_count):
+        self.section = None
+        self.hashes = [hashlib.sha1() for _ in range(page_count)]
+
+    def __contains__(self, key):
+        return False
+
+    def __setitem__(self, key, value):
+        # Only the data is hashed, so that pages are unchanged if they have just
+        # moved within the file
+        if self.section is not None:
+            self.hashes[self.section].update(value)
+
+    def update(self, page_number, data):
+        """Add other properties of a page to its hash"""
+        self.hashes[page_number].update(data)
+
+    def hexdigests(self):
+        return [page_hash.hexdigest() for page_hash in self.hashes]
+
+
+def record(storage, doc_id, slug, file_hash, page_hashes):
+    """Record the page hashes of a document which has finished processing"""
+    storage.simple_upload(
+        path.page_hashes_path(doc_id, slug),
+        json.dumps({"file_hash": file_hash, "hashes": page_hashes}).encode("utf8"),
+    )
+
+
+def changed_pages(recorded, file_hash, page_hashes):
+    """The pages whose contents have changed since they were recorded, or None
+    if they cannot be compared"""
+    if recorded is None or len(recorded["hashes"]) != len(page_hashes):
+        return None
+    if recorded["file_hash"] == file_hash:
+        return set()
+    return {
+        page_number
+        for page_number, (old_hash, new_hash) in enumerate(
+            zip(recorded["hashes"], page_hashes)
+        )
+        if old_hash != new_hash
+    }
+
+
+def ocr_pages(json_pages, ocr_code, ocr_engine, force_ocr):
+    """The pages which have not been OCRd as requested"""
+    if not force_ocr:
+        # Without forcing OCR, previously OCRd text grafted into the PDF is used
+        return set()
+
+    pages = set()
+    for page in json_pages:
+        ocr = page.get("ocr") or ""
+        if ocr.endswith(FORCE_SUFFIX):
+            ocr = ocr[: -len(FORCE_SUFFIX)]
+        if ocr != ocr_engine or page.get("lang") != ocr_code:
+            pages.add(page["page"])
+    return pages
+
+
+def missing_pages(file_names, doc_id, slug, page_count, image_sizes):
+    """The pages which are missing any of their image or text files"""
+    file_names = set(file_names)
+    return {
+        page_number
+        for page_number in range(page_count)
+        if path.page_text_path(doc_id, slug, page_number) not in file_names
+        or any(
+            path.page_image_path(doc_id, slug, page_number, image_size)
+            not in file_names
+            for image_size in image_sizes
+        )
+    }
+
+
+def pages_to_process(
+    storage,
+    doc_id,
+    slug,
+    page_count,
+    file_hash,
+    page_hashes,
+    pages,
+    ocr_settings,
+    image_sizes,
+):
+    """The pages of a previously processed document which need to be processed
+    again, or None if the whole document should be processed
+
+    `page_hashes` may be None if the pages were not hashed, in which case only
+    the requested `pages` and pages which are incomplete are processed.
+    `ocr_settings` is a tuple of the OCR code, engine and whether to force OCR.
+    """
+    # pylint: disable=too-many-arguments
+    if page_hashes is None and not pages:
+        return None
+
+    json_text = read_json(storage, path.json_text_path(doc_id, slug))
+    if json_text is None or len(json_text["pages"]) != page_count:
+        return None
+
+    dirty = {page for page in pages or () if 0 <= page < page_count}
+
+    if page_hashes is not None:
+        changed = changed_pages(
+            read_json(storage, path.page_hashes_path(doc_id, slug)),
+            file_hash,
+            page_hashes,
+        )
+        if changed is None:
+            return None
+        dirty |= changed
+
+    dirty |= ocr_pages(json_text["pages"], *ocr_settings)
+    dirty |= missing_pages(
+        storage.list(path.pages_path(doc_id)), doc_id, slug, page_count, image_sizes
+    )
+    return dirty
@@ -2,13 +2,12 @@
 import collections
 import copy
 import csv
-import gzip
 import io
 import itertools
 import json
 import logging
-import pickle
 import time
+from concurrent import futures
 from random import randint
 from urllib.parse import urljoin
 
@@ -16,7 +15,6 @@ from urllib.parse import urljoin
 import environ
 import pdfplumber
 import pymupdf
-import redis
 import requests
 from botocore.exceptions import ClientError
 from listcrunch import crunch_collection
@@ -36,15 +34,26 @@ logging.getLogger("pdfminer").setLevel(logging.WARNING)
 # Imports based on execution context
 if env.str("ENVIRONMENT").startswith("local"):
     # DocumentCloud
-    from documentcloud.documents.processing.info_and_image import graft
-    from documentcloud.common import access_choices, path, redis_fields
+    from documentcloud.documents.processing.info_and_image import (
+        dedup,
+        graft,
+        incremental,
+    )
+    from documentcloud.common import (
+        access_choices,
+        lanes,
+        path,
+        redis_fields,
+        tracing,
+    )
     from documentcloud.common.environment import (
         encode_pubsub_data,
         get_pubsub_data,
         publisher,
         storage,
+        storage_cache,
     )
-    from documentcloud.common.serverless import utils
+    from documentcloud.common.serverless import batching, redis_scripts, utils
     from documentcloud.common.serverless.utils import REDIS_TTL
     from documentcloud.common.serverless.error_handling import (
         pubsub_function,
@@ -53,28 +62,50 @@ if env.str("ENVIRONMENT").startswith("local"):
     from documentcloud.documents.processing.info_and_image.graft_adapter import (
         GraftContext,
     )
+    from documentcloud.documents.processing.info_and_image.image_encoders import (
+        get_encoder,
+    )
+    from documentcloud.documents.processing.info_and_image.page_index import (
+        PageIndex,
+        PageIndexError,
+        RecordingCache,
+        encode_page_index,
+        record_sections,
+    )
     from documentcloud.documents.processing.info_and_image.pdfium import (
         StorageHandler,
         Workspace,
+        file_sha1,
     )
 else:
     # Third Party
+    import dedup
     import graft
+    import incremental
 
     # only initialize sentry on serverless
     import sentry_sdk
-    from common import access_choices, path, redis_fields
+    from common import access_choices, lanes, path, redis_fields, tracing
     from common.environment import (
         encode_pubsub_data,
         get_pubsub_data,
         publisher,
         storage,
+        storage_cache,
     )
-    from common.serverless import utils
+    from common.serverless import batching, redis_scripts, utils
     from common.serverless.utils import REDIS_TTL
     from common.serverless.error_handling import pubsub_function, pubsub_function_import
     from graft_adapter import GraftContext
-    from pdfium import StorageHandler, Workspace
+    from image_encoders import get_encoder
+    from page_index import (
+        PageIndex,
+        PageIndexError,
+        RecordingCache,
+        encode_page_index,
+        record_sections,
+    )
+    from pdfium import StorageHandler, Workspace, file_sha1
     from sentry_sdk.integrations.aws_lambda import AwsLambdaIntegration
     from sentry_sdk.integrations.redis import RedisIntegration
 
@@ -83,7 +114,6 @@ else:
     )
 
 
-IMAGE_SUFFIX = ".gif"
 IMAGE_BATCH = env.int(
     "EXTRACT_IMAGE_BATCH", default=55
 )  # Number of images to extract with each function
@@ -91,13 +121,41 @@ OCR_BATCH = env.int("OCR_BATCH", 1)  # Number of pages to OCR with each function
 TEXT_POSITION_BATCH = env.int(
     "TEXT_POSITION_BATCH", 3
 )  # Number of pages to pull text positions from with each function
+# Largest batches which may be planned when adaptive batching is enabled
+IMAGE_BATCH_MAX = env.int("EXTRACT_IMAGE_BATCH_MAX", 200)
+OCR_BATCH_MAX = env.int("OCR_BATCH_MAX", 10)
+TEXT_POSITION_BATCH_MAX = env.int("TEXT_POSITION_BATCH_MAX", 50)
+# Number of extracted pages to register in Redis together, so that a retried
+# batch does not need to extract them again
+IMAGE_REGISTER_BATCH = env.int("EXTRACT_IMAGE_REGISTER_BATCH", 10)
 PDF_SIZE_LIMIT = env.int("PDF_SIZE_LIMIT", 501 * 1024 * 1024)
 BLOCK_SIZE = env.int(
     "BLOCK_SIZE", 8 * 1024 * 1024
 )  # Block size to use for reading chunks of the PDF
+# Maximum number of PDF blocks to keep in memory while reading
+BLOCK_CACHE_SIZE = env.int("BLOCK_CACHE_SIZE", 8)
+# Number of blocks to read ahead when a PDF is being read sequentially
+BLOCK_READAHEAD = env.int("BLOCK_READAHEAD", 1)
 TEXT_READ_BATCH = env.int("TEXT_READ_BATCH", 1000)
 IMPORT_OCR_VERSION = env.str("IMPORT_OCR_VERSION", default="dc-import")
 IMPORT_DOCS_BATCH = env.int("IMPORT_DOCS_BATCH", 10000)
+# Copy the files of an identical document which has already been processed with
+# the same settings, instead of processing the document again
+PROCESSING_DEDUP = env.bool("PROCESSING_DEDUP", default=False)
+# Number of files to copy at once from an identical document
+DEDUP_COPY_WORKERS = env.int("DEDUP_COPY_WORKERS", default=32)
+# Hash the contents of each page, so that only the pages which have changed are
+# processed when a document is reprocessed
+INCREMENTAL_PROCESSING = env.bool("INCREMENTAL_PROCESSING", default=False)
+
+
+IMAGE_BATCH_PLANNER = batching.BatchPlanner(
+    "extract_image", IMAGE_BATCH, max_size=IMAGE_BATCH_MAX
+)
+OCR_BATCH_PLANNER = batching.BatchPlanner("ocr", OCR_BATCH, max_size=OCR_BATCH_MAX)
+TEXT_POSITION_BATCH_PLANNER = batching.BatchPlanner(
+    "text_position", TEXT_POSITION_BATCH, max_size=TEXT_POSITION_BATCH_MAX
+)
 
 
 def parse_extract_width(width_str):
@@ -120,6 +178,23 @@ IMAGE_WIDTHS = [
 ]  # width of images to OCR
 # Index of image widths to use for OCR
 OCR_IMAGE_INDEX = env.int("IMAGE_EXTRACT_OCR_INDEX", 1)
+# Whether OCR runs in memory, producing overlay PDFs which must be grafted
+# generically rather than as Tesseract text-only PDFs (see the OCR function)
+OCR_IN_MEMORY = env.bool("OCR_IN_MEMORY", default=False)
+# Render the image to OCR directly from the PDF and pass it to the OCR
+# function through Redis, instead of having it download a stored page image
+OCR_IMAGE_IN_REDIS = env.bool("OCR_IMAGE_IN_REDIS", default=False)
+# Width of images to use with OCR (matches the OCR function's setting)
+OCR_WIDTH = env.int("OCR_WIDTH", default=700)
+# Number of threads used to encode the different sizes of a page image
+IMAGE_ENCODE_WORKERS = env.int("IMAGE_ENCODE_WORKERS", default=len(IMAGE_WIDTHS))
+# Encoders for each page image size, in the same order as IMAGE_WIDTHS
+IMAGE_ENCODERS = [
+    get_encoder(path.page_image_format(image_size)) for image_size, _ in IMAGE_WIDTHS
+]
+# The page image formats as recorded for each document whose pages are all
+# written with them
+IMAGE_FORMATS = path.crunch_image_formats(path.PAGE_IMAGE_FORMATS)
 REDIS = utils.get_redis()
 
 # Topic names for the messaging queue
@@ -266,20 +341,21 @@ def initialize_partial_redis_page_data(doc_id, page_count, dirty_pages):
 
 def write_cache(filename, cache):
     """Helper method to write a cache file."""
-    mem_file = io.BytesIO()
-    with gzip.open(mem_file, "wb") as zip_file:
-        pickle.dump(cache, zip_file)
-
-    storage.simple_upload(filename, mem_file.getvalue(), access=access_choices.PRIVATE)
-    mem_file.close()
+    storage.simple_upload(
+        filename, encode_page_index(cache), access=access_choices.PRIVATE
+    )
 
 
-def read_cache(filename):
-    """Helper method to read a cache file."""
-    with storage.open(filename, "rb") as pickle_file, gzip.open(
-        pickle_file, "rb"
-    ) as zip_file:
-        return pickle.load(zip_file)
+def read_cache(filename, pages=None):
+    """Helper method to read a cache file, loading only the parts needed to
+    load the given pages (or all of it if None)."""
+    try:
+        return PageIndex.from_storage(storage, filename, pages)
+    except PageIndexError as exc:
+        # Indexes written in an older format are not trusted - fall back to
+        # reading everything from the PDF itself
+        logger.warning("[READ CACHE] %s: %s", filename, exc)
+        return {}
 
 
 def write_text_file(text_path, text, access):
@@ -306,7 +382,12 @@ def extract_pagecount(doc_id, slug):
     # Get the page sizes and initialize a cache of page positions
     doc_path = path.doc_path(doc_id, slug)
     with Workspace() as workspace, StorageHandler(
-        storage, doc_path, record=False, block_size=BLOCK_SIZE
+        storage,
+        doc_path,
+        record=False,
+        block_size=BLOCK_SIZE,
+        max_blocks=BLOCK_CACHE_SIZE,
+        readahead=BLOCK_READAHEAD,
     ) as pdf_file, workspace.load_document_custom(pdf_file) as doc:
         page_count = doc.page_count
 
@@ -318,59 +399,28 @@ def redact_document_and_overwrite(doc_id, slug, access, redactions):
     """Redacts a document and overwrites the original PDF."""
     doc_path = path.doc_path(doc_id, slug)
 
-    with Workspace() as workspace, workspace.load_document_entirely(
-        storage, doc_path
-    ) as doc:
+    # The original is read in blocks while the redacted copy is being written.
+    # This is safe as storage only replaces the file once it has been written.
+    with Workspace() as workspace, StorageHandler(
+        storage,
+        doc_path,
+        block_size=BLOCK_SIZE,
+        max_blocks=BLOCK_CACHE_SIZE,
+        readahead=BLOCK_READAHEAD,
+    ) as pdf_file, workspace.load_document_custom(pdf_file) as doc:
         new_doc = doc.redact_pages(redactions)
-        # Overwrite the original doc
-        new_doc.save(storage, doc_path, access)
+        # Overwrite the original doc, resuming the upload if redacting it the
+        # same way failed before
+        new_doc.save(
+            storage, doc_path, access, identity=json.dumps(["redact", redactions])
+        )
 
 
 def get_redis_pagespec(doc_id):
     """Get the dimensions of all pages in a convenient format using Redis"""
-    # pylint: disable=too-many-nested-blocks
-    dimensions_field = redis_fields.dimensions(doc_id)
-
-    pipeline = REDIS.pipeline()
-
-    # We cannot use the convenience transacation wrapper since values we watch
-    # are dynamic
-    # See https://pypi.org/project/redis/#pipelines for details
-    while True:
-        try:
-            # Start collecting page specs (resets if there's a watch error)
-            pagespec = collections.defaultdict(list)
-
-            pipeline.watch(dimensions_field)
-            # Restart if the dimensions are altered during runtime
-            page_dimensions = pipeline.smembers(dimensions_field)
-            if page_dimensions is None:
-                # If there are no page dimensions, exit with empty pagespec
-                pipeline.execute()
-                break
-
-            for page_dimension in page_dimensions:
-                page_dimension = page_dimension.decode("utf8")
-                page_dimension_field = redis_fields.page_dimension(
-                    doc_id, page_dimension
-                )
-                # Restart if any page dimension is altered during runtime
-                pipeline.watch(page_dimension_field)
-                page_numbers = pipeline.smembers(page_dimension_field)
-                if page_numbers is not None:
-                    for page_number in page_numbers:
-                        page_number = int(page_number.decode("utf8"))
-                        # Set the pagespec for each page number and dimension
-                        pagespec[page_dimension].append(page_number)
-
-            # Run the pipeline
-            pipeline.execute()
-            break
-        except redis.exceptions.WatchError:
-            continue
-        finally:
-            pipeline.reset()
-
+    # The dimensions and their pages are read atomically in a single script
+    pagespec = collections.defaultdict(list)
+    pagespec.update(redis_scripts.get_page_dimensions(REDIS, doc_id))
     return pagespec
 
 
@@ -381,7 +431,7 @@ def write_concatenated_text_file(doc_id, slug, access, page_jsons):
     )
 
     # Write the concatenated text file
-    storage.simple_upload(
+    storage.multipart_upload(
         path.text_path(doc_id, slug), concatenated_text, access=access
     )
 
@@ -398,7 +448,7 @@ def apply_modification(workspace, new_doc, context, modification):
     import_doc_slug = modification.get("slug", context["slug"])
     import_pdf_file = path.doc_path(import_doc_id, import_doc_slug)
     logger.info("[APPLY MODIFICATIONS] load doc %s", import_pdf_file)
-    import_doc = workspace.load_document_entirely(storage, import_pdf_file)
+    import_doc = workspace.load_document_entirely(storage_cache, import_pdf_file)
 
     # Import the actual PDF pages
     logger.info("[APPLY MODIFICATIONS] load pages")
@@ -540,9 +590,10 @@ def graft_ocr_in_pdf_tess(doc_id, slug, access):
             )
 
         # Overwrite source PDF
-        with storage.open(doc_path, "wb", access=access) as output_file:
-            grafter.output_file = output_file
-            grafter.finalize()
+        output_file = io.BytesIO()
+        grafter.output_file = output_file
+        grafter.finalize()
+        storage.multipart_upload(doc_path, output_file.getbuffer(), access=access)
 
 
 def graft_ocr_in_pdf(doc_id, slug, access):
@@ -580,9 +631,268 @@ def graft_ocr_in_pdf(doc_id, slug, access):
     # Overwrite source PDF
     mem_file = io.BytesIO()
     base_pdf.save(mem_file)
-    mem_file.seek(0)
-    with storage.open(doc_path, "wb", access=access) as output_file:
-        output_file.write(mem_file.read())
+    storage.multipart_upload(doc_path, mem_file.getbuffer(), access=access)
+
+
+def dedup_settings_key(ocr_code, force_ocr, ocr_engine):
+    """The key for the settings a document is processed with, for deduplication"""
+    return dedup.settings_key(
+        ocr_code=ocr_code,
+        force_ocr=force_ocr,
+        ocr_engine=ocr_engine,
+        image_widths=IMAGE_WIDTHS,
+        image_formats=path.PAGE_IMAGE_FORMATS,
+    )
+
+
+def copy_processed_document(doc_id, slug, access, file_hash, key):
+    """Copy the files of an identical processed document, if there is one.
+    Returns whether the document was copied."""
+    try:
+        processed = dedup.find(storage, file_hash, key)
+        if processed is None or processed["doc_id"] == doc_id:
+            return False
+        dedup.copy_processed(
+            storage, processed, doc_id, slug, access, DEDUP_COPY_WORKERS
+        )
+    except Exception as exc:  # pylint: disable=broad-except
+        # Fall back to processing the document
+        logger.exception("[DEDUP] doc_id %s copy failed", doc_id, exc_info=exc)
+        return False
+
+    logger.info("[DEDUP] doc_id %s copied from doc_id %s", doc_id, processed["doc_id"])
+    # The copied files may be recorded for later uploads of the file as well
+    dedup.record(
+        storage,
+        doc_id,
+        slug,
+        file_hash,
+        key,
+        processed["page_count"],
+        processed["page_spec"],
+    )
+    REDIS.set(redis_fields.file_hash(doc_id), file_hash, ex=REDIS_TTL)
+    utils.send_update(
+        REDIS,
+        doc_id,
+        {
+            "page_count": processed["page_count"],
+            "page_spec": processed["page_spec"],
+            # The settings key includes the image formats
+            "page_image_formats": IMAGE_FORMATS,
+        },
+    )
+    utils.send_complete(REDIS, doc_id)
+    return True
+
+
+def record_processed_document(doc_id, slug):
+    """Record a document which has finished processing so identical documents
+    may copy it"""
+    processed = REDIS.get(redis_fields.processed(doc_id))
+    if not processed:
+        return
+    processed = json.loads(processed)
+    try:
+        dedup.record(
+            storage,
+            doc_id,
+            slug,
+            processed["file_hash"],
+            processed["key"],
+            int(REDIS.get(redis_fields.page_count(doc_id))),
+            crunch_collection(get_redis_pagespec(doc_id)),
+        )
+    except Exception as exc:  # pylint: disable=broad-except
+        logger.exception("[DEDUP] doc_id %s record failed", doc_id, exc_info=exc)
+
+
+def hash_pages(workspace, pdf_file, page_count):
+    """Hash the contents of each page of a document, returning the hashes and
+    the dimensions of each page
+
+    The document is opened again to be hashed, as pdfium keeps the objects it
+    has parsed for as long as a document is open, and would not read them from
+    the file again for the pages which use them."""
+    hasher = incremental.PageHasher(page_count)
+    pdf_file.cache = hasher
+    dimensions = []
+    with workspace.load_document_custom(pdf_file) as doc:
+        for page_number in range(page_count):
+            hasher.section = page_number
+            with doc.load_page(page_number) as page:
+                dimension = f"{page.width:.2f}x{page.height:.2f}"
+                hasher.update(
+                    page_number, f"{dimension}:{page.rotation}".encode("utf8")
+                )
+            dimensions.append(dimension)
+    hasher.section = None
+    return hasher.hexdigests(), dimensions
+
+
+def plan_reprocessing(doc_id, slug, page_count, file_hash, page_hashes, pages, ocr):
+    """The pages which need to be processed again if the document has been
+    processed before, or None to process every page"""
+    # pylint: disable=too-many-arguments
+    try:
+        dirty = incremental.pages_to_process(
+            storage,
+            doc_id,
+            slug,
+            page_count,
+            file_hash,
+            page_hashes,
+            pages,
+            ocr,
+            [image_size for image_size, _ in IMAGE_WIDTHS],
+        )
+    except Exception as exc:  # pylint: disable=broad-except
+        # Fall back to processing every page
+        logger.exception("[INCREMENTAL] doc_id %s failed", doc_id, exc_info=exc)
+        return None
+    return None if dirty is None else sorted(dirty)
+
+
+def record_page_hashes(doc_id, slug):
+    """Record the page hashes of a document which has finished processing, to
+    compare against when it is reprocessed"""
+    page_hashes = REDIS.get(redis_fields.page_hashes(doc_id))
+    if not page_hashes:
+        return
+    try:
+        incremental.record(
+            storage,
+            doc_id,
+            slug,
+            file_sha1(storage, path.doc_path(doc_id, slug)),
+            json.loads(page_hashes),
+        )
+    except Exception as exc:  # pylint: disable=broad-except
+        logger.exception("[INCREMENTAL] doc_id %s record failed", doc_id, exc_info=exc)
+
+
+def write_checkpoint(doc_id, extract_image_data, image_batch, settings):
+    """Store what is needed to resume extracting the pages of a document, along
+    with the OCR settings requested for it"""
+    checkpoint_field = redis_fields.checkpoint(doc_id)
+    pipeline = REDIS.pipeline()
+    pipeline.hset(checkpoint_field, "extract_image", json.dumps(extract_image_data))
+    pipeline.hset(checkpoint_field, "image_batch", image_batch)
+    pipeline.hset(checkpoint_field, "settings", json.dumps(settings))
+    pipeline.hset(checkpoint_field, "image_formats", IMAGE_FORMATS)
+    pipeline.expire(checkpoint_field, REDIS_TTL)
+    pipeline.execute()
+
+
+def resume_processing(doc_id, ocr_code, force_ocr, ocr_engine):
+    """Resume processing a document which failed, only extracting the pages
+    which did not finish.  Returns False if there is nothing to resume from, or
+    if the OCR settings requested or the page image formats are not the ones it
+    was processed with."""
+    # pylint: disable=too-many-locals
+    checkpoint = REDIS.hgetall(redis_fields.checkpoint(doc_id))
+    page_count = REDIS.get(redis_fields.page_count(doc_id))
+    if not checkpoint or page_count is None:
+        return False
+
+    settings = [ocr_code, force_ocr, ocr_engine]
+    checkpoint_settings = json.loads(checkpoint.get(b"settings", b"null"))
+    if settings != checkpoint_settings:
+        # The finished pages were processed with other settings
+        logger.warning(
+            "[RESUME] doc_id %s requested OCR settings %s do not match %s, "
+            "processing from the start",
+            doc_id,
+            settings,
+            checkpoint_settings,
+        )
+        return False
+    if checkpoint.get(b"image_formats", b"").decode("utf8") != IMAGE_FORMATS:
+        # The finished pages were written in other image formats
+        logger.warning(
+            "[RESUME] doc_id %s page image formats have changed, "
+            "processing from the start",
+            doc_id,
+        )
+        return False
+
+    utils.resume(REDIS, doc_id)
+    extract_image_data = json.loads(checkpoint[b"extract_image"])
+    image_batch = int(checkpoint[b"image_batch"])
+    image_pages, text_pages, text_position_pages = utils.unfinished_pages(
+        REDIS, doc_id, int(page_count)
+    )
+    # Pages without text are extracted again, which extracts their text
+    # positions once they have text
+    extract_pages = sorted(set(image_pages) | set(text_pages))
+    position_pages = sorted(set(text_position_pages) - set(text_pages))
+
+    logger.info(
+        "[RESUME] doc_id %s extracting pages %s, text positions for pages %s",
+        doc_id,
+        extract_pages,
+        position_pages,
+    )
+
+    if not extract_pages and not position_pages:
+        # Every page finished, only assembling the text failed
+        publisher.publish(
+            ASSEMBLE_TEXT_TOPIC,
+            data=encode_pubsub_data(
+                {
+                    "doc_id": doc_id,
+                    "slug": extract_image_data["slug"],
+                    "access": extract_image_data["access"],
+                    "partial": extract_image_data["partial"],
+                    "ocr_engine": extract_image_data["ocr_engine"],
+                    "in_memory_ocr": bool(
+                        REDIS.exists(redis_fields.page_text_pdf(doc_id))
+                    ),
+                }
+            ),
+        )
+        return True
+
+    for i in range(0, len(extract_pages), image_batch):
+        publisher.publish(
+            IMAGE_EXTRACT_TOPIC,
+            data=encode_pubsub_data(
+                {**extract_image_data, "pages": extract_pages[i : i + image_batch]}
+            ),
+        )
+
+    # Text positions are extracted from the OCR text PDFs if they are still
+    # in memory, otherwise from the document
+    in_memory_pages = {
+        int(page_number)
+        for page_number in REDIS.hkeys(redis_fields.page_text_pdf(doc_id))
+    }
+    text_position_batch = extract_image_data["text_position_batch"]
+    for in_memory in (True, False):
+        pages = [
+            page_number
+            for page_number in position_pages
+            if (page_number in in_memory_pages) == in_memory
+        ]
+        for i in range(0, len(pages), text_position_batch):
+            publisher.publish(
+                TEXT_POSITION_EXTRACT_TOPIC,
+                data=encode_pubsub_data(
+                    {
+                        "paths_and_numbers": pages[i : i + text_position_batch],
+                        "doc_id": doc_id,
+                        "slug": extract_image_data["slug"],
+                        "access": extract_image_data["access"],
+                        "ocr_code": extract_image_data["ocr_code"],
+                        "partial": extract_image_data["partial"],
+                        "ocr_engine": extract_image_data["ocr_engine"],
+                        "in_memory": in_memory,
+                        "bytes_per_page": extract_image_data["bytes_per_page"],
+                    }
+                ),
+            )
+
+    return True
 
 
 def patch_partial_page_text(doc_id, slug, results):
@@ -617,33 +927,105 @@ def process_page_cache(data, _context=None):
     org_id = data.get("org_id", None)
     user_id = data.get("user_id", None)
     page_modification = data.get("page_modification", None)
+    file_hash = data.get("file_hash")
+    reprocess_pages = data.get("reprocess_pages")
+    # The formats of the document's existing page images, if known
+    image_formats = data.get("page_image_formats")
 
     logger.info("[PROCESS PAGE CACHE] doc_id %s", doc_id)
 
     doc_path = path.doc_path(doc_id, slug)
 
-    # Read the entire document into memory
+    # Read the document in blocks, recording the accesses
     with Workspace() as workspace, StorageHandler(
-        storage, doc_path, record=True, playback=False, cache=None, read_all=True
+        storage,
+        doc_path,
+        record=True,
+        playback=False,
+        cache=RecordingCache(),
+        block_size=BLOCK_SIZE,
+        max_blocks=BLOCK_CACHE_SIZE,
+        readahead=BLOCK_READAHEAD,
     ) as pdf_file, workspace.load_document_custom(pdf_file) as doc:
-        # Load the final page to memoize all page accesses
-        page_count = doc.page_count
-        doc.load_page(page_count - 1)
+        # Memoize all page accesses, recording the reads needed to look up
+        # each page separately, so that image extraction only needs to load
+        # the index for its own pages
         cached = pdf_file.cache
-
-        # Set the file hash in Redis to go out with the next update
-        REDIS.set(redis_fields.file_hash(doc_id), pdf_file.sha1, ex=REDIS_TTL)
+        page_count = record_sections(doc, cached)
 
         # Create an index file that stores the memory locations of each page of the
         # PDF file.
         write_cache(path.index_path(doc_id, slug), cached)
 
+        page_hashes = None
+        if INCREMENTAL_PROCESSING:
+            page_hashes, dimensions = hash_pages(workspace, pdf_file, page_count)
+            REDIS.set(
+                redis_fields.page_hashes(doc_id), json.dumps(page_hashes), ex=REDIS_TTL
+            )
+
+        # Set the file hash in Redis to go out with the next update.  It is
+        # hashed from the blocks already read once the pages have been loaded,
+        # so only the parts of the file which were not needed are fetched.
+        if file_hash is None:
+            file_hash = pdf_file.handle.sha1_hexdigest()
+        REDIS.set(redis_fields.file_hash(doc_id), file_hash, ex=REDIS_TTL)
+
+        if image_formats is not None and image_formats != IMAGE_FORMATS:
+            # The page image formats have changed since the document was
+            # processed.  Write every page in the new formats, rather than
+            # leaving it with pages in each.
+            if dirty:
+                logger.info(
+                    "[PROCESS PAGE CACHE] doc_id %s image formats changed, "
+                    "processing every page",
+                    doc_id,
+                )
+                initialize_redis_page_data(doc_id, page_count)
+            dirty = None
+        elif not dirty and page_modification is None:
+            # Only process the pages which need it if the document has been
+            # processed before
+            dirty = plan_reprocessing(
+                doc_id,
+                slug,
+                page_count,
+                file_hash,
+                page_hashes,
+                reprocess_pages,
+                (ocr_code, ocr_engine, force_ocr),
+            )
+            if dirty is not None:
+                logger.info(
+                    "[PROCESS PAGE CACHE] doc_id %s reprocessing pages %s",
+                    doc_id,
+                    dirty,
+                )
+                if not dirty:
+                    # Nothing has changed
+                    record_page_hashes(doc_id, slug)
+                    utils.send_complete(REDIS, doc_id)
+                    return
+                initialize_partial_redis_page_data(doc_id, page_count, set(dirty))
+                if page_hashes is not None:
+                    # Pages which have changed may have changed size
+                    pagespec = collections.defaultdict(list)
+                    for page_number, dimension in enumerate(dimensions):
+                        pagespec[dimension].append(page_number)
+                    utils.send_update(
+                        REDIS, doc_id, {"page_spec": crunch_collection(pagespec)}
+                    )
+
+        if not dirty and image_formats != IMAGE_FORMATS:
+            # Every page is being written in the current formats
+            utils.send_update(REDIS, doc_id, {"page_image_formats": IMAGE_FORMATS})
+
         # check AI credits if using premium OCR engine
         if ocr_engine == "textract":
             resp = requests.post(
                 urljoin(utils.API_CALLBACK, f"organizations/{org_id}/ai_credits/"),
                 json={
-                    "ai_credits": page_count,
+                    "ai_credits": len(dirty) if dirty else page_count,
                     "note": f"Textract for document {doc_id}",
                     "user_id": user_id,
                 },
@@ -653,39 +1035,77 @@ def process_page_cache(data, _context=None):
             if resp.status_code != 200:
                 ocr_engine = "tess4"
 
+        if PROCESSING_DEDUP and not dirty and page_modification is None:
+            # Record the document once it has been processed, under the
+            # settings it is actually processed with
+            REDIS.set(
+                redis_fields.processed(doc_id),
+                json.dumps(
+                    {
+                        "file_hash": file_hash,
+                        "key": dedup_settings_key(ocr_code, force_ocr, ocr_engine),
+                    }
+                ),
+                ex=REDIS_TTL,
+            )
+
+        # Plan the batch sizes for each stage from the size of the document
+        # and the timings of earlier batches
+        bytes_per_page = pdf_file.size / page_count
+        image_batch = IMAGE_BATCH_PLANNER.plan(REDIS, page_count, bytes_per_page)
+        ocr_batch = OCR_BATCH_PLANNER.plan(REDIS, page_count, bytes_per_page)
+        text_position_batch = TEXT_POSITION_BATCH_PLANNER.plan(
+            REDIS, page_count, bytes_per_page
+        )
+
+        extract_image_data = {
+            "doc_id": doc_id,
+            "slug": slug,
+            "access": access,
+            "ocr_code": ocr_code,
+            "partial": dirty,
+            "force_ocr": force_ocr,
+            "ocr_engine": ocr_engine,
+            "page_count": page_count,
+            "org_id": org_id,
+            "page_modification": page_modification,
+            "bytes_per_page": bytes_per_page,
+            "ocr_batch": ocr_batch,
+            "text_position_batch": text_position_batch,
+        }
+
+        if page_modification is None:
+            # Checkpoint how the pages are being extracted, so that only the
+            # unfinished pages need to be extracted again if processing fails
+            write_checkpoint(
+                doc_id,
+                extract_image_data,
+                image_batch,
+                # The engine requested, which may have been switched above
+                [ocr_code, force_ocr, data.get("ocr_engine", "tess4")],
+            )
+        else:
+            REDIS.delete(redis_fields.checkpoint(doc_id))
+
         # Method to publish image batches
         def pub(pages):
             if pages:
                 publisher.publish(
                     IMAGE_EXTRACT_TOPIC,
-                    data=encode_pubsub_data(
-                        {
-                            "doc_id": doc_id,
-                            "slug": slug,
-                            "access": access,
-                            "ocr_code": ocr_code,
-                            "pages": pages,
-                            "partial": dirty,
-                            "force_ocr": force_ocr,
-                            "ocr_engine": ocr_engine,
-                            "page_count": page_count,
-                            "org_id": org_id,
-                            "page_modification": page_modification,
-                        }
-                    ),
+                    data=encode_pubsub_data({**extract_image_data, "pages": pages}),
                 )
 
         # Trigger image extraction tasks for each page
         if dirty:
             # If only dirty pages are flagged, process the relevant ones in batches
             dirty = sorted(dirty)
-            for i in range(0, len(dirty), IMAGE_BATCH):
-                pages = [dirty[j] for j in range(i, min(i + IMAGE_BATCH, len(dirty)))]
+            for i in range(0, len(dirty), image_batch):
+                pages = [dirty[j] for j in range(i, min(i + image_batch, len(dirty)))]
                 pub(pages)
         else:
             # Otherwise, process all pages in batches
-            for i in range(0, page_count, IMAGE_BATCH):
-                pages = list(range(i, min(i + IMAGE_BATCH, page_count)))
+            for i in range(0, page_count, image_batch):
+                pages = list(range(i, min(i + image_batch, page_count)))
                 pub(pages)
 
 
@@ -703,9 +1123,17 @@ def process_pdf(data, _context=None):
     page_modification = data.get("page_modification", None)
     org_id = data.get("org_id", None)
     user_id = data.get("user_id", None)
+    reprocess_pages = data.get("reprocess_pages")
 
     logger.info("[PROCESS PDF] doc_id %s", doc_id)
 
+    if data.get("resume") and resume_processing(
+        doc_id, ocr_code, force_ocr, ocr_engine
+    ):
+        return "Ok"
+    # Processing from the start, so there is nothing to resume from
+    REDIS.delete(redis_fields.checkpoint(doc_id))
+
     # Ensure PDF size is within the limit
     doc_path = path.doc_path(doc_id, slug)
     if storage.size(doc_path) > PDF_SIZE_LIMIT:
@@ -718,6 +1146,19 @@ def process_pdf(data, _context=None):
     if access == access_choices.PUBLIC:
         storage.set_access([doc_path], access)
 
+    # The document's files are about to change.  This is done even when
+    # deduplication is off, so a marker left from when it was on never goes
+    # stale if it is switched back on.
+    dedup.invalidate(storage, doc_id, slug)
+
+    file_hash = None
+    if PROCESSING_DEDUP and page_modification is None:
+        # Copy an identical document if it has already been processed
+        file_hash = file_sha1(storage, doc_path)
+        key = dedup_settings_key(ocr_code, force_ocr, ocr_engine)
+        if copy_processed_document(doc_id, slug, access, file_hash, key):
+            return "Ok"
+
     # Extract the page count and store it in Redis
     page_count = extract_pagecount(doc_id, slug)
     initialize_redis_page_data(doc_id, page_count)
@@ -739,6 +1180,9 @@ def process_pdf(data, _context=None):
                 "org_id": org_id,
                 "user_id": user_id,
                 "page_modification": page_modification,
+                "file_hash": file_hash,
+                "reprocess_pages": reprocess_pages,
+                "page_image_formats": data.get("page_image_formats"),
             }
         ),
     )
@@ -751,6 +1195,28 @@ def get_large_image_path(doc_id, slug, page_number):
     return path.page_image_path(doc_id, slug, page_number, IMAGE_WIDTHS[0][0])
 
 
+def resize_pyramid(img):
+    """Resize a rendered page image to every configured image width.
+
+    Each size is resized from the next larger size rather than from the full
+    render, which is considerably cheaper for the smaller sizes.
+    """
+    images = [img]
+    for _image_size, image_width in IMAGE_WIDTHS[1:]:
+        source = images[-1]
+        if source.width < image_width:
+            # Widths are expected to be configured in descending order, but
+            # never upscale from a smaller image if they are not
+            source = img
+        images.append(
+            source.resize(
+                (image_width, max(round(img.height * (image_width / img.width)), 1)),
+                Image.ANTIALIAS,
+            )
+        )
+    return images
+
+
 def extract_single_page(doc_id, slug, access, page, page_number, large_image_path):
     """Internal method to extract a single page from a PDF file as an image.
 
@@ -758,32 +1224,48 @@ def extract_single_page(doc_id, slug, access, page, page_number, large_image_pat
         The page dimensions.
     """
 
-    # Extract the page as an image with a certain width
-    bmp = page.get_bitmap(IMAGE_WIDTHS[0][1], None)
-    img_buffer = bmp.render(storage, large_image_path, access)
-
-    # Resize to render smaller page sizes
-    for [image_suffix, image_width] in IMAGE_WIDTHS[1:]:
-        img = img_buffer.resize(
-            (
-                image_width,
-                max(round(img_buffer.height * (image_width / img_buffer.width)), 1),
-            ),
-            Image.ANTIALIAS,
-        )
+    # Extract the page as an image with the largest width
+    with tracing.span("render"), page.get_bitmap(IMAGE_WIDTHS[0][1], None) as bmp:
+        img = bmp.get_image()
+
+    # Resize to render smaller page sizes and encode all of them in parallel
+    with tracing.span("encode"):
+        images = resize_pyramid(img)
+        with futures.ThreadPoolExecutor(max_workers=IMAGE_ENCODE_WORKERS) as executor:
+            contents = list(
+                executor.map(
+                    lambda encoder, image: encoder.encode(image),
+                    IMAGE_ENCODERS,
+                    images,
+                )
+            )
 
-        mem_file = io.BytesIO()
-        img.save(mem_file, format=IMAGE_SUFFIX[1:].lower())
-        storage.simple_upload(
-            path.page_image_path(doc_id, slug, page_number, image_suffix),
-            mem_file.getvalue(),
-            access=access,
-        )
-        mem_file.close()
+    # Upload all of the page sizes at once
+    file_names = [large_image_path] + [
+        path.page_image_path(doc_id, slug, page_number, image_size)
+        for image_size, _image_width in IMAGE_WIDTHS[1:]
+    ]
+    storage.async_upload(
+        file_names,
+        contents,
+        content_types=[encoder.content_type for encoder in IMAGE_ENCODERS],
+        access=access,
+    )
 
     return (page.width, page.height)
 
 
+def write_ocr_image(doc_id, page, page_number):
+    """Render a grayscale image of the page at the OCR width and store it
+    losslessly in Redis for the OCR function
+    """
+    with tracing.span("render"), page.get_bitmap(OCR_WIDTH, None) as bmp:
+        img = bmp.get_image().convert("L")
+    mem_file = io.BytesIO()
+    img.save(mem_file, format="png")
+    utils.write_page_ocr_image(REDIS, doc_id, page_number, mem_file.getvalue())
+
+
 @pubsub_function(REDIS, IMAGE_EXTRACT_TOPIC)
 def extract_image(data, _context=None):
     """Renders (extracts) an image from a PDF file."""
@@ -801,6 +1283,10 @@ def extract_image(data, _context=None):
     ocr_engine = data.get("ocr_engine", "tess4")
     org_id = data.get("org_id", None)
     page_modification = data.get("page_modification", None)
+    bytes_per_page = data.get("bytes_per_page")
+    ocr_batch = data.get("ocr_batch", OCR_BATCH)
+    text_position_batch = data.get("text_position_batch", TEXT_POSITION_BATCH)
+    start_time = time.time()
 
     logger.info(
         "[EXTRACT IMAGE] doc_id %s pages %s", doc_id, ",".join(map(str, page_numbers))
@@ -810,10 +1296,49 @@ def extract_image(data, _context=None):
     ocr_queue = []
     text_position_queue = []
 
+    # Pages completed in this batch, registered in Redis together before any
+    # work depending on them is published
+    page_dimensions = []
+    page_texts = []
+    texts_found = []
+
+    def register_pages():
+        if page_dimensions:
+            if not partial:
+                # Update the page dimensions in Redis atomically
+                redis_scripts.add_page_dimensions(
+                    REDIS, doc_id, page_dimensions, REDIS_TTL
+                )
+
+            images_finished = utils.register_pages_extracted(
+                REDIS,
+                doc_id,
+                [page_number for page_number, _ in page_dimensions],
+                first_to_finish=True,
+            )
+
+            # Write the pagespec dimensions if all images have finished and
+            # it's not a partial update or modification.
+            if images_finished and not partial and page_modification is None:
+                update_pagespec(doc_id)
+
+            page_dimensions.clear()
+
+        if page_texts:
+            utils.write_page_texts(REDIS, doc_id, page_texts)
+            page_texts.clear()
+
+        if texts_found:
+            # Decrement the texts remaining
+            utils.register_pages_ocrd(REDIS, doc_id, texts_found)
+            texts_found.clear()
+
     def flush(queue, topic):
         if not queue:
             return
 
+        register_pages()
+
         logger.info("[EXTRACT IMAGE] flush: doc_id %s queue %s", doc_id, queue)
         # Trigger ocr pipeline
         publisher.publish(
@@ -830,6 +1355,8 @@ def extract_image(data, _context=None):
                     "ocr_engine": ocr_engine,
                     "org_id": org_id,
                     "page_modification": page_modification,
+                    "bytes_per_page": bytes_per_page,
+                    "text_position_batch": text_position_batch,
                 }
             ),
         )
@@ -840,8 +1367,18 @@ def extract_image(data, _context=None):
         if len(queue) >= batch:
             flush(queue, topic)
 
+    # The consolidated json text, loaded at most once for the whole batch
+    json_text = None
+
+    def get_json_page_text(page_number):
+        nonlocal json_text
+        if json_text is None:
+            with storage.open(path.json_text_path(doc_id, slug), "rb") as json_file:
+                json_text = json.loads(json_file.read())
+        return json_text["pages"][page_number]["contents"]
+
     # Open the PDF file with the cached index
-    cached = read_cache(path.index_path(doc_id, slug))
+    cached = read_cache(path.index_path(doc_id, slug), page_numbers)
 
     with Workspace() as workspace, StorageHandler(
         storage,
@@ -851,56 +1388,39 @@ def extract_image(data, _context=None):
         cache=cached,
         read_all=False,
         block_size=BLOCK_SIZE,
+        max_blocks=BLOCK_CACHE_SIZE,
+        readahead=BLOCK_READAHEAD,
     ) as pdf_file, workspace.load_document_custom(pdf_file) as doc:
+        # Check which pages have been extracted and OCRd in a single round trip
+        extracted_bits, ocrd_bits = utils.pages_extracted_and_ocrd(
+            REDIS, doc_id, page_numbers
+        )
+
         # Iterate each page number
-        for page_number in page_numbers:
+        for page_number, extracted, ocrd in zip(
+            page_numbers, extracted_bits, ocrd_bits
+        ):
             logger.info("[EXTRACT IMAGE] doc_id %s page_number %s", doc_id, page_number)
             # Only process if it has not processed previously
             large_image_path = path.page_image_path(
                 doc_id, slug, page_number, IMAGE_WIDTHS[0][0]
             )
             page = None
-            if not utils.page_extracted(REDIS, doc_id, page_number):
+            if not extracted:
                 # Extract the image if not already extracted
                 if page is None:
                     page = doc.load_page(page_number)
                 width, height = extract_single_page(
                     doc_id, slug, access, page, page_number, large_image_path
                 )
-                page_dimension = f"{width:.2f}x{height:.2f}"
-
-                if not partial:
-                    # Update the page dimensions in Redis atomically
-                    pipeline = REDIS.pipeline()
-                    pipeline.sadd(redis_fields.dimensions(doc_id), page_dimension)
-                    pipeline.expire(redis_fields.dimensions(doc_id), REDIS_TTL)
-                    pipeline.sadd(
-                        redis_fields.page_dimension(doc_id, page_dimension), page_number
-                    )
-                    pipeline.expire(
-                        redis_fields.page_dimension(doc_id, page_dimension), REDIS_TTL
-                    )
-                    pipeline.execute()
-
-                images_finished = utils.register_page_extracted(
-                    REDIS, doc_id, page_number
-                )
+                page_dimensions.append((page_number, f"{width:.2f}x{height:.2f}"))
 
-                # Write the pagespec dimensions if all images have finished and
-                # it's not a partial update or modification.
-                if images_finished and not partial and page_modification is None:
-                    update_pagespec(doc_id)
-
-            if not utils.page_ocrd(REDIS, doc_id, page_number):
+            if not ocrd:
                 # Extract page text if possible
                 if page_modification is not None:
                     # In page modification mode, extract page text from the
                     # consolidated json file
-                    with storage.open(
-                        path.json_text_path(doc_id, slug), "rb"
-                    ) as json_file:
-                        json_text = json.loads(json_file.read())
-                        text = json_text["pages"][page_number]["contents"]
+                    text = get_json_page_text(page_number)
                 elif force_ocr:
                     text = None
                 else:
@@ -915,29 +1435,45 @@ def extract_image(data, _context=None):
 
                     write_text_file(text_path, text, access)
                     if page_modification is None:
-                        utils.write_page_text(REDIS, doc_id, page_number, text, None)
+                        page_texts.append((page_number, text, None, "eng"))
 
-                    # Decrement the texts remaining
-                    utils.register_page_ocrd(REDIS, doc_id, page_number)
+                    texts_found.append(page_number)
 
                     # Extract text position
                     text_position_queue.append(page_number)
                     check_and_flush(
                         text_position_queue,
                         TEXT_POSITION_EXTRACT_TOPIC,
-                        TEXT_POSITION_BATCH,
+                        text_position_batch,
                     )
                 else:
                     # Prepare the image to be OCRd.
+                    if OCR_IMAGE_IN_REDIS:
+                        if page is None:
+                            page = doc.load_page(page_number)
+                        write_ocr_image(doc_id, page, page_number)
+                    # The stored image is still passed along as a fallback
                     ocr_image_path = path.page_image_path(
                         doc_id, slug, page_number, IMAGE_WIDTHS[OCR_IMAGE_INDEX][0]
                     )
                     ocr_queue.append([page_number, ocr_image_path])
-                    check_and_flush(ocr_queue, OCR_TOPIC, OCR_BATCH)
+                    check_and_flush(ocr_queue, OCR_TOPIC, ocr_batch)
+
+            if len(page_dimensions) >= IMAGE_REGISTER_BATCH:
+                register_pages()
 
+    register_pages()
     flush(ocr_queue, OCR_TOPIC)
     flush(text_position_queue, TEXT_POSITION_EXTRACT_TOPIC)
 
+    batching.record_timing(
+        REDIS,
+        "extract_image",
+        time.time() - start_time,
+        len(page_numbers),
+        bytes_per_page,
+    )
+
     return "Ok"
 
 
@@ -956,7 +1492,7 @@ def assemble_page_text(data, _context=None):
 
     # Reinject OCR layer into PDF
     try:
-        if ocr_engine == "tess4":
+        if ocr_engine == "tess4" and not (OCR_IN_MEMORY or data.get("in_memory_ocr")):
             graft_ocr_in_pdf_tess(doc_id, slug, access)
         else:
             graft_ocr_in_pdf(doc_id, slug, access)
@@ -978,12 +1514,16 @@ def assemble_page_text(data, _context=None):
     write_concatenated_text_file(doc_id, slug, access, results["pages"])
 
     # Write the json text file
-    storage.simple_upload(
+    storage.multipart_upload(
         path.json_text_path(doc_id, slug),
         json.dumps(results).encode("utf-8"),
         access=access,
     )
 
+    if not partial:
+        record_processed_document(doc_id, slug)
+    record_page_hashes(doc_id, slug)
+
     # All done processing the doc now
     utils.send_complete(REDIS, doc_id)
 
@@ -1004,7 +1544,9 @@ def extract_text_position(data, _context=None):
     page_numbers = data["paths_and_numbers"]  # The page numbers to extract
     partial = data["partial"]  # Whether it is a partial update (e.g. redaction) or not
     ocr_engine = data["ocr_engine"]
+    bytes_per_page = data.get("bytes_per_page")
     doc_path = path.doc_path(doc_id, slug)
+    start_time = time.time()
 
     logger.info(
         "[EXTRACT TEXT POSITION] doc_id %s page_numbers %s", doc_id, page_numbers
@@ -1017,7 +1559,7 @@ def extract_text_position(data, _context=None):
     pdf = None
     if not in_memory:
         # If not using in-memory Redis PDFs, read the whole doc file into memory
-        with storage.open(doc_path, "rb") as doc_file:
+        with tracing.span("download"), storage_cache.open(doc_path) as doc_file:
             contents = doc_file.read()
             mem_file = io.BytesIO(contents)
         try:
@@ -1112,6 +1654,14 @@ def extract_text_position(data, _context=None):
         # Close pdfplumber
         pdf.close()
 
+    batching.record_timing(
+        REDIS,
+        "text_position",
+        time.time() - start_time,
+        len(page_numbers),
+        bytes_per_page,
+    )
+
     return "Ok"
 
 
@@ -1137,6 +1687,9 @@ def redact_doc(data, _context=None):
     for redaction in redactions:
         dirty_pages.add(redaction["page_number"])
 
+    # The document's files are about to change
+    dedup.invalidate(storage, doc_id, slug)
+
     # Perform the actual redactions
     redact_document_and_overwrite(doc_id, slug, access, redactions)
 
@@ -1154,6 +1707,7 @@ def redact_doc(data, _context=None):
                 "access": access,
                 "ocr_code": ocr_code,
                 "dirty": dirty_pages_list,
+                "page_image_formats": data.get("page_image_formats"),
             }
         ),
     )
@@ -1175,6 +1729,10 @@ def modify_doc(data, _context=None):
         "[MODIFY DOC] doc_id %s modifications %s", doc_id, json.dumps(modifications)
     )
 
+    # The document's files are about to change, and must not be copied to an
+    # identical upload in the meantime, or ever if the modification fails
+    dedup.invalidate(storage, doc_id, slug)
+
     # Construct modified pdf
     modify_context = {
         "doc_id": doc_id,
@@ -1209,14 +1767,16 @@ def modify_doc(data, _context=None):
 
         # Overwrite PDF file with newly constructed modified PDF file
         doc_path = path.doc_path(doc_id, slug)
-        new_doc.save(storage, doc_path, access)
+        new_doc.save(
+            storage, doc_path, access, identity=json.dumps(["modify", modifications])
+        )
 
         logger.info("[MODIFY DOC] doc_id %s overwrite text json file", doc_id)
 
         # Assemble full json structure and write to file
         full_page_text_json = {"updated": millis(), "pages": page_text_json}
         page_text_json_path = path.json_text_path(doc_id, slug)
-        storage.simple_upload(
+        storage.multipart_upload(
             page_text_json_path,
             json.dumps(full_page_text_json).encode("utf-8"),
             access=access,
@@ -1293,6 +1853,9 @@ def start_import(data, _context=None):
             num_docs = sum(1 for _ in csvreader)
         REDIS.set(redis_fields.import_docs_remaining(org_id), num_docs, ex=REDIS_TTL)
 
+    # Imports are bulk work, so they do not hold up documents being uploaded
+    lane = lanes.lane(lanes.BULK, org_id)
+
     for doc_id, slug, access in doc_ids:
         logger.info("[START IMPORT] org_id %s doc_id %s slug %s", org_id, doc_id, slug)
         publisher.publish(
@@ -1304,6 +1867,7 @@ def start_import(data, _context=None):
                     "slug": slug,
                     # 4 is public, 8,9 are pre/post moderated which act as public
                     "public": access in ("4", "8", "9"),
+                    "lane": lane,
                 }
             ),
         )
@@ -1317,6 +1881,7 @@ def start_import(data, _context=None):
                     "org_id": org_id,
                     "offset": offset + IMPORT_DOCS_BATCH,
                     "num_docs": num_docs,
+                    "lane": lane,
                 }
             ),
         )
@@ -1461,7 +2026,7 @@ def import_document(data, _context=None):
     # do a simple retry with exponential back off
     for retry in range(3):
         try:
-            storage.simple_upload(
+            storage.multipart_upload(
                 path.json_text_path(doc_id, slug),
                 json.dumps(page_texts_json).encode("utf-8"),
                 access=access_choices.PUBLIC if public else access_choices.PRIVATE,
@@ -0,0 +1,220 @@
+"""
+A compact binary index of the reads pdfium makes when loading a PDF.
+
+The index is recorded once per document and played back by every worker which
+renders pages of it, so that they do not have to fetch the same bytes from
+storage again.  Reads are recorded in sections - a shared section with the
+reads needed to open the document, and a section for each page with the reads
+first needed to load that page.  A worker only loads the shared section and
+the sections of the pages it renders.
+
+Layout (all integers little endian):
+
+    header:   magic, version, reserved, section count, span count
+    sections: section number (-1 for shared), first span, span count,
+              data offset, data length
+    spans:    position in the PDF, length
+    data:     the bytes of every span, grouped by section
+
+Overlapping and adjacent reads within a section are merged into a single span,
+so each byte is stored once per section.
+"""
+
+# Standard Library
+import bisect
+import collections
+import struct
+
+MAGIC = b"DCPI"
+VERSION = 1
+SHARED = -1
+
+HEADER = struct.Struct("<4sHHII")
+SECTION = struct.Struct("<iIIQQ")
+SPAN = struct.Struct("<QI")
+
+
+class PageIndexError(Exception):
+    pass
+
+
+class RecordingCache(dict):
+    """A cache for `StorageHandler` which records which section each read was
+    first made in
+
+    Set `section` to the page number being loaded, or `SHARED`
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.section = SHARED
+        self.sections = collections.defaultdict(list)
+
+    def __setitem__(self, key, value):
+        if key not in self:
+            self.sections[self.section].append(key)
+        super().__setitem__(key, value)
+
+
+def record_sections(doc, cache):
+    """Record the reads needed to load each page of `doc` into `cache`
+
+    Each page's own reads are recorded first, in its own section, so that a
+    worker only needs to load the index for the pages it renders.  Loading the
+    final page afterwards records the remaining reads in the shared section.
+    A page tree node is recorded in the section of the first page which needs
+    it - workers which miss it fall back to reading it from storage.
+    """
+    page_count = doc.page_count
+    for page_number in range(page_count):
+        cache.section = page_number
+        doc.get_page_size(page_number)
+    cache.section = SHARED
+    doc.load_page(page_count - 1)
+    return page_count
+
+
+def merge_spans(reads):
+    """Merge (position, data) reads into non-overlapping spans"""
+    spans = []
+    for position, data in sorted(reads, key=lambda read: read[0]):
+        if spans and position <= spans[-1][0] + len(spans[-1][1]):
+            span_position, span_data = spans[-1]
+            overlap = span_position + len(span_data) - position
+            if len(data) > overlap:
+                spans[-1] = (span_position, span_data + data[overlap:])
+        else:
+            spans.append((position, bytes(data)))
+    return spans
+
+
+def encode_page_index(cache):
+    """Encode a recorded cache of (position, size) -> bytes reads as an index"""
+    sections = getattr(cache, "sections", None)
+    if sections is None:
+        # A plain dictionary has no sections - treat all reads as shared
+        sections = {SHARED: list(cache)}
+
+    section_table = []
+    span_table = []
+    data = []
+    data_offset = 0
+    for section in sorted(sections):
+        reads = [
+            (key[0], cache[key])
+            for key in sections[section]
+            if isinstance(key, tuple) and isinstance(cache[key], bytes)
+        ]
+        spans = merge_spans(reads)
+        data_length = sum(len(span_data) for _position, span_data in spans)
+        section_table.append(
+            SECTION.pack(section, len(span_table), len(spans), data_offset, data_length)
+        )
+        for position, span_data in spans:
+            span_table.append(SPAN.pack(position, len(span_data)))
+            data.append(span_data)
+        data_offset += data_length
+
+    return b"".join(
+        [HEADER.pack(MAGIC, VERSION, 0, len(section_table), len(span_table))]
+        + section_table
+        + span_table
+        + data
+    )
+
+
+class PageIndex:
+    """A read only cache of the spans loaded from an index, which may be used
+    to play back reads in a `StorageHandler`
+    """
+
+    def __init__(self, spans=()):
+        spans = sorted(spans, key=lambda span: span[0])
+        self.positions = [position for position, _data in spans]
+        self.spans = [data for _position, data in spans]
+
+    def _find(self, key):
+        position, size = key
+        idx = bisect.bisect_right(self.positions, position) - 1
+        if idx < 0:
+            return None, None
+        offset = position - self.positions[idx]
+        if offset + size > len(self.spans[idx]):
+            return None, None
+        return idx, offset
+
+    def __contains__(self, key):
+        return self._find(key)[0] is not None
+
+    def __getitem__(self, key):
+        idx, offset = self._find(key)
+        if idx is None:
+            raise KeyError(key)
+        return bytes(self.spans[idx][offset : offset + key[1]])
+
+    def __len__(self):
+        return len(self.spans)
+
+    @classmethod
+    def load(cls, read, pages=None):
+        """Load the shared section and the sections for the given pages (or
+        all pages if None) using `read(start, end)` to read byte ranges of the
+        index
+        """
+        header = read(0, HEADER.size)
+        if len(header) < HEADER.size:
+            raise PageIndexError("Index is truncated")
+        magic, version, _reserved, section_count, span_count = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise PageIndexError("Not a page index")
+        if version != VERSION:
+            raise PageIndexError(f"Unsupported page index version: {version}")
+
+        sections_start = HEADER.size
+        spans_start = sections_start + section_count * SECTION.size
+        data_start = spans_start + span_count * SPAN.size
+        tables = read(sections_start, data_start)
+
+        wanted = None if pages is None else set(pages) | {SHARED}
+        selected = []
+        for idx in range(section_count):
+            section = SECTION.unpack_from(tables, idx * SECTION.size)
+            if wanted is None or section[0] in wanted:
+                selected.append(section)
+
+        # Read the data for the selected sections, coalescing adjacent ones
+        runs = []
+        for _section, first_span, count, data_offset, data_length in selected:
+            if runs and runs[-1][1] == data_offset:
+                runs[-1][1] += data_length
+                runs[-1][2].append((first_span, count))
+            else:
+                runs.append(
+                    [data_offset, data_offset + data_length, [(first_span, count)]]
+                )
+
+        spans = []
+        spans_offset = spans_start - sections_start
+        for run_start, run_end, span_ranges in runs:
+            contents = memoryview(read(data_start + run_start, data_start + run_end))
+            offset = 0
+            for first_span, count in span_ranges:
+                for span in range(first_span, first_span + count):
+                    position, length = SPAN.unpack_from(
+                        tables, spans_offset + span * SPAN.size
+                    )
+                    spans.append((position, contents[offset : offset + length]))
+                    offset += length
+        return cls(spans)
+
+    @classmethod
+    def from_buffer(cls, buffer, pages=None):
+        """Load from a buffer, such as the bytes of the index or an mmap of it"""
+        return cls.load(lambda start, end: buffer[start:end], pages)
+
+    @classmethod
+    def from_storage(cls, storage, filename, pages=None):
+        """Load from storage, only reading the byte ranges which are needed"""
+        return cls.load(
+            lambda start, end: storage.read_range(filename, start, end), pages
+        )
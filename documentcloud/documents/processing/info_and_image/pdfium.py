@@ -31,6 +31,8 @@ c_ubyte_p = POINTER(c_ubyte)
 c_uint8_p = POINTER(c_uint8)
 
 INT_MAX = 2147483647
+# The most to fetch at once when hashing the parts of a file not yet read
+HASH_READ_SIZE = 8 * 1024 * 1024
 
 # Adapted from https://github.com/gersonkurz/pydfium
 
@@ -88,13 +90,13 @@ class Bitmap:
             self.bitmap, self.page, 0, 0, self.width, self.height, 0, 0x800
         )
 
-        stride = self.workspace.fpdf_bitmap_get_stride(self.bitmap)
+        self.stride = self.workspace.fpdf_bitmap_get_stride(self.bitmap)
 
         # Safety checks to make sure that the bitmap is rendered correctly
         if (
-            (stride < 0)
+            (self.stride < 0)
             or (self.width > INT_MAX / self.height)
-            or ((stride * self.height) > (INT_MAX / 3))
+            or ((self.stride * self.height) > (INT_MAX / 3))
         ):
             raise RuntimeError("Invalid bitmap")
 
@@ -120,19 +122,26 @@ class Bitmap:
             self.bitmap, min_x, min_y, width, height, fill
         )
 
-    def get_image(self):
-        # Use PIL to get an image buffer
-        bufflen = self.width * self.height * 4
+    def get_buffer(self):
+        """A ctypes array pointing directly at the pdfium bitmap's pixels"""
+        bufflen = self.stride * self.height
         bitmap = self.workspace.fpdf_get_bitmap_buffer(self.bitmap)
         bitmap = ctypes.cast(bitmap, ctypes.POINTER((bufflen * ctypes.c_ubyte)))
+        return bitmap.contents
 
-        img = PIL.Image.frombuffer(
-            "RGBA", (self.width, self.height), bitmap.contents, "raw", "RGBA", 0, 1
+    def get_image(self):
+        # pdfium renders BGRA pixels - let PIL's raw decoder swap the channels
+        # and drop the alpha while copying them into the image in a single
+        # pass, instead of splitting into bands and merging them back
+        return PIL.Image.frombuffer(
+            "RGB",
+            (self.width, self.height),
+            self.get_buffer(),
+            "raw",
+            "BGRX",
+            self.stride,
+            1,
         )
-        # pylint: disable=invalid-name, unbalanced-tuple-unpacking
-        b, g, r, _a = img.split()
-        img = PIL.Image.merge("RGB", (r, g, b))
-        return img
 
     def render(self, storage, filename, access, image_format="gif"):
         img = self.get_image()
@@ -242,6 +251,15 @@ class Document:
 
         return new_doc
 
+    def get_page_size(self, page_number):
+        """Get a page's size without loading (and parsing the contents of) it"""
+        width = c_double()
+        height = c_double()
+        assert self.workspace.fpdf_get_page_size_by_index(
+            self.doc, page_number, byref(width), byref(height)
+        ), "Unable to get page size"
+        return width.value, height.value
+
     def load_page(self, page_number):
         result = self.workspace.fpdf_load_page(self.doc, page_number)
         if not result:
@@ -308,20 +326,33 @@ class Document:
             self._monospace = self.load_font_from_file("courier.ttf")
         return self._monospace
 
-    def save(self, storage, filename, access):
-        with storage.open(filename, "wb", access=access) as doc_file:
+    def save(self, storage, filename, access, identity=None):
+        """Save the document to storage, uploading it in parts as it is written
+
+        A failed upload is resumed by saving with the same `identity`, which
+        must only be the same for the same contents."""
+        errors = []
+        with storage.multipart_writer(
+            filename, access=access, identity=identity
+        ) as writer:
 
             @CFUNCTYPE(c_int, c_void_p, c_void_p, c_ulong)
             def write_block(_fpdf_filewrite, p_data, size):
-                data = ctypes.cast(p_data, ctypes.POINTER((size * ctypes.c_ubyte)))
-                doc_file.write(bytearray(data.contents))
+                try:
+                    writer.write(ctypes.string_at(p_data, size))
+                except Exception as exc:  # pylint: disable=broad-except
+                    # an exception can not be raised through pdfium, so stop
+                    # the save and raise it afterwards
+                    errors.append(exc)
+                    return 0
                 return 1
 
             # Write with incremental rendering
             file_writer = FPDFFileWrite(1, write_block)
-            assert (
-                self.workspace.fpdf_save_as_copy(self.doc, byref(file_writer), 1) == 1
-            )
+            saved = self.workspace.fpdf_save_as_copy(self.doc, byref(file_writer), 1)
+            if errors:
+                raise errors[0]
+            assert saved == 1
 
     @property
     def page_count(self):
@@ -491,6 +522,13 @@ class Workspace:
         prototype = CFUNCTYPE(c_double, c_void_p)
         self.fpdf_get_page_height = prototype(("FPDF_GetPageHeight", self.pdfium))
 
+        prototype = CFUNCTYPE(
+            c_int, c_void_p, c_int, POINTER(c_double), POINTER(c_double)
+        )
+        self.fpdf_get_page_size_by_index = prototype(
+            ("FPDF_GetPageSizeByIndex", self.pdfium)
+        )
+
         prototype = CFUNCTYPE(c_int, c_void_p)
         self.fpdf_get_page_rotation = prototype(("FPDFPage_GetRotation", self.pdfium))
 
@@ -667,63 +705,137 @@ class Workspace:
         return Document(self, doc)
 
 
-class StorageCacher:
-    """Wraps a file handle into a structure that caches evenly sized blocks."""
+class BlockReader:
+    """Reads a file from storage in evenly sized blocks using ranged requests.
+
+    A bounded number of blocks are kept, evicting the least recently used.
+    Sequential access triggers reading ahead, and runs of adjacent blocks which
+    are not yet cached are fetched with a single ranged request.
+
+    Blocks are hashed in order as they are fetched, so that the sha1 hash of
+    the whole file only needs the blocks which were never read, or were
+    evicted before the blocks preceding them were read (see `sha1_hexdigest`).
+    """
 
-    def __init__(self, handle, file_size, block_size):
-        self.handle = handle
-        # The size of the actual file being wrapped
+    def __init__(self, storage, filename, file_size, block_size, max_blocks, readahead):
+        # pylint: disable=too-many-arguments
+        self.storage = storage
+        self.filename = filename
+        # The size of the actual file being read
         self.file_size = file_size
 
         # The internal block size
         self.block_size = block_size
+        # The maximum number of blocks to keep, or None for unbounded
+        self.max_blocks = max_blocks
+        # The number of blocks to read ahead on sequential access
+        self.readahead = readahead
 
         # The current seek position
         self.seek_position = 0
 
-        # Create all the possible blocks
-        self.blocks = {}
+        # Cached blocks, ordered from least to most recently used
+        self.blocks = collections.OrderedDict()
+        # The last block read, to detect sequential access
+        self.last_block = None
+
+        # The hash of the blocks before `hashed_blocks`
+        self.sha1 = hashlib.sha1()
+        self.hashed_blocks = 0
 
     def seek(self, position, _flag):
         self.seek_position = position
 
     def read(self, num_bytes):
-        return self._read(self.seek_position, num_bytes)
+        if num_bytes <= 0 or self.seek_position >= self.file_size:
+            return b""
+        num_bytes = min(num_bytes, self.file_size - self.seek_position)
+        first = self.seek_position // self.block_size
+        last = (self.seek_position + num_bytes - 1) // self.block_size
+
+        blocks = self._get_blocks(first, last)
+
+        offset = self.seek_position - first * self.block_size
+        contents = b"".join(blocks)[offset : offset + num_bytes]
+        self.seek_position += len(contents)
+        return contents
 
     def close(self):
-        self.handle.close()
+        self.blocks.clear()
+
+    def sha1_hexdigest(self):
+        """The sha1 hash of the whole file, fetching the blocks not yet hashed
+        which are no longer cached"""
+        block_count = (self.file_size - 1) // self.block_size + 1
+        while self.hashed_blocks < block_count:
+            if self.hashed_blocks in self.blocks:
+                self._hash_blocks()
+                continue
+            # Fetch a bounded run of missing blocks without caching them
+            run_blocks = max(HASH_READ_SIZE // self.block_size, 1)
+            run_last = self.hashed_blocks
+            while (
+                run_last + 1 < block_count
+                and run_last + 1 not in self.blocks
+                and run_last + 1 - self.hashed_blocks < run_blocks
+            ):
+                run_last += 1
+            start = self.hashed_blocks * self.block_size
+            end = min((run_last + 1) * self.block_size, self.file_size)
+            self.sha1.update(self.storage.read_range(self.filename, start, end))
+            self.hashed_blocks = run_last + 1
+        return self.sha1.hexdigest()
+
+    def _hash_blocks(self):
+        """Hash the cached blocks which follow the blocks already hashed"""
+        while self.hashed_blocks in self.blocks:
+            self.sha1.update(self.blocks[self.hashed_blocks])
+            self.hashed_blocks += 1
+
+    def _get_blocks(self, first, last):
+        """Return the blocks from first to last inclusive, fetching any that
+        are missing
+        """
+        wanted = list(range(first, last + 1))
+        fetch_last = last
+        if self.last_block is not None and first == self.last_block + 1:
+            # Sequential access - read ahead
+            max_block = (self.file_size - 1) // self.block_size
+            fetch_last = min(last + self.readahead, max_block)
+        self.last_block = last
+
+        # Group missing blocks into runs of adjacent blocks
+        runs = []
+        for idx in range(first, fetch_last + 1):
+            if idx in self.blocks:
+                continue
+            if runs and runs[-1][1] == idx - 1:
+                runs[-1][1] = idx
+            else:
+                runs.append([idx, idx])
 
-    def _get_block(self, idx):
-        assert idx <= (self.file_size - 1) // self.block_size
-        if idx in self.blocks:
-            # The block is already cached
-            return self.blocks[idx]
-
-        # Request the block and cache it
-        self.handle.seek(idx * self.block_size, os.SEEK_SET)
-        self.blocks[idx] = self.handle.read(self.block_size)
-        return self.blocks[idx]
-
-    def _read(self, start_pos, num_bytes):
-        # Calculate which block to read from
-        block_idx = start_pos // self.block_size
-
-        # Calculate offsets
-        block_start = block_idx * self.block_size
-        block_start_offset = start_pos - block_start
-        block_end_offset = min(block_start_offset + num_bytes, self.block_size)
-
-        # Extract the appropriate contents from the block
-        contents = self._get_block(block_idx)[block_start_offset:block_end_offset]
-
-        if num_bytes > block_end_offset - block_start_offset:
-            # If the read contents span an additional block, recursively return that
-            return contents + self._read(
-                block_start + self.block_size,
-                num_bytes - block_end_offset + block_start_offset,
-            )
-        else:
-            return contents
+        for run_first, run_last in runs:
+            start = run_first * self.block_size
+            end = min((run_last + 1) * self.block_size, self.file_size)
+            contents = self.storage.read_range(self.filename, start, end)
+            for idx in range(run_first, run_last + 1):
+                offset = (idx - run_first) * self.block_size
+                self.blocks[idx] = contents[offset : offset + self.block_size]
+        if runs:
+            self._hash_blocks()
+
+        result = []
+        for idx in wanted:
+            self.blocks.move_to_end(idx)
+            result.append(self.blocks[idx])
+
+        # Evict least recently used blocks - the blocks just requested are
+        # already in the result, so a read larger than the cache still works
+        if self.max_blocks is not None:
+            while len(self.blocks) > self.max_blocks:
+                self.blocks.popitem(last=False)
+
+        return result
 
 
 class StorageHandler:
@@ -737,6 +849,8 @@ class StorageHandler:
         cache=None,
         read_all=False,
         block_size=None,
+        max_blocks=None,
+        readahead=0,
     ):
         # pylint: disable=too-many-arguments
         self.filename = filename
@@ -752,21 +866,23 @@ class StorageHandler:
                 self.mem_file = io.BytesIO(contents)
             self.size = self.mem_file.getbuffer().nbytes
             self.handle = self.mem_file.__enter__()
+        elif block_size is not None:
+            # Read blocks from abstracted storage with ranged requests, for
+            # more efficient read access without holding the whole file
+            self.size = storage.size(filename)
+            self.handle = BlockReader(
+                storage, filename, self.size, block_size, max_blocks, readahead
+            )
+            # The sha1 hash is only computed if the whole file is read into
+            # memory - use `self.handle.sha1_hexdigest` to compute it from
+            # the blocks read
+            self.sha1 = None
         else:
             # Read from abstracted storage
             self.handle = storage.open(filename, "rb").__enter__()
             self.size = storage.size(filename)
-            # The sha1 hash is only computed if the whole file is read into
-            # memory. Technically the hash could be computed in chunks, but the
-            # primary caller of this code will read the whole file into memory
-            # at least once.
             self.sha1 = None
 
-        # If block size is used, storage cacher wraps the reads into retrieving
-        # blocks, for more efficient read access.
-        if block_size is not None:
-            self.handle = StorageCacher(self.handle, self.size, block_size)
-
         @CFUNCTYPE(c_int, c_void_p, c_ulong, c_ubyte_p, c_ulong)
         def get_block(_param, position, p_buf, size):
             if playback and (position, size) in self.cache:
@@ -791,3 +907,12 @@ class StorageHandler:
 
     def __exit__(self, exc_type, exc_value, traceback):
         self.handle.close()
+
+
+def file_sha1(storage, filename, chunk_size=1024 * 1024):
+    """Compute the sha1 hash of a file in storage without holding it in memory"""
+    sha1 = hashlib.sha1()
+    with storage.open(filename, "rb") as storage_file:
+        for chunk in iter(lambda: storage_file.read(chunk_size), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
@@ -1,10 +1,11 @@
 # Standard Library
+import io
 import json
 import logging
 import os
 import tempfile
 import time
-from pathlib import Path
+from concurrent import futures
 
 # Third Party
 import boto3
@@ -23,35 +24,37 @@ logger.setLevel(logging.INFO)
 # Imports based on execution context
 if env.str("ENVIRONMENT").startswith("local"):
     # DocumentCloud
-    from documentcloud.common import access_choices, path
+    from documentcloud.common import access_choices, path, tracing
     from documentcloud.common.environment import (
         encode_pubsub_data,
         get_pubsub_data,
         publisher,
         storage,
     )
+    from documentcloud.common.environment.cache import StorageCache
     from documentcloud.common.utils import graft_page
-    from documentcloud.common.serverless import utils
+    from documentcloud.common.serverless import batching, utils
     from documentcloud.common.serverless.error_handling import pubsub_function
-    from documentcloud.documents.processing.ocr.tess import Tesseract
+    from documentcloud.documents.processing.ocr.tess import tesseract_pool
 else:
     # Third Party
     # only initialize sentry on serverless
     import sentry_sdk
-    from common import access_choices, path
+    from common import access_choices, path, tracing
     from common.environment import (
         encode_pubsub_data,
         get_pubsub_data,
         publisher,
         storage,
     )
+    from common.environment.cache import StorageCache
     from common.utils import graft_page
-    from common.serverless import utils
+    from common.serverless import batching, utils
     from common.serverless.error_handling import pubsub_function
     from sentry_sdk.integrations.aws_lambda import AwsLambdaIntegration
     from sentry_sdk.integrations.redis import RedisIntegration
 
-    from tess import Tesseract
+    from tess import tesseract_pool
 
     sentry_sdk.init(
         dsn=env("SENTRY_DSN"), integrations=[AwsLambdaIntegration(), RedisIntegration()]
@@ -77,9 +80,11 @@ OCR_VERSION = env.str("OCR_VERSION", default="tess4")
 OCR_DATA_DIRECTORY = env.str("OCR_DATA_DIRECTORY", default="ocr-languages")
 OCR_DATA_EXTENSION = env.str("OCR_DATA_EXTENSION", default=".traineddata")
 TMP_DIRECTORY = env.str("TMP_DIRECTORY", "/tmp/ocrtmp")
-TMP_SIZE_LIMIT = env.str(
+TMP_SIZE_LIMIT = env.int(
     "TMP_SIZE_LIMIT", 400
 )  # size in megabytes (best be under lambda just to be safe)
+# Seconds to use downloaded OCR data files before checking if they have changed
+OCR_DATA_MAX_AGE = env.int("OCR_DATA_MAX_AGE", default=3600)
 
 # Ensures running on roughly 2Ghz+ machine
 PROFILE_CPU = env.bool("PROFILE_CPU", default=False)
@@ -88,6 +93,12 @@ CPU_DIFFICULTY = env.int("CPU_DIFFICULTY", default=20)
 
 # Width of images to use with OCR (aspect ratio is preserved)
 DESIRED_WIDTH = env.int("OCR_WIDTH", default=700)
+# Pass page images to Tesseract in memory and build the text overlay PDF from
+# the recognized word positions, instead of going through temporary files
+OCR_IN_MEMORY = env.bool("OCR_IN_MEMORY", default=False)
+# Number of pages to OCR in parallel within one invocation - 0 sizes it to the
+# container's CPU quota
+OCR_WORKERS = env.int("OCR_WORKERS", default=1)
 
 LARGE_IMAGE_SUFFIX = "-large"
 TXT_EXTENSION = ".txt"
@@ -95,41 +106,22 @@ TXT_EXTENSION = ".txt"
 TESS_PDF_PREFIX = "ocr"
 PDF_FONT_FILE = "pdf.ttf"  # Tesseract invisible font
 
+# OCR data files are kept on disk for Tesseract to load, in a cache of their own
+# which is always on, evicting the least recently used languages to stay under
+# the size limit
+ocr_data_cache = StorageCache(storage, TMP_DIRECTORY, TMP_SIZE_LIMIT * 1024 * 1024)
+
 
 def write_text_file(text_path, text, access):
     """Helper method to write a text file."""
     storage.simple_upload(text_path, text.encode("utf8"), access=access)
 
 
-def local_folder_size(folder_path):
-    return (
-        sum(file.stat().st_size for file in Path(folder_path).rglob("*")) / 1024 / 1024
-    )
-
-
 def download_tmp_file(relative_path):
     """Downloads the requested data file to a tmp directory."""
-    Path(TMP_DIRECTORY).mkdir(
-        parents=True, exist_ok=True
-    )  # Make tmp directory if it doesn't exist
-    local_file_path = os.path.join(TMP_DIRECTORY, relative_path)
-    if os.path.exists(local_file_path):
-        # OCR language pack already downloaded
-        return
-
-    # Check if tmp directory is too big
-    if local_folder_size(TMP_DIRECTORY) > TMP_SIZE_LIMIT:
-        # If so, just delete all OCR data (shouldn't happen too often)
-        logger.warning("[Deleting tmp OCR data]")
-        files = Path(TMP_DIRECTORY).rglob("*")
-        for file in files:
-            os.remove(file)
-
-    # Download OCR data file
-    with storage.open(
-        os.path.join(OCR_DATA_DIRECTORY, relative_path), "rb"
-    ) as ocr_data_file, open(local_file_path, "wb") as local_file:
-        local_file.write(ocr_data_file.read())
+    ocr_data_cache.path(
+        os.path.join(OCR_DATA_DIRECTORY, relative_path), OCR_DATA_MAX_AGE
+    )
 
 
 def download_language_pack(ocr_code):
@@ -137,6 +129,25 @@ def download_language_pack(ocr_code):
     download_tmp_file(f"{ocr_code}{OCR_DATA_EXTENSION}")
 
 
+def load_ocr_image(doc_id, page_path, page_number):
+    """Load the image to OCR the page from, preferring the grayscale render
+    passed through Redis over the stored page image
+    """
+    contents = utils.read_page_ocr_image(REDIS, doc_id, page_number)
+    if contents is not None:
+        img = Image.open(io.BytesIO(contents))
+        img.load()
+    else:
+        with tracing.span("download"), storage.open(page_path, "rb") as image_file:
+            img = Image.open(image_file).convert("RGB")
+
+    # Resize only if image is too big (OCR computation is slow with large images)
+    if img.width > DESIRED_WIDTH:
+        resize = DESIRED_WIDTH / img.width
+        img = img.resize((DESIRED_WIDTH, round(img.height * resize)), Image.ANTIALIAS)
+    return img
+
+
 def ocr_page(
     doc_id,
     ocr_engine,
@@ -160,6 +171,13 @@ def ocr_page(
 
     logger.info("[OCR PAGE] download complete doc_id %s", doc_id)
 
+    img = load_ocr_image(doc_id, page_path, page_number)
+
+    if ocr_engine != "textract" and OCR_IN_MEMORY:
+        return ocr_page_tesseract_in_memory(
+            doc_id, ocr_code, img, upload_text_path, access, slug, page_number
+        )
+
     # Initialize temporary files
     tmp_files = {
         "img": tempfile.mkstemp(suffix=".png")[1],
@@ -168,14 +186,6 @@ def ocr_page(
     }
 
     # Capture the page image as a temporary PNG file
-    with storage.open(page_path, "rb") as image_file:
-        img = Image.open(image_file).convert("RGB")
-        # Resize only if image is too big (OCR computation is slow with large images)
-        if img.width > DESIRED_WIDTH:
-            resize = DESIRED_WIDTH / img.width
-            img = img.resize(
-                (DESIRED_WIDTH, round(img.height * resize)), Image.ANTIALIAS
-            )
     img.save(tmp_files["img"], "png")
 
     logger.info("[OCR PAGE] image resized doc_id %s", doc_id)
@@ -198,13 +208,12 @@ def ocr_page(
 
 def ocr_page_tesseract(doc_id, ocr_code, tmp_files, upload_text_path, access):
     """Use Tesseract OCR to render a text-only PDF and txt file"""
-    tess = Tesseract(ocr_code)
     text = ""
     pdf_contents = b""
 
-    tess.create_renderer(tmp_files["pdf"], tmp_files["text"])
-    tess.render(tmp_files["img"])
-    tess.destroy_renderer()
+    with tracing.span("ocr"), tesseract_pool.acquire(ocr_code) as tess:
+        tess.create_renderer(tmp_files["pdf"], tmp_files["text"])
+        tess.render(tmp_files["img"])
 
     logger.info("[OCR PAGE] rendered doc_id %s", doc_id)
 
@@ -222,6 +231,54 @@ def ocr_page_tesseract(doc_id, ocr_code, tmp_files, upload_text_path, access):
     return text, pdf_contents
 
 
+def ocr_page_tesseract_in_memory(
+    doc_id, ocr_code, img, upload_text_path, access, slug, page_number
+):
+    """Use Tesseract OCR on an image in memory, and build a text-only PDF from
+    the recognized word positions
+    """
+    # pylint: disable=too-many-arguments
+    with tracing.span("ocr"), tesseract_pool.acquire(ocr_code) as tess:
+        tess.set_image(img.tobytes(), img.width, img.height, len(img.getbands()))
+        tess.recognize()
+        text = tess.get_text()
+        tess_words = tess.get_words()
+
+    logger.info("[OCR PAGE] recognized in memory doc_id %s", doc_id)
+
+    write_text_file(upload_text_path, text, access)
+
+    logger.info("[OCR PAGE] data stored doc_id %s", doc_id)
+
+    # The word positions are already known, so write the json positional words
+    # file here instead of extracting it back out of the overlay PDF
+    words = [
+        {
+            "text": word["text"],
+            "x1": word["left"] / img.width,
+            "x2": word["right"] / img.width,
+            "y1": word["top"] / img.height,
+            "y2": word["bottom"] / img.height,
+            "confidence": word["confidence"],
+        }
+        for word in tess_words
+    ]
+    storage.simple_upload(
+        path.page_text_position_path(doc_id, slug, page_number),
+        json.dumps(words).encode("utf-8"),
+        access=access,
+    )
+
+    logger.info("[OCR PAGE] extracted text position stored doc_id %s", doc_id)
+
+    # create the overlay PDF
+    pdf = pymupdf.open()
+    pdf_page = pdf.new_page(width=img.width, height=img.height)
+    graft_page(words, pdf_page)
+
+    return text, pdf.tobytes()
+
+
 def ocr_page_textract(doc_id, tmp_files, upload_text_path, access, slug, page_number):
     """Use Textract OCR to render a txt file"""
 
@@ -234,9 +291,10 @@ def ocr_page_textract(doc_id, tmp_files, upload_text_path, access, slug, page_nu
     with open(tmp_files["img"], "rb") as document:
         img = Image.open(document).convert("RGB")
         document.seek(0)
-        response = textract.detect_document_text(
-            Document={"Bytes": bytearray(document.read())}
-        )
+        with tracing.span("ocr"):
+            response = textract.detect_document_text(
+                Document={"Bytes": bytearray(document.read())}
+            )
 
     logger.info("[OCR PAGE] textract doc_id %s", doc_id)
 
@@ -288,7 +346,20 @@ def ocr_page_textract(doc_id, tmp_files, upload_text_path, access, slug, page_nu
     return text, pdf.tobytes()
 
 
-@pubsub_function(REDIS, OCR_TOPIC)
+def prime_tesseract(data):
+    """Initialize the Tesseract handle for the document's language before the
+    function is run, so that it is kept in the pool between invocations
+    """
+    if data.get("ocr_engine", "tess4") == "textract":
+        return
+    ocr_code = data.get("ocr_code", "eng")
+    download_language_pack(ocr_code)
+    download_tmp_file(PDF_FONT_FILE)
+    workers = OCR_WORKERS or utils.available_cpus()
+    tesseract_pool.prime(ocr_code, min(workers, len(data["paths_and_numbers"])))
+
+
+@pubsub_function(REDIS, OCR_TOPIC, prepare=prime_tesseract)
 def run_tesseract(data, _context=None):
     """Runs OCR on the images passed in, storing the extracted text."""
     # pylint: disable=too-many-locals, too-many-statements
@@ -303,6 +374,8 @@ def run_tesseract(data, _context=None):
     partial = data["partial"]  # Whether it is a partial update (e.g. redaction) or not
     force_ocr = data["force_ocr"]
     ocr_engine = data.get("ocr_engine", "tess4")
+    bytes_per_page = data.get("bytes_per_page")
+    text_position_batch = data.get("text_position_batch", TEXT_POSITION_BATCH)
 
     if force_ocr:
         ocr_version = f"{ocr_engine}_force"
@@ -335,6 +408,8 @@ def run_tesseract(data, _context=None):
                         "ocr_code": ocr_code,
                         "partial": partial,
                         "force_ocr": force_ocr,
+                        "bytes_per_page": bytes_per_page,
+                        "text_position_batch": text_position_batch,
                     }
                 ),
             )
@@ -357,13 +432,13 @@ def run_tesseract(data, _context=None):
         if not queue:
             return
 
-        if ocr_engine == "textract":
-            # textract also extracts text position, so skip to assemble text
-            for page_number in queue:
-                # Check if all text positions have been extracted
-                text_positions_finished = utils.register_text_position_extracted(
-                    REDIS, doc_id, page_number
-                )
+        if ocr_engine == "textract" or OCR_IN_MEMORY:
+            # textract and in memory tesseract also extract text position,
+            # so skip to assemble text
+            # Check if all text positions have been extracted
+            text_positions_finished = utils.register_text_positions_extracted(
+                REDIS, doc_id, queue
+            )
             if text_positions_finished:
                 # Move on to assembling/grafting the text back into the pdf
                 publisher.publish(
@@ -375,6 +450,7 @@ def run_tesseract(data, _context=None):
                             "access": access,
                             "partial": partial,
                             "ocr_engine": ocr_engine,
+                            "in_memory_ocr": OCR_IN_MEMORY,
                         }
                     ),
                 )
@@ -392,6 +468,7 @@ def run_tesseract(data, _context=None):
                         "ocr_engine": ocr_engine,
                         "partial": partial,
                         "in_memory": True,
+                        "bytes_per_page": bytes_per_page,
                     }
                 ),
             )
@@ -399,12 +476,12 @@ def run_tesseract(data, _context=None):
         queue.clear()
 
     def check_and_flush(queue):
-        if len(queue) >= TEXT_POSITION_BATCH:
+        if len(queue) >= text_position_batch:
             flush(queue)
 
     # Loop through all paths and numbers
-    for page_number, image_path in paths_and_numbers:
-
+    def ocr_numbered_page(page_number_and_path):
+        page_number, image_path = page_number_and_path
         ocrd = utils.page_ocrd(REDIS, doc_id, page_number)
         logger.info(
             "[RUN TESSERACT] doc_id %s page_number %s ocrd %s",
@@ -435,28 +512,54 @@ def run_tesseract(data, _context=None):
         )
 
         elapsed_time = time.time() - start_time
-        elapsed_times.append(elapsed_time)
         logger.info(
             "[RUN TESSERACT] doc_id %s page %s elapsed_time %s",
             doc_id,
             page_number,
             elapsed_time,
         )
+        return text, pdf_contents, elapsed_time
+
+    # OCR the pages in threads - Tesseract releases the GIL while recognizing,
+    # and each thread checks out its own handle from the Tesseract pool
+    workers = min(OCR_WORKERS or utils.available_cpus(), len(paths_and_numbers))
+    with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        if workers > 1:
+            page_results = executor.map(ocr_numbered_page, paths_and_numbers)
+        else:
+            page_results = map(ocr_numbered_page, paths_and_numbers)
 
-        # Write the output text and pdf to Redis
-        utils.write_page_text(REDIS, doc_id, page_number, text, ocr_version, ocr_code)
-        utils.write_page_text_pdf(REDIS, doc_id, page_number, pdf_contents)
+        # Results are yielded in page order as they complete
+        for (page_number, _image_path), (text, pdf_contents, elapsed_time) in zip(
+            paths_and_numbers, page_results
+        ):
+            elapsed_times.append(elapsed_time)
 
-        # Decrement the texts remaining
-        utils.register_page_ocrd(REDIS, doc_id, page_number)
+            # Write the output text and pdf to Redis
+            utils.write_page_text(
+                REDIS, doc_id, page_number, text, ocr_version, ocr_code
+            )
+            utils.write_page_text_pdf(REDIS, doc_id, page_number, pdf_contents)
 
-        # Queue text position extraction tasks
-        queue.append(page_number)
-        check_and_flush(queue)
+            # Decrement the texts remaining
+            utils.register_page_ocrd(REDIS, doc_id, page_number)
+            utils.delete_page_ocr_image(REDIS, doc_id, page_number)
+
+            # Queue text position extraction tasks
+            queue.append(page_number)
+            check_and_flush(queue)
 
     # Flush the remaining queue
     flush(queue)
 
+    batching.record_timing(
+        REDIS,
+        "ocr",
+        time.time() - overall_start,
+        len(paths_and_numbers),
+        bytes_per_page,
+    )
+
     result["doc_id"] = doc_id
     result["elapsed"] = elapsed_times
     result["status"] = "Ok"
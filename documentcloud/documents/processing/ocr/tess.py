@@ -1,8 +1,11 @@
 # Standard Library
+import collections
 import ctypes
 import ctypes.util
 import locale
 import os
+import threading
+from contextlib import ExitStack, contextmanager
 
 # Third Party
 import environ
@@ -14,7 +17,21 @@ TMP_DIRECTORY = env.str("TMP_DIRECTORY", "/tmp/ocrtmp")
 
 script_dir = os.path.dirname(os.path.realpath(__file__))
 LIB_PATH = os.path.join(script_dir, "tesseract/libtesseract.so.5")
-DATA_PATH = TMP_DIRECTORY
+# OCR data files are downloaded here by the OCR data cache
+DATA_PATH = os.path.join(
+    TMP_DIRECTORY, env.str("OCR_DATA_DIRECTORY", default="ocr-languages")
+)
+
+# Maximum number of languages to keep initialized Tesseract handles for
+TESSERACT_POOL_SIZE = env.int("TESSERACT_POOL_SIZE", default=2)
+# Evict idle handles for other languages when available memory drops below this
+TESSERACT_POOL_MIN_AVAILABLE_MB = env.int(
+    "TESSERACT_POOL_MIN_AVAILABLE_MB", default=512
+)
+
+
+# Page iterator levels
+RIL_WORD = 3
 
 
 class TesseractError(Exception):
@@ -77,11 +94,55 @@ class Tesseract:
             ctypes.c_int,
         )  # bytes_per_line
 
-        lib.TessBaseAPIGetUTF8Text.restype = ctypes.c_char_p
+        # Returned strings are owned by the caller and freed with TessDeleteText
+        lib.TessBaseAPIGetUTF8Text.restype = ctypes.c_void_p
         lib.TessBaseAPIGetUTF8Text.argtypes = (cls.TessBaseAPI,)  # handle
 
-        lib.TessBaseAPIGetHOCRText.restype = ctypes.c_char_p
-        lib.TessBaseAPIGetHOCRText.argtypes = (cls.TessBaseAPI,)  # handle
+        lib.TessBaseAPIGetHOCRText.restype = ctypes.c_void_p
+        lib.TessBaseAPIGetHOCRText.argtypes = (
+            cls.TessBaseAPI,  # handle
+            ctypes.c_int,  # page number
+        )
+
+        lib.TessDeleteText.restype = None
+        lib.TessDeleteText.argtypes = (ctypes.c_void_p,)
+
+        lib.TessBaseAPIRecognize.restype = ctypes.c_int
+        lib.TessBaseAPIRecognize.argtypes = (
+            cls.TessBaseAPI,  # handle
+            ctypes.c_void_p,  # monitor
+        )
+
+        lib.TessBaseAPIClear.restype = None
+        lib.TessBaseAPIClear.argtypes = (cls.TessBaseAPI,)  # handle
+
+        lib.TessBaseAPIGetIterator.restype = ctypes.c_void_p  # result iterator
+        lib.TessBaseAPIGetIterator.argtypes = (cls.TessBaseAPI,)  # handle
+
+        lib.TessResultIteratorDelete.restype = None
+        lib.TessResultIteratorDelete.argtypes = (ctypes.c_void_p,)
+
+        lib.TessResultIteratorGetPageIterator.restype = ctypes.c_void_p
+        lib.TessResultIteratorGetPageIterator.argtypes = (ctypes.c_void_p,)
+
+        lib.TessResultIteratorNext.restype = ctypes.c_int
+        lib.TessResultIteratorNext.argtypes = (ctypes.c_void_p, ctypes.c_int)
+
+        lib.TessResultIteratorGetUTF8Text.restype = ctypes.c_void_p
+        lib.TessResultIteratorGetUTF8Text.argtypes = (ctypes.c_void_p, ctypes.c_int)
+
+        lib.TessResultIteratorConfidence.restype = ctypes.c_float
+        lib.TessResultIteratorConfidence.argtypes = (ctypes.c_void_p, ctypes.c_int)
+
+        lib.TessPageIteratorBoundingBox.restype = ctypes.c_int
+        lib.TessPageIteratorBoundingBox.argtypes = (
+            ctypes.c_void_p,  # page iterator
+            ctypes.c_int,  # level
+            ctypes.POINTER(ctypes.c_int),  # left
+            ctypes.POINTER(ctypes.c_int),  # top
+            ctypes.POINTER(ctypes.c_int),  # right
+            ctypes.POINTER(ctypes.c_int),  # bottom
+        )
 
         lib.TessPDFRendererCreate.restype = ctypes.c_void_p  # PDF renderer
         lib.TessPDFRendererCreate.argtypes = (
@@ -134,11 +195,15 @@ class Tesseract:
             raise TesseractError("initialization failed")
 
     def __del__(self):
+        self.close()
+
+    def close(self):
         if not self._lib or not self._api:
             return
         if not getattr(self, "closed", False):
             if self.renderer:
                 self._lib.TessDeleteResultRenderer(self.renderer)
+                self.renderer = None
             self._lib.TessBaseAPIDelete(self._api)
             self.closed = True
 
@@ -156,19 +221,78 @@ class Tesseract:
             self._api, imagedata, width, height, bytes_per_pixel, bytes_per_line
         )
 
+    def _take_text(self, pointer):
+        """Copy a string returned by Tesseract and free the original"""
+        if not pointer:
+            return b""
+        try:
+            return ctypes.string_at(pointer)
+        finally:
+            self._lib.TessDeleteText(pointer)
+
     def get_utf8_text(self):
         self._check_setup()
-        return self._lib.TessBaseAPIGetUTF8Text(self._api)
+        return self._take_text(self._lib.TessBaseAPIGetUTF8Text(self._api))
 
     def get_text(self):
+        return self.get_utf8_text().decode("utf-8")
+
+    def get_hocr(self, page_number=0):
         self._check_setup()
-        result = self._lib.TessBaseAPIGetUTF8Text(self._api)
+        result = self._take_text(
+            self._lib.TessBaseAPIGetHOCRText(self._api, page_number)
+        )
         return result.decode("utf-8")
 
-    def get_hocr(self):
+    def recognize(self):
+        """Recognize the image set with `set_image`"""
         self._check_setup()
-        result = self._lib.TessBaseAPIGetHOCRText(self._api)
-        return result.decode("utf-8")
+        if self._lib.TessBaseAPIRecognize(self._api, None):
+            raise TesseractError("recognition failed")
+
+    def get_words(self):
+        """The recognized words, with their bounding boxes in pixels"""
+        self._check_setup()
+        words = []
+        iterator = self._lib.TessBaseAPIGetIterator(self._api)
+        if not iterator:
+            return words
+        try:
+            page_iterator = self._lib.TessResultIteratorGetPageIterator(iterator)
+            left, top, right, bottom = (ctypes.c_int() for _ in range(4))
+            while True:
+                text = self._lib.TessResultIteratorGetUTF8Text(iterator, RIL_WORD)
+                if text and self._lib.TessPageIteratorBoundingBox(
+                    page_iterator,
+                    RIL_WORD,
+                    ctypes.byref(left),
+                    ctypes.byref(top),
+                    ctypes.byref(right),
+                    ctypes.byref(bottom),
+                ):
+                    words.append(
+                        {
+                            "text": self._take_text(text).decode("utf-8"),
+                            "left": left.value,
+                            "top": top.value,
+                            "right": right.value,
+                            "bottom": bottom.value,
+                            "confidence": self._lib.TessResultIteratorConfidence(
+                                iterator, RIL_WORD
+                            ),
+                        }
+                    )
+                elif text:
+                    self._lib.TessDeleteText(text)
+                if not self._lib.TessResultIteratorNext(iterator, RIL_WORD):
+                    return words
+        finally:
+            self._lib.TessResultIteratorDelete(iterator)
+
+    def clear(self):
+        """Free the image and recognition results, keeping the language loaded"""
+        self._check_setup()
+        self._lib.TessBaseAPIClear(self._api)
 
     def create_renderer(self, pdf_base, text_base):
         self._check_setup()
@@ -208,3 +332,99 @@ class Tesseract:
 
         if not self._lib.TessResultRendererEndDocument(self.renderer):
             raise TesseractError("could not end document")
+
+
+def available_memory_mb():
+    """Memory available to this process, if it can be determined"""
+    try:
+        with open("/proc/meminfo", encoding="utf8") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class TesseractPool:
+    """Initialized Tesseract handles, kept around to be reused between pages
+
+    Initializing a handle loads the language's traineddata, which takes about
+    as long as recognizing a page, so handles are returned to the pool after
+    use instead of being deleted.  Languages are evicted least recently used
+    first, when there are too many of them or memory is running low.
+    """
+
+    def __init__(
+        self,
+        max_languages=TESSERACT_POOL_SIZE,
+        min_available_mb=TESSERACT_POOL_MIN_AVAILABLE_MB,
+    ):
+        self.max_languages = max_languages
+        self.min_available_mb = min_available_mb
+        # Idle handles by language, ordered from least to most recently used
+        self.idle = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def acquire(self, language="eng"):
+        """Check out a handle for the language, initializing one if needed"""
+        with self.lock:
+            handles = self.idle.get(language)
+            tess = handles.pop() if handles else None
+            if handles is not None and not handles:
+                del self.idle[language]
+        if tess is None:
+            tess = Tesseract(language)
+
+        try:
+            yield tess
+        except Exception:
+            # The handle may be left in a bad state - do not reuse it
+            tess.close()
+            raise
+
+        tess.destroy_renderer()
+        tess.clear()
+        with self.lock:
+            self.idle.setdefault(language, []).append(tess)
+            self.idle.move_to_end(language)
+            self.evict(keep=language)
+
+    def prime(self, language="eng", count=1):
+        """Ensure initialized handles for the language are in the pool"""
+        with ExitStack() as stack:
+            for _ in range(count):
+                stack.enter_context(self.acquire(language))
+
+    def evict(self, keep=None):
+        """Evict least recently used languages while over the limits
+
+        Must be called with the lock held
+        """
+
+        def over_limit():
+            if len(self.idle) > self.max_languages:
+                return True
+            available_mb = available_memory_mb()
+            return available_mb is not None and available_mb < self.min_available_mb
+
+        while over_limit():
+            language = next(
+                (language for language in self.idle if language != keep), None
+            )
+            if language is None:
+                return
+            for tess in self.idle.pop(language):
+                tess.close()
+
+    def clear(self):
+        """Close all idle handles"""
+        with self.lock:
+            for handles in self.idle.values():
+                for tess in handles:
+                    tess.close()
+            self.idle.clear()
+
+
+tesseract_pool = TesseractPool()
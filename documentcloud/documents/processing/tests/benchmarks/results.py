@@ -0,0 +1,58 @@
+"""
+Helpers to record machine-readable benchmark results, so that they can be
+compared across commits
+"""
+
+# Standard Library
+import json
+import os
+import platform
+import subprocess
+import time
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+results_dir = os.environ.get("BENCHMARK_RESULTS_DIR", os.path.join(base_dir, "results"))
+
+
+def git_commit():
+    """The commit being benchmarked, if it can be determined"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=base_dir,
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def best_time(func, repeat=3):
+    """Run a function several times and return the fastest run in seconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def write_results(name, results):
+    """Write benchmark results to a JSON file named after the benchmark and commit"""
+    os.makedirs(results_dir, exist_ok=True)
+    commit = git_commit()
+    filename = os.path.join(results_dir, f"{name}-{(commit or 'unknown')[:12]}.json")
+    with open(filename, "w", encoding="utf8") as results_file:
+        json.dump(
+            {
+                "benchmark": name,
+                "commit": commit,
+                "timestamp": time.time(),
+                "python": platform.python_version(),
+                "results": results,
+            },
+            results_file,
+            indent=2,
+        )
+    return filename
@@ -0,0 +1,103 @@
+# Django
+from django.test import override_settings
+
+# Standard Library
+import multiprocessing
+import os
+from functools import partial
+
+# Third Party
+import PIL.Image
+import pytest
+
+# DocumentCloud
+from documentcloud.common.environment.local.storage import storage
+from documentcloud.documents.processing.info_and_image.main import IMAGE_WIDTHS
+from documentcloud.documents.processing.info_and_image.pdfium import (
+    StorageHandler,
+    Workspace,
+)
+from documentcloud.documents.processing.tests.benchmarks.results import (
+    best_time,
+    write_results,
+)
+
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+pdfs = os.path.join(base_dir, "pdfs")
+
+
+def legacy_get_image(bmp):
+    """The previous conversion, which split the image into bands and merged them"""
+    img = PIL.Image.frombuffer(
+        "RGBA", (bmp.width, bmp.height), bmp.get_buffer(), "raw", "RGBA", 0, 1
+    )
+    # pylint: disable=invalid-name, unbalanced-tuple-unpacking
+    b, g, r, _a = img.split()
+    return PIL.Image.merge("RGB", (r, g, b))
+
+
+CONVERSIONS = {
+    "legacy": legacy_get_image,
+    "bgrx": lambda bmp: bmp.get_image(),
+}
+
+
+def memory_status(field):
+    """Read a memory field, in bytes, from the process status"""
+    with open("/proc/self/status", encoding="utf8") as status:
+        for line in status:
+            if line.startswith(f"{field}:"):
+                return int(line.split()[1]) * 1024
+    return None
+
+
+def measure_peak(conversion, width, queue):
+    """Measure the peak memory a conversion adds above the rendered bitmap
+
+    Run in a fresh process so that memory freed by earlier measurements is not
+    reused.  PIL allocates image memory outside of the Python allocator, so
+    tracemalloc can not see it - reset the kernel's high water mark instead.
+    """
+    with override_settings(MEDIA_ROOT=pdfs), Workspace() as workspace, StorageHandler(
+        storage, "doc_3.pdf"
+    ) as file_, workspace.load_document_custom(file_) as doc, doc.load_page(
+        0
+    ) as page, page.get_bitmap(
+        width, None
+    ) as bmp:
+        with open("/proc/self/clear_refs", "w", encoding="utf8") as clear_refs:
+            clear_refs.write("5")
+        before = memory_status("VmRSS")
+        img = CONVERSIONS[conversion](bmp)
+        queue.put(memory_status("VmHWM") - before)
+        del img
+
+
+@pytest.mark.slow
+@pytest.mark.benchmark
+def test_bitmap_conversion():
+    """Compare time and peak memory of converting rendered bitmaps to images"""
+    results = {}
+    context = multiprocessing.get_context("fork")
+    with override_settings(MEDIA_ROOT=pdfs), Workspace() as workspace, StorageHandler(
+        storage, "doc_3.pdf"
+    ) as file_, workspace.load_document_custom(file_) as doc, doc.load_page(0) as page:
+        for image_size, width in IMAGE_WIDTHS:
+            results[image_size] = {}
+            with page.get_bitmap(width, None) as bmp:
+                # Both conversions must produce identical images
+                assert legacy_get_image(bmp).tobytes() == bmp.get_image().tobytes()
+                for name, conversion in CONVERSIONS.items():
+                    queue = context.Queue()
+                    process = context.Process(
+                        target=measure_peak, args=(name, width, queue)
+                    )
+                    process.start()
+                    peak_bytes = queue.get()
+                    process.join()
+                    results[image_size][name] = {
+                        "seconds": best_time(partial(conversion, bmp), repeat=5),
+                        "peak_bytes": peak_bytes,
+                    }
+
+    write_results("bitmap_conversion", results)
@@ -0,0 +1,82 @@
+# Django
+from django.test import override_settings
+
+# Standard Library
+import importlib.util
+import io
+import os
+
+# Third Party
+import pytest
+from PIL import Image
+
+# DocumentCloud
+from documentcloud.common.environment.local.storage import storage
+from documentcloud.documents.processing.info_and_image.image_encoders import ENCODERS
+from documentcloud.documents.processing.info_and_image.main import (
+    IMAGE_WIDTHS,
+    resize_pyramid,
+)
+from documentcloud.documents.processing.info_and_image.pdfium import (
+    StorageHandler,
+    Workspace,
+)
+from documentcloud.documents.processing.tests.benchmarks.results import (
+    best_time,
+    write_results,
+)
+
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+pdfs = os.path.join(base_dir, "pdfs")
+
+
+def render_pages(file_name):
+    """Render every page of a test PDF at every page image size"""
+    pages = []
+    with override_settings(MEDIA_ROOT=pdfs), Workspace() as workspace, StorageHandler(
+        storage, file_name
+    ) as file_, workspace.load_document_custom(file_) as doc:
+        for page_number in range(doc.page_count):
+            with doc.load_page(page_number) as page, page.get_bitmap(
+                IMAGE_WIDTHS[0][1], None
+            ) as bmp:
+                pages.append(resize_pyramid(bmp.get_image()))
+    return pages
+
+
+@pytest.mark.slow
+@pytest.mark.benchmark
+def test_image_encoders():
+    """Compare encode time and bytes per page of each encoder against GIF"""
+    pages = render_pages("doc_3.pdf")
+
+    results = {}
+    for name, encoder in ENCODERS.items():
+        if encoder.plugin and importlib.util.find_spec(encoder.plugin) is None:
+            # Optional encoder which is not installed
+            continue
+        results[name] = {}
+        for size_index, (image_size, _image_width) in enumerate(IMAGE_WIDTHS):
+            images = [page[size_index] for page in pages]
+            contents = [encoder.encode(img) for img in images]
+            for content, img in zip(contents, images):
+                # Ensure the encoded image can be read back in at the same size
+                assert Image.open(io.BytesIO(content)).size == img.size
+
+            seconds = best_time(lambda: [encoder.encode(img) for img in images])
+            results[name][image_size] = {
+                "seconds_per_page": seconds / len(images),
+                "bytes_per_page": sum(len(c) for c in contents) / len(images),
+            }
+
+    for name, sizes in results.items():
+        for image_size, result in sizes.items():
+            gif_result = results["gif"][image_size]
+            result["time_vs_gif"] = (
+                result["seconds_per_page"] / gif_result["seconds_per_page"]
+            )
+            result["bytes_vs_gif"] = (
+                result["bytes_per_page"] / gif_result["bytes_per_page"]
+            )
+
+    write_results("image_encoders", results)
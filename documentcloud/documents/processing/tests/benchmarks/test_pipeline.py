@@ -0,0 +1,188 @@
+"""
+Benchmark the processing pipeline end to end on representative corpora.
+
+Documents are run through the patched pipeline (see `pipeline_tests/mocks.py`)
+on the local pool executor, so each stage runs in its own worker process as
+it would deployed.  Rendering, encoding and OCR are mocked, so the results
+measure the pipeline itself - messaging, batching, Redis and the files it
+writes - for each stage.
+
+Benchmarks are not run by CI - run them with `pytest -m benchmark`.
+"""
+
+# Django
+from django.test import TestCase
+
+# Standard Library
+from unittest.mock import patch
+
+# Third Party
+import pytest
+
+# DocumentCloud
+from documentcloud.common import redis_fields, tracing
+from documentcloud.common.environment import encode_pubsub_data, publisher
+from documentcloud.common.environment.local.executor import PoolExecutor
+from documentcloud.common.serverless.utils import get_redis
+from documentcloud.documents.choices import Access
+from documentcloud.documents.processing.info_and_image.main import (
+    ASSEMBLE_TEXT_TOPIC,
+    IMAGE_EXTRACT_TOPIC,
+    OCR_TOPIC,
+    PAGE_CACHE_TOPIC,
+    PDF_PROCESS_TOPIC,
+    TEXT_POSITION_EXTRACT_TOPIC,
+)
+from documentcloud.documents.processing.tests.benchmarks.results import write_results
+from documentcloud.documents.processing.tests.pipeline_tests import mocks
+from documentcloud.documents.processing.tests.pipeline_tests.fake_pdf import FakePdf
+
+INFO_AND_IMAGE = "documentcloud.documents.processing.info_and_image"
+OCR = "documentcloud.documents.processing.ocr"
+ENVIRONMENT = "documentcloud.common.environment"
+
+WORKERS = 4
+
+# The topic each traced processing function is run for
+STAGES = {
+    "process_pdf": PDF_PROCESS_TOPIC,
+    "process_page_cache": PAGE_CACHE_TOPIC,
+    "extract_image": IMAGE_EXTRACT_TOPIC,
+    "run_tesseract": OCR_TOPIC,
+    "extract_text_position": TEXT_POSITION_EXTRACT_TOPIC,
+    "assemble_page_text": ASSEMBLE_TEXT_TOPIC,
+}
+
+CORPORA = {
+    # Text can be extracted from every page
+    "born_digital": [FakePdf("." * 50)],
+    # Every page needs OCR
+    "scanned": [FakePdf("o" * 50)],
+    # A large document, with some pages needing OCR
+    "large": [FakePdf(("." * 9 + "o") * 120)],
+    # Documents of different lengths with pages of different sizes
+    "mixed_size": [
+        FakePdf("."),
+        FakePdf(".o" * 5, sizes=((612, 792), (792, 612))),
+        FakePdf("o" + "." * 60, sizes=((612, 792), (612, 1008), (595, 842))),
+        FakePdf(("." * 3 + "o") * 50, sizes=((612, 792),) * 9 + ((1224, 792),)),
+    ],
+}
+
+
+def count_simple_upload(_path, contents, access):
+    tracing.count("bytes_uploaded", len(contents))
+
+
+def count_async_upload(_paths, contents, content_types=None, access=None):
+    tracing.count("bytes_uploaded", sum(len(content) for content in contents))
+
+
+def count_write_text_file(text_path, text, access):
+    tracing.count("bytes_uploaded", len(text.encode("utf-8")))
+
+
+def run_document(pdf):
+    """Run a document through the pipeline, returning the statistics of each
+    topic"""
+    mocks.init_doc(pdf)
+    # Workers are forked once the document is set up, so they can see it
+    executor = PoolExecutor(WORKERS)
+    try:
+        with patch.object(publisher, "executor", executor):
+            publisher.publish(
+                PDF_PROCESS_TOPIC,
+                encode_pubsub_data(
+                    {"doc_id": mocks.ID, "slug": mocks.SLUG, "access": Access.private}
+                ),
+            )
+            assert publisher.join(600), "Processing did not finish"
+            return publisher.stats()
+    finally:
+        executor.shutdown()
+
+
+def merge_stats(total, stats):
+    """Add the statistics of a document run to the totals for a corpus"""
+    for topic, topic_stats in stats.items():
+        topic_total = total.setdefault(
+            topic,
+            {
+                "invocations": 0,
+                "errors": 0,
+                "pages": 0,
+                "busy_seconds": 0.0,
+                "wall_seconds": 0.0,
+                "max_rss_kb": 0,
+            },
+        )
+        for key in ("invocations", "errors", "pages", "busy_seconds", "wall_seconds"):
+            topic_total[key] += topic_stats[key]
+        topic_total["max_rss_kb"] = max(
+            topic_total["max_rss_kb"], topic_stats["max_rss_kb"]
+        )
+
+
+def run_corpus(pdfs):
+    """Run each document of a corpus and return results for each stage"""
+    redis = get_redis()
+    redis.delete(redis_fields.trace(mocks.ID))
+
+    total = {}
+    for pdf in pdfs:
+        merge_stats(total, run_document(pdf))
+    stages = tracing.summarize(tracing.get_traces(redis, mocks.ID))
+    page_count = sum(pdf.page_count for pdf in pdfs)
+
+    results = {}
+    for stage_name, topic in STAGES.items():
+        topic_stats = total.get(topic[-1])
+        stage = stages.get(stage_name)
+        # Every stage must have run, or the pipeline stopped early
+        assert topic_stats is not None, f"No tasks ran for {stage_name}"
+        assert stage is not None, f"No traces were saved for {stage_name}"
+        # Stages which are not run for batches of pages handle every page
+        pages = topic_stats["pages"] or page_count
+        redis_ops = stage["spans"].get("redis", [0.0, 0])[1]
+        results[stage_name] = {
+            **topic_stats,
+            "pages": pages,
+            "pages_per_second": (
+                pages / topic_stats["wall_seconds"]
+                if topic_stats["wall_seconds"]
+                else None
+            ),
+            "redis_seconds": stage["spans"].get("redis", [0.0, 0])[0],
+            "redis_ops_per_page": redis_ops / pages,
+            "bytes_uploaded": stage["counters"].get("bytes_uploaded", 0),
+        }
+    return {"page_count": page_count, "documents": len(pdfs), "stages": results}
+
+
+@pytest.mark.slow
+@pytest.mark.benchmark
+class PipelineBenchmark(TestCase):
+    @mocks.patch_pipeline
+    def test_pipeline(self, _mocks):
+        results = {}
+        # Functions are run with their timeouts, forked from the pool workers,
+        # as they are deployed
+        with patch(f"{ENVIRONMENT}.local.pubsub.EXECUTOR", "pool"), patch(
+            "documentcloud.common.serverless.error_handling.USE_TIMEOUT", True
+        ), patch(
+            "documentcloud.common.tracing.TRACING", True
+        ), patch(f"{ENVIRONMENT}.storage.simple_upload", count_simple_upload), patch(
+            f"{ENVIRONMENT}.storage.multipart_upload", count_simple_upload
+        ), patch(
+            f"{ENVIRONMENT}.storage.async_upload", count_async_upload
+        ), patch(
+            f"{INFO_AND_IMAGE}.main.write_text_file", count_write_text_file
+        ), patch(
+            f"{OCR}.main.write_text_file", count_write_text_file
+        ):
+            for name, pdfs in CORPORA.items():
+                results[name] = run_corpus(pdfs)
+                for stage_name, stage in results[name]["stages"].items():
+                    assert stage["errors"] == 0, f"{name} {stage_name} errored"
+
+        write_results("pipeline", results)
@@ -0,0 +1,39 @@
+"""
+Exports `FakeStorage`, a storage backend holding files in memory, for testing
+processing code without touching the file system.
+"""
+
+# Standard Library
+import io
+
+
+class FakeStorage:
+    """Storage holding files in memory, recording ranged reads"""
+
+    def __init__(self, files=None):
+        self.files = {} if files is None else files
+        self.ranges = []
+
+    def exists(self, file_name):
+        return file_name in self.files
+
+    def open(self, file_name, _mode="rb"):
+        return io.BytesIO(self.files[file_name])
+
+    def read_range(self, file_name, start, end):
+        self.ranges.append((start, end))
+        return self.files[file_name][start:end]
+
+    def simple_upload(self, file_name, contents):
+        self.files[file_name] = contents
+
+    def delete(self, file_prefix):
+        for file_name in self.list(file_prefix):
+            del self.files[file_name]
+
+    def list(self, file_prefix):
+        return [f for f in self.files if f.startswith(file_prefix)]
+
+    def copy(self, src, dst, access=None):
+        # pylint: disable=unused-argument
+        self.files[dst] = self.files[src]
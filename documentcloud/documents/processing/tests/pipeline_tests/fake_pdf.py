@@ -1,5 +1,5 @@
 class FakePdf:
-    def __init__(self, pages):
+    def __init__(self, pages, sizes=((100, 200),)):
         """Initializes the fake PDF with a string containing its pages.
 
         The pages are specified in a format indicating which pages need "OCR".
@@ -9,14 +9,20 @@ class FakePdf:
 
         indicates a 5 page PDF document where the 3rd and 5th pages need OCR.
 
+        The pages take their (width, height) from `sizes` in turn.
         """
         self.pages = pages
         self.page_count = len(pages)
+        self.sizes = sizes
 
     def needs_ocr(self, page_number):
         """Returns whether the 0-based page number requires OCR or not."""
         return self.pages[page_number] == "o"
 
+    def page_size(self, page_number):
+        """Returns the (width, height) of the 0-based page number."""
+        return self.sizes[page_number % len(self.sizes)]
+
     def redact(self, pages):
         """Redact pages by making them need OCR."""
         for page in pages:
@@ -24,8 +30,9 @@ class FakePdf:
 
 
 class FakePage:
-    def __init__(self, has_text):
+    def __init__(self, has_text, size=(100, 200)):
         self.has_text = has_text
+        self.width, self.height = size
 
     @property
     def text(self):
@@ -143,11 +143,15 @@ class Workspace:
                 if self.handler.record:
                     self.handler.cache[page] = True
 
+    def get_page_size(self, number):
+        """Look up page sizes without simulating page loads"""
+        return self.doc.page_size(number)
+
     def load_page(self, number):
         page_loaded(number)
         # Trigger the cache
         self.trigger_cache(number)
-        return FakePage(not self.doc.needs_ocr(number))
+        return FakePage(not self.doc.needs_ocr(number), self.doc.page_size(number))
 
 
 def storage_simple_upload(_path, contents, access):
@@ -158,6 +162,10 @@ def storage_size(filename):
     return 1  # Every document is 1 byte for testing
 
 
+def storage_read_range(filename, start, end):
+    return bytes(end - start)
+
+
 class StorageOpen:
     """Storage open mock. We should never need a write method due to mocks"""
 
@@ -203,7 +211,7 @@ def write_cache(filename, cache):
     cache_written(filename, cache)
 
 
-def read_cache(filename):
+def read_cache(filename, pages=None):
     if filename in files_cached:
         cache_read(filename, files_cached[filename])
         return files_cached[filename]
@@ -213,7 +221,7 @@ def read_cache(filename):
 
 def extract_single_page(doc_id, slug, access, page, page_number, large_image_path):
     page_extracted(page_number)
-    return (100, 200)  # Arbitrary width / height
+    return (page.width, page.height)
 
 
 def update_pagespec(doc_id):
@@ -286,7 +294,9 @@ def patch_pipeline(func):
     WORKSPACE_LOAD_MOCK = f"{INFO_AND_IMAGE}.pdfium.Workspace.load_document_custom"
     STORAGE_OPEN_MOCK = f"{ENVIRONMENT}.storage.open"
     STORAGE_SIMPLE_UPLOAD_MOCK = f"{ENVIRONMENT}.storage.simple_upload"
+    STORAGE_MULTIPART_UPLOAD_MOCK = f"{ENVIRONMENT}.storage.multipart_upload"
     STORAGE_SIZE_MOCK = f"{ENVIRONMENT}.storage.size"
+    STORAGE_READ_RANGE_MOCK = f"{ENVIRONMENT}.storage.read_range"
     PDF_PLUMBER_OPEN_MOCK = "pdfplumber.open"
     WRITE_CACHE_MOCK = f"{INFO_AND_IMAGE}.main.write_cache"
     READ_CACHE_MOCK = f"{INFO_AND_IMAGE}.main.read_cache"
@@ -329,7 +339,9 @@ def patch_pipeline(func):
     @patch(STORAGE_OPEN_MOCK, StorageOpen)
     @patch(PDF_PLUMBER_OPEN_MOCK, PdfPlumberOpen)
     @patch(STORAGE_SIMPLE_UPLOAD_MOCK, storage_simple_upload)
+    @patch(STORAGE_MULTIPART_UPLOAD_MOCK, storage_simple_upload)
     @patch(STORAGE_SIZE_MOCK, storage_size)
+    @patch(STORAGE_READ_RANGE_MOCK, storage_read_range)
     @patch(WRITE_CACHE_MOCK, write_cache)
     @patch(READ_CACHE_MOCK, read_cache)
     @patch(EXTRACT_SINGLE_PAGE_MOCK, extract_single_page)
@@ -25,7 +25,7 @@ def trigger_processing():
     )
 
 
-def trigger_redacting(page_numbers):
+def trigger_redacting(page_numbers, page_image_formats=None):
     """Triggers redaction processing via pubsub."""
     publisher.publish(
         REDACT_TOPIC,
@@ -37,6 +37,7 @@ def trigger_redacting(page_numbers):
                 "redactions": [
                     {"page_number": page_number} for page_number in page_numbers
                 ],
+                "page_image_formats": page_image_formats,
             }
         ),
     )
@@ -88,6 +89,18 @@ class PipelineTest(TestCase):
         assert mocks["page_ocrd"].call_count == 1
         assert mocks["page_text_position_extracted"].call_count == 1
 
+    @patch_pipeline
+    def test_redaction_image_formats(self, mocks):
+        init_doc(FakePdf("..."))
+        trigger_processing()
+
+        # The page images were written in other formats, so every page is
+        # written again in the current ones
+        reset_mocks(mocks)
+        trigger_redacting([1], page_image_formats="large=webp")
+        assert mocks["page_extracted"].call_count == 3
+        mocks["update_sent"].assert_any_call(ID, {"page_image_formats": ""})
+
     @patch_pipeline
     def test_cache_misses(self, mocks):
         init_doc(FakePdf("..."))
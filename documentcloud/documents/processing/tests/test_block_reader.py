@@ -0,0 +1,85 @@
+# Standard Library
+import hashlib
+import os
+from unittest import TestCase
+
+# DocumentCloud
+from documentcloud.documents.processing.info_and_image.pdfium import BlockReader
+from documentcloud.documents.processing.tests.fake_storage import FakeStorage
+
+
+class BlockReaderTest(TestCase):
+    def setUp(self):
+        self.contents = os.urandom(100)
+        self.storage = FakeStorage({"file.pdf": self.contents})
+
+    def reader(self, max_blocks=None, readahead=0):
+        return BlockReader(
+            self.storage, "file.pdf", len(self.contents), 10, max_blocks, readahead
+        )
+
+    def read(self, reader, position, size):
+        reader.seek(position, os.SEEK_SET)
+        return reader.read(size)
+
+    def test_reads(self):
+        reader = self.reader()
+        for position, size in [(0, 5), (5, 20), (37, 1), (95, 5), (0, 100), (98, 10)]:
+            assert (
+                self.read(reader, position, size)
+                == self.contents[position : position + size]
+            )
+
+    def test_coalesces_adjacent_blocks(self):
+        reader = self.reader()
+        self.read(reader, 5, 30)
+        # Blocks 0 through 3 are fetched with one request
+        assert self.storage.ranges == [(0, 40)]
+
+        self.read(reader, 25, 30)
+        # Only the missing blocks 4 and 5 are fetched
+        assert self.storage.ranges == [(0, 40), (40, 60)]
+
+    def test_readahead(self):
+        reader = self.reader(readahead=2)
+        self.read(reader, 0, 10)
+        self.read(reader, 10, 10)
+        # Sequential access reads the following blocks ahead
+        assert self.storage.ranges == [(0, 10), (10, 40)]
+        # Blocks read ahead are not fetched again, and reading continues ahead
+        self.read(reader, 20, 20)
+        assert self.storage.ranges == [(0, 10), (10, 40), (40, 60)]
+
+    def test_readahead_stops_at_end_of_file(self):
+        reader = self.reader(readahead=5)
+        self.read(reader, 80, 10)
+        self.read(reader, 90, 10)
+        assert self.storage.ranges == [(80, 90), (90, 100)]
+
+    def test_lru_eviction(self):
+        reader = self.reader(max_blocks=2)
+        self.read(reader, 0, 1)
+        self.read(reader, 50, 1)
+        self.read(reader, 0, 1)
+        self.read(reader, 90, 1)
+        # Block 5 was least recently used and evicted
+        assert list(reader.blocks) == [0, 9]
+        self.read(reader, 50, 1)
+        assert self.storage.ranges == [(0, 10), (50, 60), (90, 100), (50, 60)]
+
+    def test_large_read_exceeding_cache(self):
+        reader = self.reader(max_blocks=2)
+        assert self.read(reader, 0, 100) == self.contents
+        assert len(reader.blocks) <= 2
+
+    def test_sha1(self):
+        reader = self.reader(max_blocks=2)
+        self.read(reader, 0, 25)
+        self.read(reader, 90, 10)
+        self.read(reader, 25, 5)
+        assert reader.sha1_hexdigest() == hashlib.sha1(self.contents).hexdigest()
+        # Blocks 0 to 2 were hashed as they were read and block 9 is cached,
+        # so only blocks 3 to 8 are fetched again
+        assert self.storage.ranges == [(0, 30), (90, 100), (30, 90)]
+        assert reader.sha1_hexdigest() == hashlib.sha1(self.contents).hexdigest()
+        assert len(self.storage.ranges) == 3
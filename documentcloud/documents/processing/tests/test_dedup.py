@@ -0,0 +1,53 @@
+# Standard Library
+from unittest import TestCase
+
+# DocumentCloud
+from documentcloud.common import path
+from documentcloud.documents.processing.info_and_image import dedup
+from documentcloud.documents.processing.tests.fake_storage import FakeStorage
+
+FILE_HASH = "da39a3ee5e6b4b0d3255bfef95601890afd80709"
+
+
+class DedupTest(TestCase):
+    def setUp(self):
+        self.storage = FakeStorage()
+        self.key = dedup.settings_key(ocr_code="eng", force_ocr=False)
+        self.storage.files = {
+            path.doc_path(1, "doc"): b"pdf",
+            path.text_path(1, "doc"): b"text",
+            path.json_text_path(1, "doc"): b"{}",
+            path.page_image_path(1, "doc", 0, "large"): b"image",
+            path.page_text_path(1, "doc", 0): b"page text",
+            path.page_text_position_path(1, "doc", 0): b"[]",
+        }
+        dedup.record(self.storage, 1, "doc", FILE_HASH, self.key, 1, "100x200:0")
+
+    def test_settings_key(self):
+        assert self.key == dedup.settings_key(force_ocr=False, ocr_code="eng")
+        assert self.key != dedup.settings_key(ocr_code="spa", force_ocr=False)
+
+    def test_find(self):
+        processed = dedup.find(self.storage, FILE_HASH, self.key)
+        assert processed == {
+            "doc_id": 1,
+            "slug": "doc",
+            "page_count": 1,
+            "page_spec": "100x200:0",
+        }
+        assert dedup.find(self.storage, FILE_HASH, "other") is None
+
+    def test_invalidate(self):
+        dedup.invalidate(self.storage, 1, "doc")
+        assert dedup.find(self.storage, FILE_HASH, self.key) is None
+
+    def test_copy_processed(self):
+        processed = dedup.find(self.storage, FILE_HASH, self.key)
+        dedup.copy_processed(self.storage, processed, 2, "copy", "private", 2)
+        assert self.storage.files[path.doc_path(2, "copy")] == b"pdf"
+        assert self.storage.files[path.json_text_path(2, "copy")] == b"{}"
+        assert (
+            self.storage.files[path.page_image_path(2, "copy", 0, "large")] == b"image"
+        )
+        assert self.storage.files[path.page_text_path(2, "copy", 0)] == b"page text"
+        assert self.storage.files[path.page_text_position_path(2, "copy", 0)] == b"[]"
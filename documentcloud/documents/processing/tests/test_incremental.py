@@ -0,0 +1,273 @@
+# Django
+from django.test import override_settings
+
+# Standard Library
+import json
+import shutil
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+# DocumentCloud
+from documentcloud.common import path
+from documentcloud.common.environment.local.pubsub import (
+    encode_published_pubsub_data,
+    encode_pubsub_data,
+)
+from documentcloud.common.environment.local.storage import storage
+from documentcloud.common.serverless import utils
+from documentcloud.documents.processing.info_and_image import incremental, main
+from documentcloud.documents.processing.info_and_image.page_index import (
+    RecordingCache,
+    record_sections,
+)
+from documentcloud.documents.processing.info_and_image.pdfium import (
+    StorageHandler,
+    Workspace,
+)
+from documentcloud.documents.processing.tests.fake_storage import FakeStorage
+
+IMAGE_SIZES = ["large", "small"]
+FILE_HASH = "da39a3ee5e6b4b0d3255bfef95601890afd80709"
+
+MAIN = "documentcloud.documents.processing.info_and_image.main"
+SERVERLESS = "documentcloud.common.serverless"
+ID = -1
+SLUG = "doc"
+TEXTS = ["first page", "second page", "last page"]
+
+
+class FakeRedis:
+    """Redis holding hashes in memory"""
+
+    def __init__(self):
+        self.hashes = {}
+
+    def pipeline(self, transaction=True):
+        # pylint: disable=unused-argument
+        return self
+
+    def execute(self):
+        pass
+
+    def expire(self, _name, _time):
+        pass
+
+    def hset(self, name, key, value):
+        self.hashes.setdefault(name, {})[key.encode()] = value
+
+    def hkeys(self, name):
+        return list(self.hashes.get(name, {}))
+
+    def hmget(self, name, keys):
+        return [self.hashes.get(name, {}).get(key.encode()) for key in keys]
+
+
+def hashes(*contents):
+    hasher = incremental.PageHasher(len(contents))
+    for page_number, page_contents in enumerate(contents):
+        hasher.section = page_number
+        hasher[(page_number * 100, len(page_contents))] = page_contents
+    return hasher.hexdigests()
+
+
+class IncrementalTest(TestCase):
+    def setUp(self):
+        # Write the page text as processing does, so that the JSON text has
+        # the same fields as the one assembled from it
+        redis = FakeRedis()
+        utils.write_page_texts(
+            redis,
+            1,
+            [
+                (0, "text", None, "eng"),
+                (1, "scan", "tess4", "spa"),
+                (2, "scan", "tess4_force", "eng"),
+            ],
+        )
+        files = {
+            path.json_text_path(1, "doc"): json.dumps(
+                utils.get_all_page_text(redis, 1)
+            ).encode()
+        }
+        for page_number in range(3):
+            files[path.page_text_path(1, "doc", page_number)] = b""
+            for image_size in IMAGE_SIZES:
+                files[path.page_image_path(1, "doc", page_number, image_size)] = b""
+        self.storage = FakeStorage(files)
+        self.page_hashes = hashes(b"a", b"b", b"c")
+        incremental.record(self.storage, 1, "doc", FILE_HASH, self.page_hashes)
+
+    def pages_to_process(
+        self, page_hashes, file_hash="new", pages=None, ocr=("eng", "tess4", False)
+    ):
+        return incremental.pages_to_process(
+            self.storage, 1, "doc", 3, file_hash, page_hashes, pages, ocr, IMAGE_SIZES
+        )
+
+    def test_page_hasher(self):
+        # Pages are hashed by their contents, wherever they are in the file
+        hasher = incremental.PageHasher(2)
+        hasher.section = 1
+        hasher[(500, 1)] = b"b"
+        assert hasher.hexdigests()[1] == self.page_hashes[1]
+        assert hasher.hexdigests()[0] != self.page_hashes[0]
+
+    def test_unchanged(self):
+        assert self.pages_to_process(self.page_hashes, file_hash=FILE_HASH) == set()
+        assert self.pages_to_process(self.page_hashes) == set()
+
+    def test_changed(self):
+        assert self.pages_to_process(hashes(b"a", b"x", b"c")) == {1}
+        # The pages are not compared if the file is unchanged since it was
+        # processed, as the OCRd pages have had text grafted into them
+        assert (
+            self.pages_to_process(hashes(b"a", b"x", b"c"), file_hash=FILE_HASH)
+            == set()
+        )
+
+    def test_page_count_changed(self):
+        assert self.pages_to_process(hashes(b"a", b"b")) is None
+
+    def test_not_processed(self):
+        del self.storage.files[path.page_hashes_path(1, "doc")]
+        assert self.pages_to_process(self.page_hashes) is None
+        del self.storage.files[path.json_text_path(1, "doc")]
+        assert self.pages_to_process(None, pages=[1]) is None
+
+    def test_requested(self):
+        assert self.pages_to_process(self.page_hashes, pages=[0, 5]) == {0}
+        # Without page hashes, only requested pages are processed
+        assert self.pages_to_process(None, pages=[2]) == {2}
+        assert self.pages_to_process(None) is None
+
+    def test_force_ocr(self):
+        def force_ocr(ocr_code):
+            return self.pages_to_process(
+                self.page_hashes, ocr=(ocr_code, "tess4", True)
+            )
+
+        assert force_ocr("eng") == {0, 1}
+        assert force_ocr("spa") == {0, 2}
+        # Without forcing OCR the text grafted into the PDF is used
+        ocr = ("spa", "tess4", False)
+        assert self.pages_to_process(self.page_hashes, ocr=ocr) == set()
+
+    def test_missing(self):
+        del self.storage.files[path.page_image_path(1, "doc", 2, "small")]
+        assert self.pages_to_process(self.page_hashes) == {2}
+
+
+def make_pdf(texts):
+    """A PDF with a page showing each text, with the pages sharing a font
+
+    Each page's content is padded, so that the reads made to load a page do
+    not reach into the content of the next one.
+    """
+    page_count = len(texts)
+    kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(page_count))
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{kids}] /Count {page_count} >>".encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, text in enumerate(texts):
+        objects.append(
+            (
+                "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+            ).encode()
+        )
+        content = (
+            b"%" + b" " * 20000 + f"\nBT /F1 24 Tf 72 700 Td ({text}) Tj ET".encode()
+        )
+        objects.append(
+            b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content)
+        )
+
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (number, obj)
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1,
+        xref,
+    )
+    return pdf
+
+
+def encode(data):
+    """Encodes data in a format expected by pubsub functions invoked directly"""
+    return encode_published_pubsub_data(encode_pubsub_data(data))
+
+
+class IncrementalPdfTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        settings = override_settings(MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.doc_path = path.doc_path(ID, SLUG)
+
+    def hash_pages(self, texts):
+        storage.simple_upload(self.doc_path, make_pdf(texts))
+        with Workspace() as workspace, StorageHandler(
+            storage, self.doc_path, record=True, cache=RecordingCache()
+        ) as pdf_file, workspace.load_document_custom(pdf_file) as doc:
+            # Load every page first, as building the page cache does
+            record_sections(doc, pdf_file.cache)
+            page_hashes, dimensions = main.hash_pages(
+                workspace, pdf_file, doc.page_count
+            )
+        assert dimensions == ["612.00x792.00"] * len(texts)
+        return page_hashes
+
+    def test_hash_pages(self):
+        page_hashes = self.hash_pages(TEXTS)
+        changed_hashes = self.hash_pages(TEXTS[:-1] + ["changed last page"])
+        assert page_hashes[:-1] == changed_hashes[:-1]
+        assert page_hashes[-1] != changed_hashes[-1]
+        assert self.hash_pages(TEXTS) == page_hashes
+
+    def process_page_cache(self, texts):
+        """Build the page cache of a document, returning the pages published to
+        have their images extracted"""
+        storage.simple_upload(self.doc_path, make_pdf(texts))
+        utils.initialize(main.REDIS, ID)
+        with patch(f"{MAIN}.publisher") as mock_publisher:
+            main.process_page_cache(encode({"doc_id": ID, "slug": SLUG}))
+        return [
+            page
+            for call in mock_publisher.publish.call_args_list
+            if call.args[0] == main.IMAGE_EXTRACT_TOPIC
+            for page in json.loads(call.kwargs["data"])["pages"]
+        ]
+
+    @patch(f"{MAIN}.INCREMENTAL_PROCESSING", True)
+    @patch(f"{SERVERLESS}.error_handling.USE_TIMEOUT", False)
+    @patch(f"{SERVERLESS}.utils.send_update")
+    def test_process_page_cache(self, _mock_send_update):
+        self.addCleanup(utils.clean_up, main.REDIS, ID)
+
+        assert self.process_page_cache(TEXTS) == [0, 1, 2]
+
+        # Record the processed document along with the files of its pages
+        main.record_page_hashes(ID, SLUG)
+        json_pages = [{"page": i, "contents": text} for i, text in enumerate(TEXTS)]
+        storage.simple_upload(
+            path.json_text_path(ID, SLUG), json.dumps({"pages": json_pages}).encode()
+        )
+        for page_number in range(len(TEXTS)):
+            storage.simple_upload(path.page_text_path(ID, SLUG, page_number), b"")
+            for image_size, _ in main.IMAGE_WIDTHS:
+                storage.simple_upload(
+                    path.page_image_path(ID, SLUG, page_number, image_size), b""
+                )
+
+        # Only the changed last page is processed again
+        assert self.process_page_cache(TEXTS[:-1] + ["changed last page"]) == [2]
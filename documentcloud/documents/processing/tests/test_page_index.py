@@ -0,0 +1,97 @@
+# Django
+from django.test import override_settings
+
+# Standard Library
+import os
+from unittest import TestCase
+
+# DocumentCloud
+from documentcloud.common.environment.local.storage import storage
+from documentcloud.documents.processing.info_and_image.page_index import (
+    SHARED,
+    PageIndex,
+    PageIndexError,
+    RecordingCache,
+    encode_page_index,
+    record_sections,
+)
+from documentcloud.documents.processing.info_and_image.pdfium import (
+    StorageHandler,
+    Workspace,
+)
+from documentcloud.documents.processing.tests.fake_storage import FakeStorage
+
+pdfs = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pdfs")
+
+
+class PageIndexTest(TestCase):
+    def setUp(self):
+        self.pdf = os.urandom(5000)
+        self.shared_reads = [(0, 100), (50, 100), (300, 20), (4900, 100)]
+        self.page_reads = {
+            page: [(1000 + page * 200, 50), (1040 + page * 200, 30), (0, 100)]
+            for page in range(5)
+        }
+
+        self.cache = RecordingCache()
+        self.record(self.shared_reads)
+        for page, reads in self.page_reads.items():
+            self.cache.section = page
+            self.record(reads)
+        self.cache.section = SHARED
+
+    def record(self, reads):
+        for position, size in reads:
+            self.cache[(position, size)] = self.pdf[position : position + size]
+
+    def assert_reads(self, index, reads):
+        for position, size in reads:
+            assert (position, size) in index
+            assert index[(position, size)] == self.pdf[position : position + size]
+
+    def test_sections(self):
+        # Reads are only recorded in the section they were first made in
+        assert self.cache.sections[SHARED] == self.shared_reads
+        assert self.cache.sections[0] == self.page_reads[0][:2]
+
+    def test_round_trip(self):
+        index = PageIndex.from_buffer(encode_page_index(self.cache))
+        self.assert_reads(index, self.shared_reads)
+        for reads in self.page_reads.values():
+            self.assert_reads(index, reads)
+        # Reads within merged spans can also be served
+        self.assert_reads(index, [(20, 120)])
+        assert (200, 10) not in index
+
+    def test_load_pages(self):
+        storage = FakeStorage({"index": encode_page_index(self.cache)})
+        index = PageIndex.from_storage(storage, "index", pages=[2, 3])
+        self.assert_reads(index, self.shared_reads)
+        self.assert_reads(index, self.page_reads[2] + self.page_reads[3])
+        assert (1000, 50) not in index
+        assert (1800, 50) not in index
+        # Header, tables, the shared section and pages 2 and 3 together
+        assert len(storage.ranges) == 4
+
+    def test_plain_dict(self):
+        index = PageIndex.from_buffer(encode_page_index({(10, 5): self.pdf[10:15]}))
+        self.assert_reads(index, [(10, 5)])
+
+    def test_invalid(self):
+        with self.assertRaises(PageIndexError):
+            PageIndex.from_buffer(b"\x1f\x8b" + bytes(30))
+
+    @override_settings(MEDIA_ROOT=pdfs)
+    def test_record_sections(self):
+        cache = RecordingCache()
+        with Workspace() as workspace, StorageHandler(
+            storage, "doc_3.pdf", record=True, cache=cache
+        ) as pdf_file, workspace.load_document_custom(pdf_file) as doc:
+            assert record_sections(doc, cache) == 3
+
+        # Every page has reads of its own, not only the shared section
+        for page in range(3):
+            assert cache.sections[page]
+        index = PageIndex.from_buffer(encode_page_index(cache), pages=[1])
+        for key in cache.sections[1]:
+            assert index[key] == cache[key]
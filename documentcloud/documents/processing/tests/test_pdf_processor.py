@@ -1,5 +1,9 @@
+# Django
+from django.test import override_settings
+
 # Standard Library
 import os
+import shutil
 import tempfile
 
 # DocumentCloud
@@ -26,14 +30,17 @@ desired_texts = [None, page2_text, None]
 
 class PDFProcessorTest(ReportTestCase):
     def test_read_images_and_text(self) -> None:
-        with tempfile.TemporaryDirectory() as directory:
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            MEDIA_ROOT=directory
+        ):
             # Start the report and embed the reference PDF.
             self.report_generator.add_subheading("Initialize document")
             pdf_path = os.path.join(pdfs, "doc_3.pdf")
             self.report_generator.add_pdf(pdf_path)
+            shutil.copy(pdf_path, directory)
 
             with Workspace() as workspace, StorageHandler(
-                storage, pdf_path
+                storage, "doc_3.pdf"
             ) as file_, workspace.load_document_custom(file_) as doc:
                 # Assert correct page count.
                 self.assertEqual(doc.page_count, 3)
@@ -43,7 +50,7 @@ class PDFProcessorTest(ReportTestCase):
                     new_fn = f"doc_3_pg{i}.png"
                     new_path = os.path.join(directory, new_fn)
                     bmp = page.get_bitmap(1000, None)
-                    bmp.render(storage, new_path, Access.private, "png")
+                    bmp.render(storage, new_fn, Access.private, "png")
                     expected_image = os.path.join(pdfs, new_fn)
                     # Assert correct extracted images.
                     self.assertTrue(
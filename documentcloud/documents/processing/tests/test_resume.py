@@ -0,0 +1,133 @@
+# Standard Library
+import json
+from unittest import TestCase
+from unittest.mock import patch
+
+# DocumentCloud
+from documentcloud.common import redis_fields
+from documentcloud.common.serverless import utils
+from documentcloud.documents.choices import Access
+from documentcloud.documents.processing.info_and_image import main
+
+MAIN = "documentcloud.documents.processing.info_and_image.main"
+UTILS = "documentcloud.common.serverless.utils"
+CHECKPOINT_TTL = 60
+ID = -1
+PAGE_COUNT = 4
+SETTINGS = ["eng", False, "tess4"]
+EXTRACT_IMAGE_DATA = {
+    "doc_id": ID,
+    "slug": "doc",
+    "access": Access.private,
+    "ocr_code": "eng",
+    "partial": None,
+    "force_ocr": False,
+    "ocr_engine": "tess4",
+    "page_count": PAGE_COUNT,
+    "org_id": None,
+    "page_modification": None,
+    "bytes_per_page": 1000,
+    "ocr_batch": 2,
+    "text_position_batch": 2,
+}
+
+
+class ResumeTest(TestCase):
+    def setUp(self):
+        self.redis = main.REDIS
+        self.addCleanup(utils.clean_up, self.redis, ID)
+        utils.initialize(self.redis, ID)
+        main.initialize_redis_page_data(ID, PAGE_COUNT)
+        main.write_checkpoint(ID, EXTRACT_IMAGE_DATA, 2, SETTINGS)
+        # Processing failed, keeping its progress
+        with patch(f"{UTILS}.CHECKPOINT_TTL", CHECKPOINT_TTL):
+            assert utils.checkpoint(self.redis, ID)
+
+    def finish(self, field, pages):
+        for page_number in pages:
+            self.redis.setbit(field, page_number, 1)
+
+    def resume(self, settings=SETTINGS):
+        """Resume processing, returning the messages published by topic name"""
+        with patch(f"{MAIN}.publisher") as mock_publisher:
+            assert main.resume_processing(ID, *settings)
+        messages = {}
+        for call in mock_publisher.publish.call_args_list:
+            messages.setdefault(call.args[0][-1], []).append(
+                json.loads(call.kwargs["data"])
+            )
+        return messages
+
+    def test_images_left(self):
+        self.finish(redis_fields.image_bits(ID), [0, 2])
+        self.finish(redis_fields.text_bits(ID), range(PAGE_COUNT))
+        self.finish(redis_fields.text_position_bits(ID), range(PAGE_COUNT))
+
+        messages = self.resume()
+        assert list(messages) == [main.IMAGE_EXTRACT_TOPIC[-1]]
+        assert [m["pages"] for m in messages[main.IMAGE_EXTRACT_TOPIC[-1]]] == [
+            [1, 3]
+        ]
+        assert messages[main.IMAGE_EXTRACT_TOPIC[-1]][0]["ocr_engine"] == "tess4"
+        # The counts of remaining pages match the unfinished pages
+        assert int(self.redis.get(redis_fields.images_remaining(ID))) == 2
+        assert int(self.redis.get(redis_fields.texts_remaining(ID))) == 0
+        # The progress is kept for as long as processing runs again
+        assert self.redis.ttl(redis_fields.checkpoint(ID)) > CHECKPOINT_TTL
+
+    def test_text_positions_left(self):
+        self.finish(redis_fields.image_bits(ID), range(PAGE_COUNT))
+        self.finish(redis_fields.text_bits(ID), range(PAGE_COUNT))
+        self.finish(redis_fields.text_position_bits(ID), [0, 1])
+        # The OCR text PDF of page 3 is still in memory
+        self.redis.hset(redis_fields.page_text_pdf(ID), "3", b"pdf")
+
+        messages = self.resume()
+        assert list(messages) == [main.TEXT_POSITION_EXTRACT_TOPIC[-1]]
+        assert [
+            (m["paths_and_numbers"], m["in_memory"])
+            for m in messages[main.TEXT_POSITION_EXTRACT_TOPIC[-1]]
+        ] == [([3], True), ([2], False)]
+
+    def test_assembly_left(self):
+        self.finish(redis_fields.image_bits(ID), range(PAGE_COUNT))
+        self.finish(redis_fields.text_bits(ID), range(PAGE_COUNT))
+        self.finish(redis_fields.text_position_bits(ID), range(PAGE_COUNT))
+
+        messages = self.resume()
+        assert list(messages) == [main.ASSEMBLE_TEXT_TOPIC[-1]]
+        assert messages[main.ASSEMBLE_TEXT_TOPIC[-1]] == [
+            {
+                "doc_id": ID,
+                "slug": "doc",
+                "access": Access.private,
+                "partial": None,
+                "ocr_engine": "tess4",
+                "in_memory_ocr": False,
+            }
+        ]
+
+    def test_other_settings(self):
+        # Pages processed with other OCR settings are not resumed
+        for settings in (
+            ["spa", False, "tess4"],
+            ["eng", True, "tess4"],
+            ["eng", False, "textract"],
+        ):
+            with patch(f"{MAIN}.publisher") as mock_publisher:
+                assert not main.resume_processing(ID, *settings)
+            mock_publisher.publish.assert_not_called()
+        # The progress is left to expire
+        assert self.redis.ttl(redis_fields.checkpoint(ID)) <= CHECKPOINT_TTL
+
+    def test_other_image_formats(self):
+        # Pages written in other image formats are not resumed
+        with patch(f"{MAIN}.IMAGE_FORMATS", "large=webp"), patch(
+            f"{MAIN}.publisher"
+        ) as mock_publisher:
+            assert not main.resume_processing(ID, *SETTINGS)
+        mock_publisher.publish.assert_not_called()
+
+    def test_no_checkpoint(self):
+        self.redis.delete(redis_fields.checkpoint(ID))
+        assert not main.resume_processing(ID, *SETTINGS)
@@ -88,7 +88,9 @@ def process_doc(request, _context=None):
 
     # Launch PDF processing via pubsub
     if job_type == "process_pdf":
-        if extension == "pdf":
+        # Resuming a converted document continues from the converted PDF
+        resume = data.get("resume") and utils.has_checkpoint(REDIS, doc_id)
+        if extension == "pdf" or resume:
             publisher.publish(PDF_PROCESS_TOPIC, data=encode_pubsub_data(data))
         else:
             # Non-PDF files require conversion first
@@ -796,9 +796,10 @@ def _add_asset_url(results):
         if "access" not in result or "status" not in result:
             solr_index.delay(result["id"])
             result["asset_url"] = settings.PRIVATE_ASSET_URL
-        elif result["access"] == "public" and result["status"] in (
-            "success",
-            "readable",
+        elif (
+            result["access"] == "public"
+            and result["status"] in ("success", "readable")
+            and not settings.SIGNED_ACCESS
         ):
             result["asset_url"] = settings.PUBLIC_ASSET_URL
         else:
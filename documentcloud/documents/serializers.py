@@ -187,6 +187,7 @@ class DocumentSerializer(FlexFieldsModelSerializer):
             "organization",
             "original_extension",
             "page_count",
+            "page_image_formats",
             "page_spec",
             "pages",
             "presigned_url",
@@ -211,6 +212,7 @@ class DocumentSerializer(FlexFieldsModelSerializer):
             "organization": {"read_only": True},
             "original_extension": {"default": "pdf"},
             "page_count": {"read_only": True},
+            "page_image_formats": {"read_only": True},
             "page_spec": {"read_only": True},
             "publish_at": {"required": False},
             "published_url": {"required": False},
@@ -265,7 +267,13 @@ class DocumentSerializer(FlexFieldsModelSerializer):
         if self._authenticate_processing(request):
             # If this request is from our serverless processing functions,
             # make the following fields writable
-            for field in ["file_hash", "page_count", "page_spec", "status"]:
+            for field in [
+                "file_hash",
+                "page_count",
+                "page_image_formats",
+                "page_spec",
+                "status",
+            ]:
                 self.fields[field].read_only = False
 
         if view and view.action in ("bulk_update", "bulk_partial_update"):
@@ -786,6 +794,23 @@ class ProcessDocumentSerializer(serializers.Serializer):
         default="tess4",
         help_text=_("Choose the OCR engine"),
     )
+    pages = serializers.ListField(
+        label=_("Pages"),
+        child=serializers.IntegerField(min_value=0),
+        required=False,
+        help_text=_(
+            "Only reprocess these pages (zero-indexed), along with any pages "
+            "which have changed or failed to process"
+        ),
+    )
+    resume = serializers.BooleanField(
+        label=_("Resume"),
+        default=False,
+        help_text=_(
+            "Resume processing a document which failed, only processing the "
+            "pages which did not finish"
+        ),
+    )
     id = serializers.IntegerField(
         label=_("ID"), help_text=_("ID of the document to process")
     )
@@ -38,7 +38,7 @@ from dateutil.parser import parse
 
 # DocumentCloud
 from documentcloud.common import path
-from documentcloud.common.environment import storage
+from documentcloud.common.environment import storage, storage_cache
 from documentcloud.core.utils import grouper
 from documentcloud.documents.choices import Status
 from documentcloud.documents.models import DeletedDocument, Document, Note
@@ -260,7 +260,7 @@ def reindex_batch(collection_name, document_pks):
     # get the json txt file names for all of the documents
     file_names = [path.json_text_path(d.pk, d.slug) for d in documents]
     # download the files in parallel
-    page_texts_ = storage.async_download(file_names)
+    page_texts_ = storage_cache.async_download(file_names)
 
     page_texts = []
     for text in page_texts_:
@@ -7,9 +7,11 @@ from django.db.utils import DatabaseError
 from django.utils import timezone
 
 # Standard Library
+import collections
+import functools
 import logging
 import sys
-from datetime import date
+from datetime import date, timedelta
 
 # Third Party
 import pysolr
@@ -17,11 +19,12 @@ import redis
 from requests.exceptions import HTTPError, RequestException
 
 # DocumentCloud
+from documentcloud.common import lanes
 from documentcloud.common.environment import httpsub, storage
 from documentcloud.core.choices import Language
 from documentcloud.documents import entity_extraction, modifications, solr
 from documentcloud.documents.choices import Access, Status
-from documentcloud.documents.models import Document, DocumentError
+from documentcloud.documents.models import BulkProcess, Document, DocumentError
 from documentcloud.documents.search import SOLR, SOLR_NOTES
 
 logger = logging.getLogger(__name__)
@@ -124,8 +127,18 @@ def _httpsub_submit(url, document_pk, json, task_):
     retry_backoff=30,
     retry_kwargs={"max_retries": settings.HTTPSUB_RETRY_LIMIT},
 )
-def process(document_pk, user_pk, org_pk, force_ocr, ocr_engine):
+def process(
+    document_pk,
+    user_pk,
+    org_pk,
+    force_ocr,
+    ocr_engine,
+    pages=None,
+    resume=False,
+    priority=lanes.INTERACTIVE,
+):
     """Start the processing"""
+    # pylint: disable=too-many-arguments
     document = Document.objects.get(pk=document_pk)
     _httpsub_submit(
         settings.DOC_PROCESSING_URL,
@@ -141,12 +154,78 @@ def process(document_pk, user_pk, org_pk, force_ocr, ocr_engine):
             "org_id": org_pk,
             "force_ocr": force_ocr,
             "ocr_engine": ocr_engine,
+            "reprocess_pages": pages,
+            "page_image_formats": document.page_image_formats,
+            "resume": resume,
+            "lane": lanes.lane(priority, org_pk),
         },
         process,
     )
     document.create_revision(user_pk, "Processing")
 
 
+@shared_task
+def dispatch_bulk_process():
+    """Start processing documents queued by bulk processing, keeping at most
+    `BULK_PROCESSING_LIMIT` processing at once, and taking from each organization
+    in turn - organizations with the fewest documents processing go first"""
+    with transaction.atomic():
+        bulk_processes = list(BulkProcess.objects.select_for_update())
+        processing = set(
+            Document.objects.filter(
+                pk__in=[b.document_id for b in bulk_processes],
+                status__in=(Status.pending, Status.readable),
+            ).values_list("pk", flat=True)
+        )
+        # forget documents which have finished, were cancelled or are taking
+        # too long
+        timeout = timezone.now() - timedelta(seconds=settings.BULK_PROCESSING_TIMEOUT)
+        finished = [
+            b
+            for b in bulk_processes
+            if b.document_id not in processing
+            or (b.dispatched_at is not None and b.dispatched_at < timeout)
+        ]
+        BulkProcess.objects.filter(pk__in=[b.pk for b in finished]).delete()
+        bulk_processes = [b for b in bulk_processes if b not in finished]
+
+        running = collections.Counter(
+            b.organization_id for b in bulk_processes if b.dispatched_at is not None
+        )
+        waiting = [b for b in bulk_processes if b.dispatched_at is None]
+        queue = lanes.FairQueue({lanes.BULK: 1})
+        for bulk_process in sorted(
+            waiting, key=lambda b: (running[b.organization_id], b.pk)
+        ):
+            queue.put(bulk_process, lanes.BULK, bulk_process.organization_id)
+        limit = settings.BULK_PROCESSING_LIMIT - sum(running.values())
+        dispatch = [queue.get() for _ in range(max(0, min(limit, len(queue))))]
+
+        logger.info(
+            "[DISPATCH BULK PROCESS] running: %d dispatching: %d waiting: %d",
+            sum(running.values()),
+            len(dispatch),
+            len(queue),
+        )
+        BulkProcess.objects.filter(pk__in=[b.pk for b in dispatch]).update(
+            dispatched_at=timezone.now()
+        )
+        for bulk_process in dispatch:
+            transaction.on_commit(
+                functools.partial(
+                    process.delay,
+                    bulk_process.document_id,
+                    bulk_process.user_id,
+                    bulk_process.organization_id,
+                    bulk_process.force_ocr,
+                    bulk_process.ocr_engine,
+                    bulk_process.pages,
+                    bulk_process.resume,
+                    lanes.BULK,
+                )
+            )
+
+
 @shared_task(
     autoretry_for=(RequestException,),
     retry_backoff=30,
@@ -164,6 +243,7 @@ def redact(document_pk, user_pk, redactions):
             "slug": document.slug,
             "access": document.access,
             "ocr_code": Language.get_choice(document.language).ocr_code,
+            "page_image_formats": document.page_image_formats,
             "redactions": redactions,
         },
         redact,
@@ -242,33 +322,38 @@ def update_access(document_pk, status, access, marker=None):
         "[UPDATE ACCESS]: %d - %s - %d", document_pk, document.title, document.access
     )
 
-    files = storage.list(document.path, marker, limit=settings.UPDATE_ACCESS_CHUNK_SIZE)
-    # do not ever make revision PDFs public
-    revision_prefix = f"{document.path}revisions/"
-    update_files = [f for f in files if not f.startswith(revision_prefix)]
-    storage.async_set_access(update_files, access)
-
-    if len(files) == settings.UPDATE_ACCESS_CHUNK_SIZE:
-        # there may be more files left, re-run, starting where we left off
-        logger.info("[UPDATE ACCESS] start: %s - %s", files[0], access)
-        update_access.delay(document_pk, status, access, files[-1])
-        logger.info("[UPDATE ACCESS] done:  %s - %s", files[0], access)
-    else:
-        # we are done
-        logger.info("[UPDATE ACCESS] finish %s %s %s", document_pk, status, access)
-        with transaction.atomic():
-            field_updates = {"status": "set"}
-            kwargs = {}
-            if access == Access.public:
-                # if we were switching to public, update the access now
-                kwargs["access"] = Access.public
-                field_updates["access"] = "set"
-                # also set the publication date
-                kwargs["publication_date"] = date.today()
-
-            # update the document status and re-index into solr
-            Document.objects.filter(pk=document_pk).update(status=status, **kwargs)
-            document.index_on_commit(field_updates=field_updates)
+    # the files do not need to be updated at all if they are kept private
+    if storage.sets_acl(access):
+        files = storage.list(
+            document.path, marker, limit=settings.UPDATE_ACCESS_CHUNK_SIZE
+        )
+        # do not ever make revision PDFs public
+        revision_prefix = f"{document.path}revisions/"
+        update_files = [f for f in files if not f.startswith(revision_prefix)]
+        storage.async_set_access(update_files, access)
+
+        if len(files) == settings.UPDATE_ACCESS_CHUNK_SIZE:
+            # there may be more files left, re-run, starting where we left off
+            logger.info("[UPDATE ACCESS] start: %s - %s", files[0], access)
+            update_access.delay(document_pk, status, access, files[-1])
+            logger.info("[UPDATE ACCESS] done:  %s - %s", files[0], access)
+            return
+
+    # we are done
+    logger.info("[UPDATE ACCESS] finish %s %s %s", document_pk, status, access)
+    with transaction.atomic():
+        field_updates = {"status": "set"}
+        kwargs = {}
+        if access == Access.public:
+            # if we were switching to public, update the access now
+            kwargs["access"] = Access.public
+            field_updates["access"] = "set"
+            # also set the publication date
+            kwargs["publication_date"] = date.today()
+
+        # update the document status and re-index into solr
+        Document.objects.filter(pk=document_pk).update(status=status, **kwargs)
+        document.index_on_commit(field_updates=field_updates)
 
 
 @shared_task(
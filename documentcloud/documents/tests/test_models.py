@@ -6,6 +6,7 @@ import pytest
 from listcrunch import uncrunch
 
 # DocumentCloud
+from documentcloud.common import path
 from documentcloud.documents.tests.factories import DocumentFactory
 
 
@@ -53,3 +54,25 @@ class TestDocumentModel:
 
         assert width == 8.5
         assert height == 11
+
+    @pytest.mark.django_db()
+    def test_asset_url(self, settings):
+        assert self.document.public
+        assert self.document.asset_url == settings.PUBLIC_ASSET_URL
+
+        # public files are served through the file server with signed access
+        settings.SIGNED_ACCESS = True
+        assert self.document.asset_url == settings.PRIVATE_ASSET_URL
+
+    @pytest.mark.django_db()
+    def test_set_page_text_invalidates_dedup(self):
+        self.document.page_count = 7
+        with mock.patch("documentcloud.documents.models.document.storage") as storage:
+            storage.open.return_value.read.return_value = b'{"pages": []}'
+            self.document.set_page_text([{"page_number": 0, "text": "new text"}])
+
+        # Edited documents are no longer copied to identical uploads
+        storage.delete.assert_called_once_with(
+            path.processed_marker_path(self.document.pk, self.document.slug)
+        )
+        storage.async_upload.assert_called_once()
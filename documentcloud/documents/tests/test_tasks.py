@@ -0,0 +1,122 @@
+# Django
+from django.utils import timezone
+
+# Standard Library
+import os
+
+# Third Party
+import pytest
+
+# DocumentCloud
+from documentcloud.common.environment import storage
+from documentcloud.core.tests import run_commit_hooks
+from documentcloud.documents.choices import Access, Status
+from documentcloud.documents.models import BulkProcess
+from documentcloud.documents.tasks import dispatch_bulk_process, update_access
+from documentcloud.documents.tests.factories import DocumentFactory
+from documentcloud.users.tests.factories import UserFactory
+
+LOCAL_STORAGE = "documentcloud.common.environment.local.storage"
+
+
+@pytest.mark.django_db()
+class TestUpdateAccess:
+    @pytest.fixture(autouse=True)
+    def media_root(self, settings, tmp_path):
+        settings.MEDIA_ROOT = str(tmp_path)
+
+    def test_update_access(self):
+        document = DocumentFactory(access=Access.private, status=Status.readable)
+        storage.simple_upload(document.doc_path, b"%PDF", access=Access.private)
+
+        update_access(document.pk, Status.success, Access.public)
+        assert storage.get_access(document.doc_path) == Access.public
+        document.refresh_from_db()
+        assert document.access == Access.public
+        assert document.status == Status.success
+
+    def test_signed_access(self, mocker):
+        # The file was made public before signed access was enabled
+        document = DocumentFactory(access=Access.public)
+        storage.simple_upload(document.doc_path, b"%PDF", access=Access.public)
+        mocker.patch(f"{LOCAL_STORAGE}.SIGNED_ACCESS", True)
+
+        # Making a document public does not need its files to be changed
+        chmod = mocker.spy(os, "chmod")
+        update_access(document.pk, Status.success, Access.public)
+        chmod.assert_not_called()
+
+        # but making it private still makes its files private
+        update_access(document.pk, Status.success, Access.private)
+        assert storage.get_access(document.doc_path) == Access.private
+
+
+@pytest.mark.django_db()
+class TestDispatchBulkProcess:
+    def queue(self, count, dispatched=False, status=Status.pending):
+        user = UserFactory()
+        return [
+            BulkProcess.objects.create(
+                document=document,
+                user=user,
+                organization=user.organization,
+                ocr_engine="tess4",
+                dispatched_at=timezone.now() if dispatched else None,
+            )
+            for document in DocumentFactory.create_batch(
+                count, user=user, status=status
+            )
+        ]
+
+    def dispatch(self, mocker):
+        """Dispatch, returning the documents which were started"""
+        mock_process = mocker.patch("documentcloud.documents.tasks.process.delay")
+        dispatch_bulk_process()
+        run_commit_hooks()
+        for call in mock_process.call_args_list:
+            assert call.args[-1] == "bulk"
+        return [call.args[0] for call in mock_process.call_args_list]
+
+    def test_limit(self, settings, mocker):
+        settings.BULK_PROCESSING_LIMIT = 3
+        running = self.queue(1, dispatched=True)
+        first = self.queue(4)
+        second = self.queue(2)
+
+        # only two more may start, taking from the organizations with nothing
+        # processing first
+        assert self.dispatch(mocker) == [first[0].document_id, second[0].document_id]
+        # nothing may start until something finishes
+        assert self.dispatch(mocker) == []
+
+        running[0].document.status = Status.success
+        running[0].document.save()
+        assert self.dispatch(mocker) == [first[1].document_id]
+        assert not BulkProcess.objects.filter(pk=running[0].pk).exists()
+
+    def test_organizations_in_turn(self, settings, mocker):
+        settings.BULK_PROCESSING_LIMIT = 5
+        first = self.queue(4)
+        second = self.queue(1)
+        third = self.queue(2)
+
+        assert self.dispatch(mocker) == [
+            first[0].document_id,
+            second[0].document_id,
+            third[0].document_id,
+            first[1].document_id,
+            third[1].document_id,
+        ]
+
+    def test_cancelled(self, settings, mocker):
+        settings.BULK_PROCESSING_LIMIT = 1
+        # the processing was cancelled before it started
+        self.queue(1, status=Status.error)
+        # the processing is taking too long
+        stuck = self.queue(1, dispatched=True)
+        settings.BULK_PROCESSING_TIMEOUT = -1
+        waiting = self.queue(1)
+
+        assert self.dispatch(mocker) == [waiting[0].document_id]
+        assert list(BulkProcess.objects.all()) == waiting
+        assert stuck[0].document.processing
@@ -14,7 +14,13 @@ import pytest
 from documentcloud.common import path
 from documentcloud.core.tests import run_commit_hooks
 from documentcloud.documents.choices import Access, Status
-from documentcloud.documents.models import Document, DocumentError, Note, Section
+from documentcloud.documents.models import (
+    BulkProcess,
+    Document,
+    DocumentError,
+    Note,
+    Section,
+)
 from documentcloud.documents.serializers import (
     DocumentSerializer,
     NoteSerializer,
@@ -497,6 +503,28 @@ class TestDocumentAPI:
         document.refresh_from_db()
         assert document.page_count == 42
 
+    def test_update_finished_bulk_process(self, client, mocker):
+        """More bulk processing is started when a bulk processed document
+        finishes"""
+        mock_dispatch = mocker.patch(
+            "documentcloud.documents.views.dispatch_bulk_process.delay"
+        )
+        document = DocumentFactory(status=Status.readable)
+        BulkProcess.objects.create(
+            document=document,
+            user=document.user,
+            organization=document.organization,
+            ocr_engine="tess4",
+        )
+        response = client.patch(
+            f"/api/documents/{document.pk}/",
+            {"status": "success"},
+            HTTP_AUTHORIZATION=f"processing-token {settings.PROCESSING_TOKEN}",
+        )
+        run_commit_hooks()
+        assert response.status_code == status.HTTP_200_OK
+        mock_dispatch.assert_called_once()
+
     def test_update_bad_project(self, client, document):
         """Update a documents project using the project membership API only"""
         project = ProjectFactory(user=document.user)
@@ -870,6 +898,60 @@ class TestDocumentAPI:
         document.refresh_from_db()
         assert document.status == Status.pending
 
+    def test_process_pages(self, client, document, mocker):
+        """Test reprocessing only some pages of a document"""
+        # pretend the file exists
+        mocker.patch(
+            "documentcloud.common.environment.storage.exists", return_value=True
+        )
+        mock_process = mocker.patch("documentcloud.documents.views.process.delay")
+        client.force_authenticate(user=document.user)
+        response = client.post(
+            f"/api/documents/{document.pk}/process/",
+            {"pages": [0, 2]},
+            format="json",
+        )
+        run_commit_hooks()
+        assert response.status_code == status.HTTP_200_OK
+        document.refresh_from_db()
+        assert document.status == Status.pending
+        mock_process.assert_called_once_with(
+            document.pk,
+            document.user.pk,
+            document.user.organization.pk,
+            False,
+            "tess4",
+            [0, 2],
+            False,
+        )
+
+    def test_process_resume(self, client, document, mocker):
+        """Test resuming processing a document which failed"""
+        # pretend the file exists
+        mocker.patch(
+            "documentcloud.common.environment.storage.exists", return_value=True
+        )
+        mock_process = mocker.patch("documentcloud.documents.views.process.delay")
+        document.status = Status.error
+        document.save()
+        client.force_authenticate(user=document.user)
+        response = client.post(
+            f"/api/documents/{document.pk}/process/", {"resume": True}, format="json"
+        )
+        run_commit_hooks()
+        assert response.status_code == status.HTTP_200_OK
+        document.refresh_from_db()
+        assert document.status == Status.pending
+        mock_process.assert_called_once_with(
+            document.pk,
+            document.user.pk,
+            document.user.organization.pk,
+            False,
+            "tess4",
+            None,
+            True,
+        )
+
     def test_process_ocr_engine_free(self, client, document, mocker):
         """Must have a paid account to use Textract"""
         # pretend the file exists
@@ -944,7 +1026,7 @@ class TestDocumentAPI:
         )
         documents = DocumentFactory.create_batch(2, user=user)
         client.force_authenticate(user=user)
-        with django_assert_num_queries(10):
+        with django_assert_num_queries(12):
             response = client.post(
                 "/api/documents/process/",
                 [{"id": d.pk} for d in documents],
@@ -955,6 +1037,31 @@ class TestDocumentAPI:
             document.refresh_from_db()
             assert document.status == Status.pending
 
+    def test_bulk_process_queued(self, client, user, mocker):
+        """Bulk processing is queued, to be started a limited number at a time"""
+        # pretend the files exists
+        mocker.patch(
+            "documentcloud.common.environment.storage.exists", return_value=True
+        )
+        mock_dispatch = mocker.patch(
+            "documentcloud.documents.views.dispatch_bulk_process.delay"
+        )
+        documents = DocumentFactory.create_batch(2, user=user)
+        client.force_authenticate(user=user)
+        response = client.post(
+            "/api/documents/process/",
+            [{"id": d.pk, "force_ocr": True} for d in documents],
+            format="json",
+        )
+        run_commit_hooks()
+        assert response.status_code == status.HTTP_200_OK
+        mock_dispatch.assert_called_once()
+        assert sorted(
+            BulkProcess.objects.values_list(
+                "document", "organization", "force_ocr", "dispatched_at"
+            )
+        ) == [(d.pk, user.organization.pk, True, None) for d in documents]
+
     def test_bulk_process_ocr_engine(self, client, mocker):
         """Test processing multiple documents with textract"""
         org = ProfessionalOrganizationFactory()
@@ -47,6 +47,7 @@ from documentcloud.documents.decorators import (
     conditional_cache_control,
 )
 from documentcloud.documents.models import (
+    BulkProcess,
     Document,
     DocumentError,
     EntityDate,
@@ -73,6 +74,7 @@ from documentcloud.documents.serializers import (
     SectionSerializer,
 )
 from documentcloud.documents.tasks import (
+    dispatch_bulk_process,
     extract_entities,
     fetch_file_url,
     invalidate_cache,
@@ -838,6 +840,8 @@ class DocumentViewSet(BulkModelMixin, FlexFieldsModelViewSet):
                 document,
                 serializer.validated_data["force_ocr"],
                 serializer.validated_data["ocr_engine"],
+                serializer.validated_data.get("pages"),
+                serializer.validated_data["resume"],
             )
             return Response("OK", status=status.HTTP_200_OK)
 
@@ -877,9 +881,26 @@ class DocumentViewSet(BulkModelMixin, FlexFieldsModelViewSet):
         ocr_engine = {
             d["id"]: d.get("ocr_engine", "tess4") for d in serializer.validated_data
         }
-
+        pages = {d["id"]: d.get("pages") for d in serializer.validated_data}
+        resume = {d["id"]: d.get("resume", False) for d in serializer.validated_data}
+
+        # bulk processing is queued, to be started a limited number at a time
+        organization = request.user.organization
+        BulkProcess.objects.bulk_create(
+            BulkProcess(
+                document=document,
+                user=request.user,
+                organization=organization,
+                force_ocr=force_ocr[document.pk],
+                ocr_engine=ocr_engine[document.pk],
+                pages=pages[document.pk],
+                resume=resume[document.pk],
+            )
+            for document in documents
+        )
+        transaction.on_commit(dispatch_bulk_process.delay)
         for document in documents:
-            self._process(document, force_ocr[document.pk], ocr_engine[document.pk])
+            document.index_on_commit(field_updates={"status": "set"})
             if document.status == Status.nofile:
                 # create an initial revision only if this is the initial processing,
                 # ie it was in status nofile before this
@@ -900,8 +921,9 @@ class DocumentViewSet(BulkModelMixin, FlexFieldsModelViewSet):
 
         return None
 
-    def _process(self, document, force_ocr, ocr_engine):
+    def _process(self, document, force_ocr, ocr_engine, pages=None, resume=False):
         """Process a document after you have uploaded the file"""
+        # pylint: disable=too-many-arguments
         transaction.on_commit(
             lambda: process.delay(
                 document.pk,
@@ -909,6 +931,8 @@ class DocumentViewSet(BulkModelMixin, FlexFieldsModelViewSet):
                 self.request.user.organization.pk,
                 force_ocr,
                 ocr_engine,
+                pages,
+                resume,
             )
         )
         document.index_on_commit(field_updates={"status": "set"})
@@ -1023,6 +1047,7 @@ class DocumentViewSet(BulkModelMixin, FlexFieldsModelViewSet):
             self._update_solr(instance, old_processing, old_data_key, validated_data)
             self._update_cache(instance, old_processing)
             self._run_addons(instance, old_processing)
+            self._dispatch_bulk_process(instance, old_processing)
             self._set_page_text(instance, validated_data.get("pages"))
             self._create_revision(instance, old_processing, old_revision_control)
 
@@ -1081,6 +1106,16 @@ class DocumentViewSet(BulkModelMixin, FlexFieldsModelViewSet):
         if old_processing and not document.processing and document.cache_dirty:
             transaction.on_commit(lambda: invalidate_cache.delay(document.pk))
 
+    def _dispatch_bulk_process(self, document, old_processing):
+        """Start more queued bulk processing once a bulk processed document
+        finishes"""
+        if (
+            old_processing
+            and not document.processing
+            and document.bulk_processes.exists()
+        ):
+            transaction.on_commit(dispatch_bulk_process.delay)
+
     def _run_addons(self, document, old_processing):
         """Run upload add-ons once the document is succesfully processed"""
         logger.info("[DOC UPDATE] run addons %s", document.pk)